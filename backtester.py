@@ -1,11 +1,16 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+from typing import Optional
+
+import run_metrics
+from deal_timeline import live_deals
 
 
 def backtest(
     orders_df: pd.DataFrame,
     price_df: pd.DataFrame,
-    initial_capital: float = 1_000_000
+    initial_capital: float = 1_000_000,
+    price_column: str = 'price',
+    timeline: Optional[dict] = None
 ) -> pd.DataFrame:
     """
     Run a simple backtest given a set of orders and daily prices.
@@ -36,6 +41,16 @@ def backtest(
     initial_capital : float
         Starting cash amount, defaults to 1,000,000.
 
+    price_column : str
+        Column of price_df to trade and value at, e.g. 'price' (raw) or
+        'adj_price' (return-adjusted, see price_adjust.py). Defaults to 'price'.
+
+    timeline : dict, optional
+        Deal lifetime index from deal_timeline.build_timeline; when given, a
+        position still held in a deal that is no longer live is recorded as a
+        'held_outside_lifetime' warning in run_metrics (once per deal). It is
+        still valued like any other position.
+
     Returns
     -------
     portfolio_values_df : pd.DataFrame
@@ -62,15 +77,17 @@ def backtest(
     cash = initial_capital
 
     portfolio_history = []
+    flagged = set()
 
     # Convert price_df to a multi-index for quick lookups:
     #   price_lookup[(date, event_id)] -> price
     duplicates = price_df.duplicated(subset=['date', 'deal_id'], keep=False)
     if duplicates.any():
-        print("Warning: Duplicate (date, deal_id) entries found in price_df!")
-        print(price_df[duplicates])
+        sample = price_df.loc[duplicates, ['date', 'deal_id', price_column]].head(run_metrics.config()['max_examples'])
+        run_metrics.record_many("backtester.backtest", "duplicate_prices", int(duplicates.sum()),
+                                sample.to_dict('records'), level="warning")
     
-    price_lookup = price_df.set_index(['date', 'deal_id'])['price']
+    price_lookup = price_df.set_index(['date', 'deal_id'])[price_column]
 
     # For convenience, group orders by date so we can process them in the daily loop
     orders_by_date = orders_df.groupby('date')
@@ -104,6 +121,9 @@ def backtest(
 
                 # Update positions
                 positions[deal_id] = positions.get(deal_id, 0) + shares_to_buy
+                # Closed positions are dropped so they are not revalued every day after
+                if positions[deal_id] == 0:
+                    del positions[deal_id]
 
                 # Update cash (spent or received)
                 cash -= order_cost
@@ -113,7 +133,12 @@ def backtest(
         invested_capital = 0
 
         # Sum the value of each open position
+        live = set(live_deals(timeline, current_date).tolist()) if timeline is not None else None
         for deal_id, shares_owned in positions.items():
+            if live is not None and deal_id not in live and deal_id not in flagged:
+                flagged.add(deal_id)
+                run_metrics.record("backtester.backtest", "held_outside_lifetime", level="warning",
+                                   date=current_date, deal_id=deal_id, shares=shares_owned)
             if (current_date, deal_id) in price_lookup:
                 p = price_lookup[(current_date, deal_id)]
                 invested_capital += shares_owned * p
@@ -132,6 +157,8 @@ def backtest(
 
 
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
     # -----------------------------
     # Example usage:
     # -----------------------------
@@ -1,10 +1,16 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+from typing import Optional
+
+import run_metrics
+from deal_timeline import live_deals
+from price_schema import compact_prices
 
 def backtest(
     orders_df: pd.DataFrame,
     price_df: pd.DataFrame,
-    initial_capital: float = 1_000_000
+    initial_capital: float = 1_000_000,
+    price_column: str = 'price',
+    timeline: Optional[dict] = None
 ) -> pd.DataFrame:
     """
     Run a simple backtest given a set of orders and daily prices.
@@ -30,6 +36,16 @@ def backtest(
     initial_capital : float
         Starting cash amount, defaults to 1,000,000.
 
+    price_column : str
+        Column to trade and value at, e.g. 'price' (raw) or 'adj_price'
+        (return-adjusted, see price_adjust.py). Defaults to 'price'.
+
+    timeline : dict, optional
+        Deal lifetime index from deal_timeline.build_timeline. When given, a
+        position still held in a deal that is no longer live is recorded as a
+        'held_outside_lifetime' warning in run_metrics (once per deal); it is
+        valued like any other position, i.e. on days its leg has a price.
+
     Returns
     -------
     portfolio_values_df : pd.DataFrame
@@ -45,13 +61,21 @@ def backtest(
     price_df['date'] = pd.to_datetime(price_df['date'])
 
     # If needed, rename columns for consistency:
-    if 'prc' in price_df.columns:
+    if 'prc' in price_df.columns and 'price' not in price_df.columns:
         price_df.rename(columns={'prc': 'price'}, inplace=True)
+    if price_column != 'price':
+        price_df = price_df.drop(columns=['price'], errors='ignore').rename(columns={price_column: 'price'})
     if 'deal_index' in price_df.columns:
         price_df.rename(columns={'deal_index': 'deal_id'}, inplace=True)
+    # strategy_Shuhan and price_stock_deals.csv call the leg column 'leg'
+    if 'leg' in price_df.columns and 'price_type' not in price_df.columns:
+        price_df.rename(columns={'leg': 'price_type'}, inplace=True)
+    if 'leg' in orders_df.columns and 'price_type' not in orders_df.columns:
+        orders_df.rename(columns={'leg': 'price_type'}, inplace=True)
     
     # Group by date, deal_id, and price_type to average duplicate entries
-    price_df = price_df.groupby(['date', 'deal_id', 'price_type'], as_index=False).agg({'price': 'mean'})
+    price_df = compact_prices(price_df[['date', 'deal_id', 'price_type', 'price']])
+    price_df = price_df.groupby(['date', 'deal_id', 'price_type'], as_index=False, observed=True).agg({'price': 'mean'})
     
     # Create a lookup for fast access: key = (date, deal_id, price_type)
     price_lookup = price_df.set_index(['date', 'deal_id', 'price_type'])['price']
@@ -64,6 +88,7 @@ def backtest(
     positions = {}
     cash = initial_capital
     portfolio_history = []
+    flagged = set()
 
     # Group orders by date for faster processing
     orders_by_date = orders_df.groupby('date')
@@ -82,13 +107,24 @@ def backtest(
                 else:
                     raise ValueError(f"Price not found for date {current_date}, deal_id {deal_id}, price_type {price_type}")
                 
+                # Intraday fills (see intraday.py) trade at their own price
+                if 'fill_price' in row.index and not pd.isna(row['fill_price']):
+                    current_price = float(row['fill_price'])
                 order_cost = current_price * shares_to_trade
                 positions[(deal_id, price_type)] = positions.get((deal_id, price_type), 0) + shares_to_trade
                 cash -= order_cost
+                # Closed positions are dropped so they are not revalued every day after
+                if positions[(deal_id, price_type)] == 0:
+                    del positions[(deal_id, price_type)]
 
         # 2) Compute daily portfolio value: cash + sum(positions * today's price)
         invested_capital = 0
+        live = set(live_deals(timeline, current_date).tolist()) if timeline is not None else None
         for (deal_id, price_type), shares_owned in positions.items():
+            if live is not None and deal_id not in live and deal_id not in flagged:
+                flagged.add(deal_id)
+                run_metrics.record("backtester_stock.backtest", "held_outside_lifetime", level="warning",
+                                   date=current_date, deal_id=deal_id, price_type=price_type, shares=shares_owned)
             key = (current_date, deal_id, price_type)
             if key in price_lookup:
                 price_today = price_lookup.loc[key]
@@ -108,6 +144,8 @@ def backtest(
     return portfolio_values_df
 
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
     # 1) Load your price data from CSVs
     target_prices_df = pd.read_csv('Target_Prices.csv', parse_dates=['date'])
     acquirer_prices_df = pd.read_csv('Acquirer_Prices.csv', parse_dates=['date'])
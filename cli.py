@@ -0,0 +1,325 @@
+"""
+Command-line entry point for the M&A arbitrage pipeline.
+
+    python cli.py ingest   ma_export_32577375_201111.csv debug_orig.csv
+    python cli.py update-prices
+    python cli.py fetch    MA_deals_largest_100_past_20_years.xlsx
+    python cli.py validate --deals deals.csv --prices price.csv
+    python cli.py backtest cash stock --no-report --metrics run_metrics.json
+    python cli.py backtest --no-report --param shares_on_announce=100 --param stock.capital_each_side=50000
+    python cli.py sweep    cash --param shares_on_announce=100,300 --backtest-param initial_capital=1e6,2e6
+    python cli.py report   results/cash
+    python cli.py golden   --synthetic 10
+
+Only the standard library is imported at startup; each subcommand imports the
+modules it needs when it runs (pandas for everything that touches data,
+matplotlib only when charts are drawn, wrds only when prices are fetched).
+"""
+import argparse
+import sys
+import time
+
+############################################
+# Argument Helpers
+############################################
+def _parse_value(text: str):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    if text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    return text
+
+def _parse_assignments(assignments, multi: bool = False) -> dict:
+    """
+    Parse ['key=value', ...] (or 'key=v1,v2' with multi=True) into a dict.
+    """
+    parsed = {}
+    for assignment in assignments or []:
+        key, sep, value = assignment.partition("=")
+        if not sep:
+            raise SystemExit(f"Expected key=value, got '{assignment}'")
+        values = [_parse_value(v) for v in value.split(",")] if multi else _parse_value(value)
+        parsed[key] = values
+    return parsed
+
+def _strategy_overrides(strategies: dict, strategy_names, overrides: dict) -> dict:
+    """
+    Route --param overrides to the selected strategies: 'name.key=value' goes to
+    strategy `name` only and a bare 'key=value' to every selected strategy that
+    has a parameter `key`. Keys no selected strategy accepts are rejected.
+    """
+    unknown = [name for name in strategy_names if name not in strategies]
+    if unknown:
+        raise SystemExit(f"Unknown strategies {unknown}; registered: {sorted(strategies)}")
+    params = {name: {} for name in strategy_names}
+    for assignment, value in overrides.items():
+        name, _, key = assignment.rpartition(".")
+        targets = [name] if name else [n for n in strategy_names if key in strategies[n]["params"]]
+        if name and name not in params:
+            raise SystemExit(f"--param {assignment}: strategy '{name}' is not selected")
+        if not targets or any(key not in strategies[n]["params"] for n in targets):
+            accepted = {n: sorted(strategies[n]["params"]) for n in (targets or strategy_names)}
+            raise SystemExit(f"--param {assignment}: unknown parameter; accepted: {accepted}")
+        for target in targets:
+            params[target][key] = value
+    return params
+
+def _add_data_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--deals", default="deals.csv", help="Deals CSV (default: deals.csv)")
+    parser.add_argument("--cash-prices", default="price.csv", help="Cash-deal price CSV (default: price.csv)")
+    parser.add_argument("--stock-prices", default="price_stock_deals.csv",
+                        help="Stock-deal price CSV (default: price_stock_deals.csv)")
+    parser.add_argument("--security-master", default=None,
+                        help="Read stock-deal prices through this security master directory instead")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (1 = in-process)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the result cache")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Print data-problem events as they happen (default: only a summary at the end)")
+    parser.add_argument("--metrics", default=None, metavar="PATH", help="Save the run's event counters as JSON")
+
+def _load_data(args):
+    import runner
+    return runner.load_shared_data(args.deals, args.cash_prices, args.stock_prices,
+                                   security_master_dir=args.security_master)
+
+def _cache_dir(args):
+    import result_cache
+    return None if args.no_cache else result_cache.DEFAULT_CACHE_DIR
+
+def _start_metrics(args) -> None:
+    import run_metrics
+    run_metrics.reset()
+    run_metrics.configure(verbose=args.verbose)
+
+def _finish_metrics(args) -> None:
+    import run_metrics
+    run_metrics.print_summary()
+    if args.metrics:
+        print(f"Run metrics saved to {run_metrics.write_summary(args.metrics)}")
+
+############################################
+# Subcommands
+############################################
+def cmd_ingest(args) -> int:
+    from deal_ingest import ingest
+
+    ingest(args.exports, deals_path=args.deals_table, target_prices_path=args.target_prices,
+           acquirer_prices_path=args.acquirer_prices, fetch=not args.no_fetch,
+           stock_only=not args.all_payment_types, max_workers=args.workers)
+    return 0
+
+def cmd_update_prices(args) -> int:
+    import price_universe
+
+    plan = price_universe.update_price_universe(
+        args.deals_table, args.store or price_universe.DEFAULT_UNIVERSE_DIR, as_of=args.as_of
+    )
+    if not plan.empty:
+        print(plan.groupby("reason")["rows"].agg(["count", "sum"]))
+    return 0
+
+def cmd_fetch(args) -> int:
+    import pandas as pd
+    from deal_ingest import stable_deal_ids
+    from visualize_price import expand_price_history, filter_only_us, process_rows
+
+    if args.deals_file.endswith((".xlsx", ".xls")):
+        us_deals_df = filter_only_us(args.deals_file)
+    else:
+        us_deals_df = pd.read_csv(args.deals_file)
+    processed_rows = process_rows(us_deals_df)
+    if not processed_rows:
+        print("No rows with valid price data were found.")
+        return 1
+
+    final_df = pd.DataFrame(processed_rows).reset_index(drop=True)
+    final_df["deal_id"] = stable_deal_ids(final_df)
+    final_df.to_csv(args.deals_output, index=False)
+    expand_price_history(final_df).to_csv(args.prices_output, index=False)
+    print(f"Saved {len(final_df)} deals to {args.deals_output} and prices to {args.prices_output}")
+    return 0
+
+def cmd_validate(args) -> int:
+    import pandas as pd
+
+    problems = []
+    deals_df = pd.read_csv(args.deals)
+    for col in ("deal_id", "Announce Date", "Completion/Termination Date", "Payment Type"):
+        if col not in deals_df.columns:
+            problems.append(f"{args.deals}: missing column '{col}'")
+    if "deal_id" in deals_df.columns and deals_df["deal_id"].duplicated().any():
+        problems.append(f"{args.deals}: {int(deals_df['deal_id'].duplicated().sum())} duplicate deal_id values")
+    for col in ("Announce Date", "Completion/Termination Date"):
+        if col in deals_df.columns:
+            bad = pd.to_datetime(deals_df[col], errors="coerce").isna() & deals_df[col].notna()
+            if bad.any():
+                problems.append(f"{args.deals}: {int(bad.sum())} unparseable values in '{col}'")
+
+    for path in args.prices:
+        price_df = pd.read_csv(path)
+        price_col = "price" if "price" in price_df.columns else "prc"
+        missing = [col for col in ("date", "deal_id", price_col) if col not in price_df.columns]
+        if missing:
+            problems.append(f"{path}: missing columns {missing}")
+            continue
+        key_cols = ["date", "deal_id"] + [col for col in ("leg", "price_type") if col in price_df.columns]
+        duplicates = int(price_df.duplicated(key_cols).sum())
+        if duplicates:
+            problems.append(f"{path}: {duplicates} duplicate {tuple(key_cols)} rows")
+        nan_prices = int(pd.to_numeric(price_df[price_col], errors="coerce").isna().sum())
+        if nan_prices:
+            problems.append(f"{path}: {nan_prices} missing/non-numeric prices")
+        if "deal_id" in deals_df.columns:
+            unpriced = set(deals_df["deal_id"]) - set(price_df["deal_id"])
+            print(f"{path}: {len(price_df)} rows, {len(unpriced)} deals in {args.deals} without prices")
+
+    for problem in problems:
+        print(f"PROBLEM: {problem}")
+    print("OK" if not problems else f"{len(problems)} problem(s) found")
+    return 1 if problems else 0
+
+def cmd_backtest(args) -> int:
+    import runner
+
+    start = time.perf_counter()
+    _start_metrics(args)
+    data = _load_data(args)
+    strategy_names = args.strategies or list(runner.STRATEGIES)
+    params = _strategy_overrides(runner.STRATEGIES, strategy_names, _parse_assignments(args.param))
+    results = runner.run_strategies(
+        data, strategy_names, params=params,
+        backtest_params=_parse_assignments(args.backtest_param),
+        max_workers=args.workers, cache_dir=_cache_dir(args)
+    )
+    if args.no_report:
+        stats_df = runner.build_stats_table(results)
+    else:
+        stats_df = runner.save_results(results, args.output_dir)
+    print(stats_df)
+    _finish_metrics(args)
+    print(f"Total run time: {time.perf_counter() - start:.1f}s")
+    return 0
+
+def cmd_sweep(args) -> int:
+    import runner
+
+    _start_metrics(args)
+    param_grid = _strategy_overrides(runner.STRATEGIES, [args.strategy],
+                                     _parse_assignments(args.param, multi=True))[args.strategy]
+    data = _load_data(args)
+    sweep_df = runner.run_sweep(
+        data, args.strategy, param_grid,
+        _parse_assignments(args.backtest_param, multi=True),
+        max_workers=args.workers, cache_dir=_cache_dir(args)
+    )
+    print(sweep_df.to_string(index=False))
+    if args.output:
+        sweep_df.to_csv(args.output, index=False)
+        print(f"Sweep results saved to {args.output}")
+    _finish_metrics(args)
+    return 0
+
+def cmd_report(args) -> int:
+    import os
+    import pandas as pd
+    from plotting import render_portfolio_charts
+    from report_generator import save_portfolio_report_summary_html
+
+    values_path = os.path.join(args.result_dir, "daily_portfolio_report.parquet")
+    portfolio_values_df = pd.read_parquet(values_path)
+    holdings_path = os.path.join(args.result_dir, "daily_portfolio_report_holdings.parquet")
+    if os.path.exists(holdings_path):
+        holdings_long = pd.read_parquet(holdings_path)
+        holdings = {
+            date: dict(zip(group["position"].astype(str), group["shares"]))
+            for date, group in holdings_long.groupby("date", observed=True)
+        }
+        portfolio_values_df["holdings"] = [holdings.get(date, {}) for date in portfolio_values_df.index]
+
+    title = args.title or os.path.basename(os.path.normpath(args.result_dir))
+    save_portfolio_report_summary_html(portfolio_values_df, os.path.join(args.result_dir, "daily_portfolio_report.html"))
+    print(f"Chart saved to {render_portfolio_charts(portfolio_values_df, os.path.join(args.result_dir, 'portfolio_performance.png'), title=title)}")
+    return 0
+
+def cmd_golden(args) -> int:
+    import golden_harness
+
+    return golden_harness.main(synthetic=args.synthetic, seed=args.seed, bundled=not args.no_bundled,
+                               engines=args.engines, repeat=args.repeat)
+
+############################################
+# Parser
+############################################
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="M&A arbitrage pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="Add deals from raw exports to the deal table and fetch their prices")
+    ingest.add_argument("exports", nargs="+", help="Raw deal exports (.csv or .xlsx)")
+    ingest.add_argument("--deals-table", default="deals_stock.csv")
+    ingest.add_argument("--target-prices", default="Target_Prices.csv")
+    ingest.add_argument("--acquirer-prices", default="Acquirer_Prices.csv")
+    ingest.add_argument("--no-fetch", action="store_true", help="Only parse and add deals; skip WRDS")
+    ingest.add_argument("--all-payment-types", action="store_true",
+                        help="Keep deals without a parsed exchange ratio (default: stock deals only)")
+    ingest.add_argument("--workers", type=int, default=4, help="Parse/fetch threads")
+    ingest.set_defaults(func=cmd_ingest)
+
+    update = subparsers.add_parser("update-prices", help="Fetch only new deals and pending-deal extensions into the price universe")
+    update.add_argument("--deals-table", default="deals_stock.csv")
+    update.add_argument("--store", default=None, help="Price universe directory (default: price_universe)")
+    update.add_argument("--as-of", default=None, help="Fetch pending deals up to this date (default: today)")
+    update.set_defaults(func=cmd_update_prices)
+
+    fetch = subparsers.add_parser("fetch", help="Fetch cash-deal target prices from WRDS (deals.csv / price.csv layout)")
+    fetch.add_argument("deals_file", help="Deal export (.xlsx, filtered to US targets) or deals CSV")
+    fetch.add_argument("--deals-output", default="deals.csv")
+    fetch.add_argument("--prices-output", default="price.csv")
+    fetch.set_defaults(func=cmd_fetch)
+
+    validate = subparsers.add_parser("validate", help="Check deal and price files for common data problems")
+    validate.add_argument("--deals", default="deals.csv")
+    validate.add_argument("--prices", nargs="+", default=["price.csv"])
+    validate.set_defaults(func=cmd_validate)
+
+    backtest = subparsers.add_parser("backtest", help="Run registered strategies and save their results")
+    backtest.add_argument("strategies", nargs="*", help="Strategy names (default: all registered)")
+    backtest.add_argument("--param", action="append", metavar="[STRATEGY.]KEY=VALUE",
+                          help="Strategy parameter override (bare keys go to every strategy that has them)")
+    backtest.add_argument("--backtest-param", action="append", metavar="KEY=VALUE", help="Backtest parameter")
+    backtest.add_argument("--output-dir", default="results")
+    backtest.add_argument("--no-report", action="store_true", help="Print the stats only; skip reports and charts")
+    _add_data_arguments(backtest)
+    backtest.set_defaults(func=cmd_backtest)
+
+    sweep = subparsers.add_parser("sweep", help="Run one strategy over a parameter grid")
+    sweep.add_argument("strategy")
+    sweep.add_argument("--param", action="append", metavar="KEY=V1,V2", help="Strategy parameter values")
+    sweep.add_argument("--backtest-param", action="append", metavar="KEY=V1,V2", help="Backtest parameter values")
+    sweep.add_argument("--output", default=None, help="Save the sweep table to this CSV")
+    _add_data_arguments(sweep)
+    sweep.set_defaults(func=cmd_sweep)
+
+    report = subparsers.add_parser("report", help="Rebuild the HTML report and charts from saved results")
+    report.add_argument("result_dir", help="A strategy directory written by `backtest`, e.g. results/cash")
+    report.add_argument("--title", default=None)
+    report.set_defaults(func=cmd_report)
+
+    golden = subparsers.add_parser("golden", help="Check every backtest engine against the reference loops")
+    golden.add_argument("--synthetic", type=int, default=5, help="Random cases per kind (stock and cash)")
+    golden.add_argument("--seed", type=int, default=0)
+    golden.add_argument("--no-bundled", action="store_true", help="Skip the cases on the bundled data")
+    golden.add_argument("--engines", nargs="+", default=None, help="Engines to check (default: all)")
+    golden.add_argument("--repeat", type=int, default=1, help="Timing runs per engine (best is reported)")
+    golden.set_defaults(func=cmd_golden)
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from deal_spreads import parse_offer_prices
+from security_master import clean_ticker
+
+DATE_COLUMNS = ['Announce Date', 'Amendment Date', 'Completion/Termination Date']
+NUMERIC_COLUMNS = ['Announced Total Value (mil.)', 'Announced Equity Value (mil.)', 'TV/EBITDA',
+                   'Acquirer Termination Fee']
+DEAL_KEY = ['Clean Target Ticker', 'Clean Acquirer Ticker', 'Announce Date']
+MIN_PRICE_ROWS = 4
+
+############################################
+# Reading Raw Exports
+############################################
+def read_exports(paths: Iterable[str], chunksize: Optional[int] = 50_000) -> Iterator[pd.DataFrame]:
+    """
+    Stream raw deal exports (CSV in chunks of `chunksize` rows, or whole .xlsx files)
+    as string frames, so large or many exports never have to be held at once.
+    """
+    for path in paths:
+        if os.path.splitext(path)[1].lower() in ('.xlsx', '.xls'):
+            yield pd.read_excel(path, sheet_name=0, dtype=str)
+        else:
+            yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+
+############################################
+# Normalization
+############################################
+def _parse_dates(values: pd.Series) -> pd.Series:
+    # Raw exports use M/D/Y; the saved deal tables use ISO dates
+    parsed = pd.to_datetime(values, format='%m/%d/%Y', errors='coerce')
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], format='ISO8601', errors='coerce')
+    return parsed
+
+def parse_exchange_ratios(stock_terms: pd.Series) -> pd.Series:
+    """
+    Vectorized `parse_exchange_ratio` from fetch_price.ipynb: the acquirer shares
+    per target share in strings like '.1285 Aqr sh./Tgt sh.', NaN otherwise.
+    """
+    ratio = stock_terms.astype('string').str.extract(r'([\d\.]+)\s*Aqr sh\./Tgt sh\.', expand=False)
+    return pd.to_numeric(ratio, errors='coerce').astype(float)
+
+def normalize_deals(raw_df: pd.DataFrame, stock_only: bool = True) -> pd.DataFrame:
+    """
+    Clean a raw export into the deal-table layout of deals_stock.csv, with every
+    step vectorized (the notebook's cleaning, column by column).
+
+    - strips whitespace and turns blank / 'N/A' cells into NaN;
+    - parses the date columns (M/D/Y or ISO) and the numeric columns;
+    - adds 'Exchange Ratio' (from 'Stock Terms'), 'Offer Price' (from 'Cash Terms')
+      and 'Clean Target Ticker' / 'Clean Acquirer Ticker';
+    - with stock_only=True keeps only deals with a parsed exchange ratio, as the
+      notebook did.
+    """
+    df = raw_df.copy()
+    for col in df.columns:
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype('string').str.strip().replace({'': pd.NA, 'N/A': pd.NA}).astype(object)
+
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = _parse_dates(df[col])
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    df['Exchange Ratio'] = parse_exchange_ratios(df['Stock Terms']) if 'Stock Terms' in df.columns else np.nan
+    df['Offer Price'] = parse_offer_prices(df['Cash Terms']) if 'Cash Terms' in df.columns else np.nan
+    df['Clean Target Ticker'] = clean_ticker(df['Target Ticker']).astype(object)
+    df['Clean Acquirer Ticker'] = clean_ticker(df['Acquirer Ticker']).astype(object)
+
+    df = df.dropna(subset=['Announce Date', 'Clean Target Ticker'])
+    if stock_only:
+        df = df[df['Exchange Ratio'].notna()]
+    return df.reset_index(drop=True)
+
+############################################
+# Deduplication and Deal IDs
+############################################
+def stable_deal_ids(deals_df: pd.DataFrame) -> pd.Series:
+    """
+    Deterministic deal ids derived from the deal itself: the first 31 bits of the
+    SHA-1 of 'TARGET|ACQUIRER|YYYY-MM-DD' (cleaned tickers, announce date). The same
+    deal gets the same id in every export and on every machine, so adding a deal
+    never renumbers the others.
+
+    Raises ValueError if two different deals hash to the same id.
+    """
+    target = clean_ticker(deals_df['Target Ticker']).fillna('')
+    acquirer = (clean_ticker(deals_df['Acquirer Ticker']).fillna('') if 'Acquirer Ticker' in deals_df.columns
+                else pd.Series('', index=deals_df.index))
+    announce = pd.to_datetime(deals_df['Announce Date']).dt.strftime('%Y-%m-%d')
+    keys = (target.str.upper() + '|' + acquirer.str.upper() + '|' + announce).astype(str)
+    ids = pd.Series([int.from_bytes(hashlib.sha1(k.encode()).digest()[:4], 'big') & 0x7FFFFFFF for k in keys],
+                    index=deals_df.index, dtype=np.int64)
+
+    distinct = pd.DataFrame({'key': keys, 'id': ids}).drop_duplicates()
+    if distinct['id'].duplicated().any():
+        clash = distinct[distinct['id'].duplicated(keep=False)]
+        raise ValueError(f"deal_id hash collision between deals {clash['key'].tolist()}")
+    return ids
+
+def merge_new_deals(existing_df: Optional[pd.DataFrame], new_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Drop incoming deals that are already in the deal table (same cleaned target and
+    acquirer tickers and announce date) or repeated within the batch, and give the
+    rest their `stable_deal_ids`. Ids already in the table are never changed.
+
+    Returns
+    -------
+    (merged_df, added_df)
+        The full updated deal table and just the newly added deals.
+    """
+    new_df = new_df.drop_duplicates(DEAL_KEY).copy()
+    if existing_df is not None and not existing_df.empty:
+        existing_keys = existing_df[DEAL_KEY].copy()
+        existing_keys['Announce Date'] = pd.to_datetime(existing_keys['Announce Date'])
+        known = pd.MultiIndex.from_frame(existing_keys)
+        new_df = new_df[~pd.MultiIndex.from_frame(new_df[DEAL_KEY]).isin(known)].copy()
+    new_df['deal_id'] = stable_deal_ids(new_df)
+    if existing_df is not None and new_df['deal_id'].isin(existing_df['deal_id']).any():
+        raise ValueError("A new deal's id collides with an existing deal_id in the table")
+
+    merged_df = pd.concat([existing_df, new_df], ignore_index=True) if existing_df is not None else new_df
+    return merged_df.reset_index(drop=True), new_df.reset_index(drop=True)
+
+############################################
+# Price Fetching (WRDS / CRSP)
+############################################
+def price_window(deal: pd.Series, as_of: Optional[pd.Timestamp] = None) -> Tuple[str, str]:
+    """
+    CRSP date window for a deal: the day after announcement until the day before
+    completion (the day after, for terminated or withdrawn deals). Pending deals
+    (no completion date) run until `as_of` (default: today).
+    """
+    start = deal['Announce Date'] + pd.Timedelta(days=1)
+    if pd.isna(deal['Completion/Termination Date']):
+        end = pd.Timestamp(as_of or pd.Timestamp.today().normalize())
+    elif deal.get('Deal Status') in ['Terminated', 'Withdrawn']:
+        end = deal['Completion/Termination Date'] + pd.Timedelta(days=1)
+    else:
+        end = deal['Completion/Termination Date'] - pd.Timedelta(days=1)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+def fetch_ticker_prices(db, ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """
+    Daily CRSP prices, returns and shares outstanding for `ticker` over the window,
+    averaged per date (tickers can map to several permnos).
+    """
+    query = f"""
+        SELECT d.date, d.permno, n.ticker, d.prc, d.ret, d.shrout
+        FROM crsp.dsf AS d
+        JOIN crsp.dsenames AS n
+          ON d.permno = n.permno
+        WHERE n.ticker = '{ticker}'
+          AND d.date BETWEEN '{start_date}' AND '{end_date}'
+          AND d.date BETWEEN n.namedt AND n.nameendt
+        ORDER BY d.date
+    """
+    prices = db.raw_sql(query)
+    if prices.empty:
+        return pd.DataFrame(columns=['date', 'prc', 'ret', 'shrout', 'ticker'])
+    prices['date'] = pd.to_datetime(prices['date'])
+    for col in ('prc', 'ret', 'shrout'):
+        prices[col] = pd.to_numeric(prices[col], errors='coerce')
+    prices = prices.groupby('date').agg({'prc': 'mean', 'ret': 'mean', 'shrout': 'mean'}).reset_index()
+    prices['ticker'] = ticker
+    return prices
+
+def fetch_deal_prices(db, deal: pd.Series, as_of: Optional[pd.Timestamp] = None) -> Optional[dict]:
+    """
+    Fetch both legs of one deal. Returns None (with a reason printed) when either
+    leg has fewer than MIN_PRICE_ROWS days, as the notebook skipped such deals.
+    """
+    start_date, end_date = price_window(deal, as_of)
+    legs = {}
+    for leg, ticker_col in (('target', 'Clean Target Ticker'), ('acquirer', 'Clean Acquirer Ticker')):
+        prices = fetch_ticker_prices(db, deal[ticker_col], start_date, end_date)
+        if len(prices) < MIN_PRICE_ROWS:
+            print(f"Skipping deal {deal['deal_id']}: {len(prices)} {leg} price rows for {deal[ticker_col]}")
+            return None
+        legs[leg] = prices
+
+    result = {'deal_id': deal['deal_id']}
+    for leg, prices in legs.items():
+        # Market cap on the first day of the window, if it was a trading day
+        first = prices.iloc[0]
+        on_start = first['date'] == pd.Timestamp(start_date)
+        result[f'{leg}_market_cap'] = abs(first['prc']) * first['shrout'] * 1000 if on_start else np.nan
+        prices = prices.drop(columns=['shrout'])
+        prices['prc'] = prices['prc'].abs()
+        prices['deal_id'] = deal['deal_id']
+        prices['price_type'] = leg
+        result[leg] = prices
+    return result
+
+############################################
+# Pipeline
+############################################
+async def ingest_async(
+    export_paths: List[str],
+    deals_path: str = 'deals_stock.csv',
+    target_prices_path: str = 'Target_Prices.csv',
+    acquirer_prices_path: str = 'Acquirer_Prices.csv',
+    connect: Optional[Callable] = None,
+    fetch: bool = True,
+    stock_only: bool = True,
+    max_workers: int = 4,
+    as_of: Optional[pd.Timestamp] = None
+) -> pd.DataFrame:
+    """
+    Ingest raw exports into the deal table and price files in one pass.
+
+    Parsing and price fetching overlap: each export chunk is normalized in a worker
+    thread, its new deals are deduplicated against the table and their WRDS fetches
+    are submitted immediately, while the next chunk is being parsed. Each worker
+    thread opens its own connection via `connect` (default: wrds.Connection).
+    Pending deals are fetched up to `as_of` (default: today). A deal whose fetch
+    fails is reported and left out, like a deal with too few prices. New deals are
+    appended to `deals_path` under its existing header; rows already there are not
+    rewritten.
+
+    Returns
+    -------
+    pd.DataFrame
+        The newly added deals (with market caps when fetched).
+    """
+    loop = asyncio.get_running_loop()
+    existing_df = pd.read_csv(deals_path, parse_dates=DATE_COLUMNS) if os.path.exists(deals_path) else None
+
+    if connect is None and fetch:
+        import wrds
+        connect = wrds.Connection
+    local = threading.local()
+    connections = []
+
+    def fetch_in_thread(deal: pd.Series) -> Optional[dict]:
+        if not hasattr(local, 'db'):
+            local.db = connect()
+            connections.append(local.db)
+        return fetch_deal_prices(local.db, deal, as_of)
+
+    added_frames, fetches, fetched_ids = [], [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        chunks = read_exports(export_paths)
+        while True:
+            raw_df = await loop.run_in_executor(executor, next, chunks, None)
+            if raw_df is None:
+                break
+            new_df = await loop.run_in_executor(executor, normalize_deals, raw_df, stock_only)
+            existing_df, added_df = merge_new_deals(existing_df, new_df)
+            print(f"Parsed {len(raw_df)} export rows: {len(added_df)} new deals")
+            added_frames.append(added_df)
+            if fetch:
+                fetches += [loop.run_in_executor(executor, fetch_in_thread, deal) for _, deal in added_df.iterrows()]
+                fetched_ids += added_df['deal_id'].tolist()
+        results = await asyncio.gather(*fetches, return_exceptions=True)
+        fetched = []
+        for deal_id, result in zip(fetched_ids, results):
+            if isinstance(result, Exception):
+                print(f"Skipping deal {deal_id}: price fetch failed ({type(result).__name__}: {result})")
+            elif result is not None:
+                fetched.append(result)
+
+    for db in connections:
+        db.close()
+
+    added_df = pd.concat(added_frames, ignore_index=True) if added_frames else pd.DataFrame()
+    if added_df.empty:
+        print("No new deals to add.")
+        return added_df
+
+    if fetch:
+        # Keep only deals whose prices were fetched, with their market caps
+        cap_cols = ['target_market_cap', 'acquirer_market_cap']
+        caps = pd.DataFrame([{k: r[k] for k in ['deal_id'] + cap_cols} for r in fetched],
+                            columns=['deal_id'] + cap_cols).set_index('deal_id')
+        added_df = added_df[added_df['deal_id'].isin(caps.index)].join(caps, on='deal_id')
+        for leg, path in (('target', target_prices_path), ('acquirer', acquirer_prices_path)):
+            frames = [r[leg] for r in fetched]
+            if frames:
+                prices = pd.concat(frames, ignore_index=True)[['date', 'prc', 'ret', 'ticker', 'deal_id', 'price_type']]
+                prices.to_csv(path, mode='a', header=not os.path.exists(path), index=False, date_format='%Y-%m-%d')
+
+    # Append only the new rows under the existing header, so the rows already in the
+    # (checked-in) deal table are left byte-for-byte as they are
+    if os.path.exists(deals_path):
+        columns = pd.read_csv(deals_path, nrows=0).columns
+        added_df.reindex(columns=columns).to_csv(deals_path, mode='a', header=False, index=False,
+                                                 date_format='%Y-%m-%d')
+    else:
+        added_df.to_csv(deals_path, index=False, date_format='%Y-%m-%d')
+    print(f"Added {len(added_df)} deals to {deals_path}")
+    return added_df
+
+def ingest(export_paths: List[str], **kwargs) -> pd.DataFrame:
+    """
+    Synchronous wrapper around `ingest_async`.
+    """
+    return asyncio.run(ingest_async(export_paths, **kwargs))
+
+def main():
+    added_df = ingest(["ma_export_32577375_201111.csv", "debug_orig.csv"])
+    if not added_df.empty:
+        print(added_df[['deal_id', 'Target Name', 'Acquirer Name', 'Announce Date', 'Exchange Ratio']])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import sys
+import time
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+import portfolio_kernel
+import result_cache
+from portfolio_kernel import build_arrays
+
+############################################
+# Unit Return Vectors
+############################################
+# Without cash constraints portfolio P&L is the sum of independent per-leg trade
+# P&Ls, and each leg's P&L is linear in its size. So each leg's daily P&L is
+# computed once for a unit position (one share at entry, following the leg's order
+# profile) and any sizing is valued as a sparse matrix-vector product.
+#
+# Vectors are stored as one contiguous segment per leg, CSR style: leg i's daily
+# P&L is pnl[indptr[i]:indptr[i + 1]] on calendar days start[i], start[i] + 1, ...
+# The segment runs from the leg's first order to its last (or to the end of the
+# calendar if the position is still open); outside it the leg's P&L is zero.
+
+def _with_legs(orders_df: pd.DataFrame) -> pd.DataFrame:
+    # Cash strategies trade a single leg per deal; give it a price_type so both
+    # engines share the (deal_id, price_type) key layout
+    orders_df = orders_df.rename(columns={'leg': 'price_type'})
+    if 'price_type' not in orders_df.columns:
+        orders_df = orders_df.assign(price_type='target')
+    return orders_df
+
+def order_profiles(orders_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Orders with shares divided by each leg's first order, i.e. the order pattern of
+    a unit position. Strategies that only differ in sizing share the same profiles.
+    """
+    orders_df = _with_legs(orders_df)
+    columns = ['date', 'deal_id', 'price_type', 'shares']
+    if 'fill_price' in orders_df.columns:
+        columns.append('fill_price')
+    profiles = orders_df[columns].sort_values('date', kind='stable')
+    entry_shares = profiles.groupby(['deal_id', 'price_type'], observed=True)['shares'].transform('first')
+    profiles = profiles[entry_shares != 0]
+    profiles['shares'] = profiles['shares'] / entry_shares[entry_shares != 0]
+    return profiles.astype({'price_type': str}).reset_index(drop=True)
+
+def unit_return_vectors(orders_df: pd.DataFrame, price_df: pd.DataFrame, price_column: str = 'price') -> dict:
+    """
+    Per-leg daily P&L of a unit position, with the backtesters' conventions (see
+    portfolio_kernel.build_arrays): a held position contributes 0 on days its key
+    has no price, and NaN prices are treated the same way. Orders with a
+    'fill_price' are entered at that price rather than the day's close.
+
+    Returns
+    -------
+    dict
+        'dates'   - the trading calendar
+        'legs'    - deal_id, price_type, entry_date, entry_price, entry_shares (the
+                    shares of the leg's first order in orders_df), start, length
+        'indptr'  - segment offsets into 'pnl' (len(legs) + 1)
+        'pnl'     - concatenated per-leg daily P&L segments
+        'day'     - calendar row of each 'pnl' entry
+    """
+    profiles = order_profiles(orders_df)
+    price_df = price_df.rename(columns={'leg': 'price_type'})
+    if 'price_type' not in price_df.columns:
+        price_df = price_df.assign(price_type='target')
+    arrays = build_arrays(profiles, price_df, price_column)
+
+    priced = np.where(arrays['has_price'] & ~np.isnan(arrays['prices']), arrays['prices'], 0.0)
+    positions = np.cumsum(arrays['deltas'], axis=0)
+    spent = np.cumsum(np.where(np.isnan(arrays['costs']), 0.0, arrays['costs']), axis=0)
+    contribution = positions * priced - spent
+    daily_pnl = np.diff(contribution, axis=0, prepend=0.0)
+
+    n_days = len(arrays['dates'])
+    start = arrays['has_order'].argmax(axis=0)
+    last_order = n_days - 1 - arrays['has_order'][::-1].argmax(axis=0)
+    still_open = positions[-1] != 0
+    end = np.where(still_open, n_days - 1, last_order)
+    length = end - start + 1
+
+    indptr = np.concatenate([[0], np.cumsum(length)])
+    leg = np.repeat(np.arange(len(length)), length)
+    day = np.arange(indptr[-1]) - indptr[leg] + start[leg]
+    pnl = daily_pnl[day, leg]
+
+    keys = arrays['keys']
+    first_orders = (_with_legs(orders_df).astype({'price_type': str}).sort_values('date', kind='stable')
+                    .groupby(['deal_id', 'price_type'], observed=True)['shares'].first())
+    legs = pd.DataFrame({
+        'deal_id': keys.get_level_values('deal_id'),
+        'price_type': keys.get_level_values('price_type'),
+        'entry_date': arrays['dates'][start],
+        'entry_price': priced[start, np.arange(len(start))],
+        'entry_shares': first_orders.reindex(keys).to_numpy(),
+        'start': start,
+        'length': length,
+    })
+    return {'dates': arrays['dates'], 'legs': legs, 'indptr': indptr, 'pnl': pnl, 'day': day}
+
+def cached_return_vectors(orders_df: pd.DataFrame, price_df: pd.DataFrame, price_column: str = 'price',
+                          cache_dir: Optional[str] = result_cache.DEFAULT_CACHE_DIR) -> dict:
+    """
+    `unit_return_vectors` through the result cache, keyed on the order profiles and
+    the prices, so re-sizing a strategy reuses the stored vectors.
+    """
+    if cache_dir is None:
+        return unit_return_vectors(orders_df, price_df, price_column)
+    key = result_cache.make_key("deal_returns", upstream=[result_cache.frame_digest(order_profiles(orders_df)),
+                                                          result_cache.frame_digest(price_df)],
+                                code=(sys.modules[__name__], portfolio_kernel), price_column=price_column)
+    return result_cache.cached(key, lambda: unit_return_vectors(orders_df, price_df, price_column), cache_dir)
+
+############################################
+# Valuation
+############################################
+def daily_pnl(vectors: dict, shares) -> np.ndarray:
+    """
+    Portfolio daily P&L for per-leg share counts (aligned with vectors['legs']), or
+    for a (n_legs x n_portfolios) matrix of them: a sparse matrix-vector product
+    done as a weighted bincount over the stored segments.
+    """
+    shares = np.asarray(shares, dtype=float)
+    leg = np.repeat(np.arange(len(vectors['legs'])), vectors['legs']['length'].to_numpy())
+    n_days = len(vectors['dates'])
+    if shares.ndim == 1:
+        return np.bincount(vectors['day'], weights=vectors['pnl'] * shares[leg], minlength=n_days)
+    pnl = np.zeros((n_days, shares.shape[1]))
+    np.add.at(pnl, vectors['day'], vectors['pnl'][:, None] * shares[leg])
+    return pnl
+
+def portfolio_values(vectors: dict, shares, initial_capital: float = 1_000_000) -> pd.Series:
+    """Daily portfolio value for per-leg share counts; matches the backtest's 'value'."""
+    values = initial_capital + np.cumsum(daily_pnl(vectors, shares))
+    return pd.Series(values, index=pd.Index(vectors['dates'], name='date'), name='value')
+
+def deal_pnl_matrix(vectors: dict, shares) -> pd.DataFrame:
+    """Dense date x deal_id daily P&L, with each deal's legs summed."""
+    legs = vectors['legs']
+    deal_codes, deal_ids = pd.factorize(legs['deal_id'], sort=True)
+    shares = np.asarray(shares, dtype=float)
+    leg = np.repeat(np.arange(len(legs)), legs['length'].to_numpy())
+    matrix = np.zeros((len(vectors['dates']), len(deal_ids)))
+    np.add.at(matrix, (vectors['day'], deal_codes[leg]), vectors['pnl'] * shares[leg])
+    return pd.DataFrame(matrix, index=pd.Index(vectors['dates'], name='date'),
+                        columns=pd.Index(deal_ids, name='deal_id'))
+
+############################################
+# Sizing Rules
+############################################
+# A sizing rule maps the legs table to per-leg signed share counts.
+SizingRule = Callable[[pd.DataFrame], np.ndarray]
+
+def as_generated(legs: pd.DataFrame) -> np.ndarray:
+    """The sizes the orders were generated with."""
+    return legs['entry_shares'].to_numpy(dtype=float)
+
+def fixed_shares(shares: int) -> SizingRule:
+    """Every leg trades `shares` shares, in its original direction (cash strategies)."""
+    return lambda legs: np.sign(legs['entry_shares'].to_numpy(dtype=float)) * shares
+
+def capital_sizing(capital_each_side: float, hedge_mode: str = "dollar",
+                   exchange_ratios: Optional[pd.Series] = None) -> SizingRule:
+    """
+    strategy_Shuhan.size_hedges as a sizing rule: the target gets
+    floor(capital / entry price) shares and the acquirer either the same capital
+    (hedge_mode='dollar') or round(Exchange Ratio x target shares) (hedge_mode='ratio',
+    with `exchange_ratios` indexed by deal_id). Deals that size_hedges would drop get 0.
+    """
+    def rule(legs: pd.DataFrame) -> np.ndarray:
+        price = legs['entry_price'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares = np.where(price > 0, np.floor_divide(capital_each_side, price), 0.0)
+        is_target = (legs['price_type'] == 'target').to_numpy()
+        target_shares = pd.Series(shares[is_target], index=legs['deal_id'][is_target]).groupby(level=0).first()
+        deal_target = legs['deal_id'].map(target_shares).to_numpy(dtype=float)
+        if hedge_mode == "ratio":
+            if exchange_ratios is None:
+                raise ValueError("hedge_mode='ratio' needs exchange_ratios")
+            ratio = legs['deal_id'].map(exchange_ratios).to_numpy(dtype=float)
+            shares = np.where(is_target, shares, np.where(ratio > 0, np.round(ratio * deal_target), 0.0))
+        elif hedge_mode != "dollar":
+            raise ValueError(f"Unknown hedge_mode '{hedge_mode}' (expected 'dollar' or 'ratio')")
+        shares = np.nan_to_num(shares)
+
+        # A deal trades only if both of its legs get shares
+        tradable = pd.Series(shares > 0).groupby(legs['deal_id'].to_numpy()).transform('all').to_numpy()
+        return np.where(tradable, np.sign(legs['entry_shares'].to_numpy(dtype=float)) * shares, 0.0)
+    return rule
+
+def sizing_sweep(vectors: dict, rules: dict, initial_capital: float = 1_000_000) -> pd.DataFrame:
+    """
+    Value every sizing rule ({name: rule}) from the same vectors.
+
+    Returns
+    -------
+    pd.DataFrame
+        Daily portfolio values, one column per rule.
+    """
+    shares = np.column_stack([rule(vectors['legs']) for rule in rules.values()])
+    values = initial_capital + np.cumsum(daily_pnl(vectors, shares), axis=0)
+    return pd.DataFrame(values, index=pd.Index(vectors['dates'], name='date'), columns=list(rules))
+
+def main():
+    import portfolio_kernel
+    import strategy_Shuhan
+    from stats_utils import compute_summary_stats
+
+    deals_df = strategy_Shuhan.load_deals("deals_stock.csv")
+    price_df = strategy_Shuhan.load_prices("price_stock_deals.csv")
+    orders_df = strategy_Shuhan.generate_orders(deals_df, price_df, capital_each_side=30000)
+
+    start = time.perf_counter()
+    vectors = cached_return_vectors(orders_df, price_df)
+    print(f"{len(vectors['legs'])} legs, {len(vectors['pnl'])} stored P&L days "
+          f"(dense: {len(vectors['legs']) * len(vectors['dates'])}) in {time.perf_counter() - start:.2f}s")
+
+    ratios = deals_df.drop_duplicates('deal_id').set_index('deal_id')['Exchange Ratio']
+    rules = {f"{mode} {capital:,}": capital_sizing(capital, mode, ratios)
+             for mode in ("dollar", "ratio") for capital in (10000, 30000, 50000, 100000)}
+    start = time.perf_counter()
+    values = sizing_sweep(vectors, rules)
+    print(f"Valued {len(rules)} sizing rules in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(pd.DataFrame({name: compute_summary_stats(values[name]) for name in values}).T)
+
+    check = portfolio_kernel.backtest(strategy_Shuhan.generate_orders(deals_df, price_df, 50000, "ratio"),
+                                      price_df, include_holdings=False)
+    print(f"Max difference vs full rerun (ratio 50,000): {np.nanmax(np.abs(check['value'] - values['ratio 50,000'])):.2e}")
+
+if __name__ == "__main__":
+    main()
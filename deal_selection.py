@@ -0,0 +1,315 @@
+import itertools
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from deal_returns import as_generated, deal_pnl_matrix, unit_return_vectors
+
+SIZE_COLUMN = 'Announced Total Value (mil.)'
+SIZE_QUARTILES = ['Q1', 'Q2', 'Q3', 'Q4']
+
+############################################
+# Per-Deal Contribution Vectors
+############################################
+def deal_contributions(orders_df: pd.DataFrame, price_df: pd.DataFrame, price_column: str = 'price') -> pd.DataFrame:
+    """
+    Date x deal_id matrix of each deal's contribution to portfolio value: the
+    mark-to-market value of its positions minus the cash spent on its orders so far.
+
+    Without cash constraints the backtest is linear in the orders, so the portfolio
+    value of any selection is initial_capital + contributions @ weights, where
+    weights[d] scales all of deal d's orders (1 = as generated, 0 = dropped). With
+    all weights 1 this equals portfolio_kernel.backtest(orders_df, price_df)['value'].
+    NaN prices are treated like missing ones (the position contributes 0 that day).
+    Built from the per-leg unit vectors of deal_returns.
+    """
+    vectors = unit_return_vectors(orders_df, price_df, price_column)
+    return deal_pnl_matrix(vectors, as_generated(vectors['legs'])).cumsum()
+
+############################################
+# Deal Features
+############################################
+def deal_features(deals_df: pd.DataFrame, panels: Optional[dict] = None, entry_offset: int = 1) -> pd.DataFrame:
+    """
+    Per-deal selection features, indexed by deal_id:
+      - 'size_quartile': Q1-Q4 of 'Announced Total Value (mil.)', as in
+        data_exploration.ipynb (quartile edges over the deals given);
+      - 'payment_type': 'Payment Type', stripped;
+      - 'spread': gross spread as a fraction ('Arb Spread (Gross)' / 100);
+      - 'implied_prob': the 'Implied Prob' column (see strategy_imp_prob.prepare_deals).
+
+    With `panels` from deal_spreads.compute_deal_panels, spread and implied
+    probability are instead read off the panels `entry_offset` priced days after
+    announcement (day 0 is the fallback-price day, where the implied probability is
+    0 by construction), falling back to the columns above where the panel has no value.
+    """
+    deals = deals_df.drop_duplicates('deal_id').set_index('deal_id')
+    features = pd.DataFrame(index=deals.index)
+    size = pd.to_numeric(deals[SIZE_COLUMN].astype(str).str.replace(',', '', regex=False), errors='coerce')
+    features['size_quartile'] = pd.qcut(size, 4, labels=SIZE_QUARTILES)
+    features['payment_type'] = deals['Payment Type'].astype(str).str.strip()
+    features['spread'] = (pd.to_numeric(deals['Arb Spread (Gross)'], errors='coerce') / 100
+                          if 'Arb Spread (Gross)' in deals.columns else np.nan)
+    features['implied_prob'] = (pd.to_numeric(deals['Implied Prob'], errors='coerce')
+                                if 'Implied Prob' in deals.columns else np.nan)
+
+    if panels is not None:
+        for feature, panel in (('spread', panels['spread']), ('implied_prob', panels['implied_prob'])):
+            values = panel.to_numpy(dtype=float)
+            priced = ~np.isnan(values)
+            # Row of the entry_offset-th priced day of each deal
+            rank = np.cumsum(priced, axis=0)
+            at_entry = priced & (rank == entry_offset + 1)
+            row = np.where(at_entry.any(axis=0), at_entry.argmax(axis=0), -1)
+            entry = np.where(row >= 0, values[np.maximum(row, 0), np.arange(values.shape[1])], np.nan)
+            entry = pd.Series(entry, index=panel.columns).reindex(features.index)
+            features[feature] = entry.fillna(features[feature])
+    return features
+
+############################################
+# Batch Scoring
+############################################
+def score_weights(
+    contributions: pd.DataFrame,
+    weights: np.ndarray,
+    initial_capital: float = 1_000_000,
+    chunk_size: int = 1024
+) -> pd.DataFrame:
+    """
+    Score many candidate portfolios at once. `weights` is (n_candidates x n_deals),
+    aligned with contributions.columns; each chunk of candidates is valued with a
+    single matrix product and scored with column-wise reductions.
+
+    Sharpe and max drawdown follow stats_utils.compute_sharpe_ratio and
+    compute_max_drawdown on the daily portfolio value.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per candidate: 'sharpe', 'max_drawdown', 'final_value', 'n_deals'.
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    matrix = contributions.to_numpy(dtype=float)
+    n_candidates = len(weights)
+    sharpe = np.empty(n_candidates)
+    max_drawdown = np.empty(n_candidates)
+    final_value = np.empty(n_candidates)
+
+    for start in range(0, n_candidates, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        values = initial_capital + matrix @ weights[chunk].T
+        returns = values[1:] / values[:-1] - 1
+        std = returns.std(axis=0, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe[chunk] = np.where(std > 0, np.sqrt(252) * returns.mean(axis=0) / std, np.nan)
+        peak = np.maximum.accumulate(values, axis=0)
+        max_drawdown[chunk] = ((values - peak) / peak).min(axis=0)
+        final_value[chunk] = values[-1]
+
+    return pd.DataFrame({
+        'sharpe': sharpe,
+        'max_drawdown': max_drawdown,
+        'final_value': final_value,
+        'n_deals': (weights != 0).sum(axis=1),
+    })
+
+def _objective(scores: pd.DataFrame, max_drawdown_limit: Optional[float]) -> np.ndarray:
+    # Sharpe to maximize; candidates breaching the drawdown limit (or unscorable) rank last
+    objective = scores['sharpe'].to_numpy(dtype=float).copy()
+    if max_drawdown_limit is not None:
+        objective[scores['max_drawdown'].to_numpy() < -max_drawdown_limit] = np.nan
+    return np.where(np.isnan(objective), -np.inf, objective)
+
+############################################
+# Candidate Generation
+############################################
+def _nonempty_subsets(values: Sequence) -> list:
+    return [combo for size in range(1, len(values) + 1) for combo in itertools.combinations(values, size)]
+
+def rule_candidates(
+    features: pd.DataFrame,
+    min_probs: Sequence[Optional[float]] = (None, 0.5, 0.75, 0.9),
+    min_spreads: Sequence[Optional[float]] = (None, 0.01, 0.02, 0.05),
+    max_spreads: Sequence[Optional[float]] = (None, 0.10, 0.20)
+) -> tuple:
+    """
+    Enumerate filter rules over the deal features: every non-empty set of size
+    quartiles x every non-empty set of payment types x the probability and spread
+    thresholds (None = no filter; a threshold excludes deals whose feature is NaN,
+    as the min_prob_threshold filter in strategy_imp_prob does).
+
+    Returns
+    -------
+    (pd.DataFrame, np.ndarray)
+        The rules (one row per rule) and their boolean (n_rules x n_deals) masks
+        over features.index. Rules that select no deal are dropped.
+    """
+    quartiles = _nonempty_subsets(SIZE_QUARTILES)
+    payments = _nonempty_subsets(sorted(features['payment_type'].dropna().unique()))
+    size = features['size_quartile'].astype(str).to_numpy()
+    payment = features['payment_type'].to_numpy()
+    prob = features['implied_prob'].to_numpy(dtype=float)
+    spread = features['spread'].to_numpy(dtype=float)
+
+    def threshold_masks(values, thresholds, above):
+        with np.errstate(invalid='ignore'):
+            return np.array([np.ones(len(values), dtype=bool) if t is None
+                             else (values >= t if above else values <= t) for t in thresholds])
+
+    dimensions = [
+        np.array([np.isin(size, combo) for combo in quartiles]),
+        np.array([np.isin(payment, combo) for combo in payments]),
+        threshold_masks(prob, min_probs, above=True),
+        threshold_masks(spread, min_spreads, above=True),
+        threshold_masks(spread, max_spreads, above=False),
+    ]
+    # Broadcast the per-dimension masks against each other: one row per combination
+    masks = np.ones((1, len(features)), dtype=bool)
+    for dimension in dimensions:
+        masks = (masks[:, None, :] & dimension[None, :, :]).reshape(-1, len(features))
+
+    rules = pd.DataFrame(
+        list(itertools.product(['+'.join(q) for q in quartiles], ['+'.join(p) for p in payments],
+                               min_probs, min_spreads, max_spreads)),
+        columns=['size_quartiles', 'payment_types', 'min_prob', 'min_spread', 'max_spread']
+    )
+    keep = masks.any(axis=1)
+    return rules[keep].reset_index(drop=True), masks[keep]
+
+def random_candidates(n_deals: int, n_candidates: int = 1000, density: float = 0.5, seed: int = 0) -> np.ndarray:
+    """Random 0/1 deal subsets, each deal included with probability `density`."""
+    rng = np.random.default_rng(seed)
+    return (rng.random((n_candidates, n_deals)) < density).astype(float)
+
+############################################
+# Search
+############################################
+def local_search(
+    contributions: pd.DataFrame,
+    start_weights: np.ndarray,
+    initial_capital: float = 1_000_000,
+    steps: Sequence[float] = (0.0, 0.5, 1.0, 1.5, 2.0),
+    max_drawdown_limit: Optional[float] = None,
+    max_rounds: int = 50
+) -> tuple:
+    """
+    Coordinate search over per-deal weights: each round scores, in one batch, every
+    portfolio that differs from the current one in a single deal's weight (set to
+    one of `steps`), and moves to the best if it improves the objective.
+    Starting from a 0/1 subset with steps (0, 1) this is add/drop subset search.
+
+    Returns
+    -------
+    (np.ndarray, pd.DataFrame)
+        The final weights and one row per round (its best score and the move made).
+    """
+    weights = np.asarray(start_weights, dtype=float).copy()
+    current = _objective(score_weights(contributions, weights[None, :], initial_capital), max_drawdown_limit)[0]
+    steps = np.asarray(steps, dtype=float)
+    n_deals = len(weights)
+    history = []
+
+    for round_number in range(max_rounds):
+        deal = np.repeat(np.arange(n_deals), len(steps))
+        step = np.tile(steps, n_deals)
+        moves = step != weights[deal]
+        deal, step = deal[moves], step[moves]
+        neighbours = np.repeat(weights[None, :], len(deal), axis=0)
+        neighbours[np.arange(len(deal)), deal] = step
+
+        scores = score_weights(contributions, neighbours, initial_capital)
+        objective = _objective(scores, max_drawdown_limit)
+        best = int(np.argmax(objective))
+        if objective[best] <= current:
+            break
+        weights = neighbours[best]
+        current = objective[best]
+        history.append({'round': round_number, 'deal_id': contributions.columns[deal[best]],
+                        'weight': step[best], **scores.iloc[best].to_dict()})
+    return weights, pd.DataFrame(history)
+
+def select_deals(
+    contributions: pd.DataFrame,
+    features: pd.DataFrame,
+    initial_capital: float = 1_000_000,
+    max_drawdown_limit: Optional[float] = None,
+    refine: bool = True,
+    steps: Sequence[float] = (0.0, 0.5, 1.0, 1.5, 2.0),
+    **rule_params
+) -> dict:
+    """
+    Pick the deal selection/weighting with the best backtested Sharpe (subject to an
+    optional max drawdown limit, e.g. 0.2 for -20%): score every `rule_candidates`
+    filter rule in batches, then refine the best rule's deal set with `local_search`.
+
+    Returns
+    -------
+    dict
+        'rules'   - every rule with its scores, best first
+        'weights' - pd.Series of the chosen per-deal weights
+        'search'  - the local search moves (empty if refine=False)
+        'rate'    - candidates scored per second during the rule scan
+    """
+    features = features.reindex(contributions.columns)
+    rules, masks = rule_candidates(features, **rule_params)
+    start = time.perf_counter()
+    scores = score_weights(contributions, masks, initial_capital)
+    rate = len(rules) / max(time.perf_counter() - start, 1e-9)
+
+    rules = pd.concat([rules, scores], axis=1)
+    rules['objective'] = _objective(scores, max_drawdown_limit)
+    order = np.argsort(-rules['objective'].to_numpy(), kind='stable')
+    rules, masks = rules.iloc[order].reset_index(drop=True), masks[order]
+
+    weights = masks[0].astype(float)
+    search = pd.DataFrame()
+    if refine:
+        weights, search = local_search(contributions, weights, initial_capital, steps, max_drawdown_limit)
+    return {
+        'rules': rules.drop(columns='objective'),
+        'weights': pd.Series(weights, index=contributions.columns, name='weight'),
+        'search': search,
+        'rate': rate,
+    }
+
+def apply_weights(orders_df: pd.DataFrame, weights: pd.Series) -> pd.DataFrame:
+    """Scale each deal's orders by its weight and drop the deals weighted 0."""
+    scale = orders_df['deal_id'].map(weights).fillna(0.0)
+    selected = orders_df[scale != 0].copy()
+    shares = selected['shares'] * scale[scale != 0]
+    if pd.api.types.is_integer_dtype(orders_df['shares']):
+        # Whole shares, so fractional weights only match the scores approximately
+        shares = shares.round().astype(orders_df['shares'].dtype)
+    selected['shares'] = shares
+    return selected
+
+def main():
+    import portfolio_kernel
+    import strategy_Shuhan
+    from deal_spreads import compute_deal_panels
+
+    deals_df = strategy_Shuhan.load_deals("deals_stock.csv")
+    price_df = strategy_Shuhan.load_prices("price_stock_deals.csv")
+    orders_df = strategy_Shuhan.generate_orders(deals_df, price_df, capital_each_side=30000)
+
+    contributions = deal_contributions(orders_df, price_df)
+    features = deal_features(deals_df, compute_deal_panels(deals_df, price_df, price_df))
+    print(f"{contributions.shape[1]} deals over {contributions.shape[0]} days")
+
+    result = select_deals(contributions, features, max_drawdown_limit=0.2)
+    print(f"Scored {len(result['rules'])} filter rules at {result['rate']:,.0f} candidates/s")
+    print(result['rules'].head(10).to_string(index=False))
+
+    random_scores = score_weights(contributions, random_candidates(contributions.shape[1], 5000))
+    print(f"Best of 5000 random subsets: Sharpe {random_scores['sharpe'].max():.2f}")
+
+    weights = result['weights']
+    print(f"Local search: {len(result['search'])} moves, {int((weights != 0).sum())} deals selected")
+    check = portfolio_kernel.backtest(apply_weights(orders_df, weights), price_df, include_holdings=False)
+    print(f"Chosen selection, full backtest (whole shares): final value {check['value'].iloc[-1]:,.2f}, "
+          f"scored {score_weights(contributions, weights.to_numpy())['final_value'].iloc[0]:,.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+############################################
+# Price Matrices
+############################################
+def price_matrix(price_df: pd.DataFrame, leg: Optional[str] = None, dates: Optional[pd.DatetimeIndex] = None) -> pd.DataFrame:
+    """
+    Pivot a long price frame into a date x deal_id matrix.
+
+    Parameters
+    ----------
+    price_df : pd.DataFrame
+        Columns 'date', 'deal_id', 'price' (price.csv layout), optionally with a
+        'leg' or 'price_type' column (price_stock_deals.csv / Target_Prices.csv layout).
+    leg : str, optional
+        Keep only rows of this leg ('target' or 'acquirer').
+    dates : pd.DatetimeIndex, optional
+        Row index to align to (default: the dates present in price_df).
+
+    Returns
+    -------
+    pd.DataFrame
+        Index: date, columns: deal_id, NaN where there is no price.
+    """
+    if leg is not None:
+        leg_col = 'leg' if 'leg' in price_df.columns else 'price_type'
+        price_df = price_df[price_df[leg_col] == leg]
+    price_col = 'price' if 'price' in price_df.columns else 'prc'
+    matrix = price_df.pivot_table(index='date', columns='deal_id', values=price_col, aggfunc='first')
+    if dates is not None:
+        matrix = matrix.reindex(dates)
+    return matrix
+
+def parse_offer_prices(cash_terms: pd.Series) -> pd.Series:
+    """
+    Vectorized version of `strategy_imp_prob.extract_offer_price`: the per-share
+    cash offer from strings like '54.20/sh.', NaN for anything else.
+    """
+    offer = cash_terms.astype('string').str.extract(r'^\s*([\d,]*\.?\d+)\s*/sh', expand=False)
+    return pd.to_numeric(offer.str.replace(',', '', regex=False), errors='coerce').astype(float)
+
+############################################
+# Spread and Implied Probability Panels
+############################################
+def compute_deal_panels(
+    deals_df: pd.DataFrame,
+    target_prices: pd.DataFrame,
+    acquirer_prices: Optional[pd.DataFrame] = None
+) -> dict:
+    """
+    Build date x deal panels of offer value, gross spread and implied completion
+    probability for every live deal, with broadcasting over the price matrices.
+
+    For cash deals the offer is the per-share cash offer parsed from 'Cash Terms';
+    for stock deals it is 'Exchange Ratio' x the acquirer's price that day. The gross
+    spread is (offer - target) / offer, the same convention as 'Arb Spread (Gross)'.
+    The implied probability follows `strategy_imp_prob.estimate_implied_probability`,
+    with the target's first price on/after announcement as the fallback price:
+    p = (target - fallback) / (offer - fallback), clipped to [0, 1].
+
+    Parameters
+    ----------
+    deals_df : pd.DataFrame
+        Deals with 'deal_id', 'Announce Date', 'Completion/Termination Date',
+        'Payment Type', and 'Cash Terms' and/or 'Exchange Ratio'.
+    target_prices : pd.DataFrame
+        Long target price frame (see `price_matrix`).
+    acquirer_prices : pd.DataFrame, optional
+        Long acquirer price frame; required for stock deals. May be the same frame
+        as target_prices if it carries a leg column.
+
+    Returns
+    -------
+    dict of pd.DataFrame (index: date, columns: deal_id)
+        'target', 'offer', 'spread', 'implied_prob' (NaN outside the live window)
+        and the boolean 'live' mask (announce date <= date <= completion date).
+    """
+    deals = deals_df.drop_duplicates('deal_id').set_index('deal_id')
+    has_leg = 'leg' in target_prices.columns or 'price_type' in target_prices.columns
+    target = price_matrix(target_prices, 'target' if has_leg else None)
+    target = target.reindex(columns=target.columns.intersection(deals.index))
+    deals = deals.loc[target.columns]
+    dates = target.index
+
+    payment = deals['Payment Type'].astype(str).str.strip().to_numpy()
+    is_stock = payment == 'Stock'
+
+    cash_offer = (parse_offer_prices(deals['Cash Terms']) if 'Cash Terms' in deals.columns
+                  else pd.Series(np.nan, index=deals.index)).to_numpy()
+    offer = np.broadcast_to(cash_offer[None, :], target.shape).copy()
+    if is_stock.any():
+        if acquirer_prices is None:
+            raise ValueError("Stock deals need acquirer_prices to compute exchange-ratio parity")
+        acquirer = price_matrix(acquirer_prices, 'acquirer', dates).reindex(columns=target.columns).to_numpy()
+        ratio = deals['Exchange Ratio'].to_numpy(dtype=float)
+        offer[:, is_stock] = acquirer[:, is_stock] * ratio[None, is_stock]
+
+    announce = pd.to_datetime(deals['Announce Date']).to_numpy()
+    completion = pd.to_datetime(deals['Completion/Termination Date']).to_numpy()
+    date_values = dates.to_numpy()
+    live = (date_values[:, None] >= announce[None, :]) & (date_values[:, None] <= completion[None, :])
+
+    target_values = target.to_numpy(dtype=float)
+    # Fallback price: first available target price on/after announcement
+    priced_live = live & ~np.isnan(target_values)
+    first_row = np.where(priced_live.any(axis=0), priced_live.argmax(axis=0), -1)
+    fallback = np.where(first_row >= 0, target_values[np.maximum(first_row, 0), np.arange(target.shape[1])], np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread = (offer - target_values) / offer
+        implied = np.clip((target_values - fallback[None, :]) / (offer - fallback[None, :]), 0.0, 1.0)
+    spread[~live] = np.nan
+    implied[~live] = np.nan
+
+    def frame(values):
+        return pd.DataFrame(values, index=dates, columns=target.columns)
+
+    return {
+        'target': frame(np.where(live, target_values, np.nan)),
+        'offer': frame(np.where(live, offer, np.nan)),
+        'spread': frame(spread),
+        'implied_prob': frame(implied),
+        'live': frame(live),
+    }
+
+if __name__ == "__main__":
+    from strategy_Shuhan import load_deals, load_prices
+
+    deals_df = load_deals("deals_stock.csv")
+    price_df = load_prices("price_stock_deals.csv")
+    panels = compute_deal_panels(deals_df, price_df, price_df)
+    print("Panel shape (dates x deals):", panels['spread'].shape)
+    print("Live deal-days:", int(panels['live'].to_numpy().sum()))
+    print(panels['spread'].stack().describe())
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+from event_scheduler import prepare_events_schedule
+
+############################################
+# Building the Interval Index
+############################################
+def _build_tree(starts: np.ndarray, ends: np.ndarray) -> dict:
+    """
+    Centered interval tree over [starts[i], ends[i]], stored as flat node lists.
+
+    Each node keeps the intervals containing its center twice: ordered by start
+    (ascending) and by end (descending), so a stabbing query reads only the
+    intervals that actually match at each of the O(log n) nodes it visits.
+    """
+    tree = {'center': [], 'by_start': [], 'start_keys': [], 'by_end': [], 'end_keys': [], 'left': [], 'right': []}
+    if len(starts) == 0:
+        return tree
+
+    def add_node(members: np.ndarray) -> int:
+        node = len(tree['center'])
+        center = np.median(np.concatenate([starts[members], ends[members]]))
+        here = members[(starts[members] <= center) & (ends[members] >= center)]
+        by_start = here[np.argsort(starts[here], kind='stable')]
+        by_end = here[np.argsort(-ends[here], kind='stable')]
+        tree['center'].append(center)
+        tree['by_start'].append(by_start)
+        tree['start_keys'].append(starts[by_start])
+        tree['by_end'].append(by_end)
+        tree['end_keys'].append(-ends[by_end])
+        tree['left'].append(-1)
+        tree['right'].append(-1)
+        return node
+
+    root = add_node(np.arange(len(starts)))
+    stack = [(root, np.arange(len(starts)))]
+    while stack:
+        node, members = stack.pop()
+        center = tree['center'][node]
+        for side, mask in (('left', ends[members] < center), ('right', starts[members] > center)):
+            child_members = members[mask]
+            if len(child_members):
+                child = add_node(child_members)
+                tree[side][node] = child
+                stack.append((child, child_members))
+    return tree
+
+def build_timeline(deals_df: pd.DataFrame) -> dict:
+    """
+    Interval index over deal lifetimes [Announce Date, Completion/Termination Date],
+    built from `prepare_events_schedule`'s announce-sorted schedule. Deals without a
+    completion date are treated as still live.
+
+    Returns
+    -------
+    dict
+        'schedule'     - the sorted schedule (event_id, deal_id, dates)
+        'deal_ids'     - deal id per schedule row
+        'starts'/'ends' - interval bounds as int64 nanoseconds
+        'sorted_ends'  - ends sorted ascending (for the sweep line)
+        'tree'         - centered interval tree over the intervals
+    """
+    schedule = prepare_events_schedule(deals_df.copy())
+    starts = schedule['Announce Date'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    completion = schedule['Completion/Termination Date']
+    ends = completion.fillna(pd.Timestamp.max).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    deal_ids = (schedule['deal_id'] if 'deal_id' in schedule.columns else schedule['event_id']).to_numpy()
+    return {
+        'schedule': schedule,
+        'deal_ids': deal_ids,
+        'starts': starts,
+        'ends': ends,
+        'sorted_ends': np.sort(ends),
+        'tree': _build_tree(starts, ends),
+    }
+
+############################################
+# Queries
+############################################
+def _stab(tree: dict, point: int) -> list:
+    hits = []
+    node = 0 if tree['center'] else -1
+    while node != -1:
+        center = tree['center'][node]
+        if point < center:
+            count = np.searchsorted(tree['start_keys'][node], point, side='right')
+            hits.append(tree['by_start'][node][:count])
+            node = tree['left'][node]
+        elif point > center:
+            count = np.searchsorted(tree['end_keys'][node], -point, side='right')
+            hits.append(tree['by_end'][node][:count])
+            node = tree['right'][node]
+        else:
+            hits.append(tree['by_start'][node])
+            break
+    return hits
+
+def live_deals(timeline: dict, date) -> np.ndarray:
+    """
+    Deal ids live on `date` (announced on/before it and not completed before it),
+    in O(log n + k).
+    """
+    point = pd.Timestamp(date).value
+    hits = _stab(timeline['tree'], point)
+    rows = np.concatenate(hits) if hits else np.array([], dtype=np.int64)
+    return timeline['deal_ids'][np.sort(rows)]
+
+def overlapping_deals(timeline: dict, start, end) -> np.ndarray:
+    """
+    Deal ids whose lifetime overlaps [start, end]: the deals live on `start` plus
+    the deals announced in (start, end], each found in O(log n + k).
+    """
+    start_ns, end_ns = pd.Timestamp(start).value, pd.Timestamp(end).value
+    hits = _stab(timeline['tree'], start_ns)
+    # The schedule is sorted by announce date, so later announcements are a slice
+    first = np.searchsorted(timeline['starts'], start_ns, side='right')
+    last = np.searchsorted(timeline['starts'], end_ns, side='right')
+    hits.append(np.arange(first, last))
+    rows = np.concatenate(hits)
+    return timeline['deal_ids'][np.sort(rows)]
+
+############################################
+# Sweep Line
+############################################
+def live_counts(timeline: dict, dates, weights: Optional[np.ndarray] = None) -> pd.Series:
+    """
+    Number of live deals on each of `dates` (or the sum of per-deal `weights`, e.g.
+    committed capital, aligned with timeline['deal_ids']), in one vectorized sweep:
+    opened-by-d minus closed-before-d, via binary search on the sorted endpoints.
+    """
+    dates = pd.DatetimeIndex(dates)
+    points = dates.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    opened_idx = np.searchsorted(timeline['starts'], points, side='right')
+    closed_idx = np.searchsorted(timeline['sorted_ends'], points, side='left')
+    if weights is None:
+        return pd.Series(opened_idx - closed_idx, index=dates, name='live_deals')
+
+    weights = np.asarray(weights, dtype=float)
+    opened_cum = np.concatenate([[0.0], np.cumsum(weights)])
+    closed_cum = np.concatenate([[0.0], np.cumsum(weights[np.argsort(timeline['ends'], kind='stable')])])
+    return pd.Series(opened_cum[opened_idx] - closed_cum[closed_idx], index=dates, name='live_weight')
+
+def main():
+    deals_df = pd.read_csv("deals_stock.csv")
+    timeline = build_timeline(deals_df)
+    dates = pd.date_range(timeline['schedule']['Announce Date'].min(), pd.Timestamp.today(), freq='B')
+    counts = live_counts(timeline, dates)
+    print(f"Deals: {len(timeline['deal_ids'])}, max live at once: {counts.max()} on {counts.idxmax().date()}")
+    print(f"Live on {counts.idxmax().date()}: {live_deals(timeline, counts.idxmax())}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import numpy as np
+
+############################################
+# Series Downsampling
+############################################
+def min_max_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Indices of the min and max of each of max_points // 2 equal buckets (plus the
+    first and last point), so that peaks and troughs survive downsampling.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    edges = np.linspace(0, n, max_points // 2 + 1).astype(int)
+    keep = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = values[start:end]
+        keep.extend((start + bucket.argmin(), start + bucket.argmax()))
+    return np.unique(keep)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last point and, from each of the max_points - 2 buckets in
+    between, the point forming the largest triangle with the previously kept point
+    and the mean of the next bucket.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        Coordinates of the series (x must be increasing, e.g. dates as int64).
+    max_points : int
+        Number of points to keep (at least 3).
+
+    Returns
+    -------
+    np.ndarray
+        Sorted indices of the kept points.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    keep = np.empty(max_points, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[prev] - avg_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (avg_y - y[prev])
+        )
+        prev = start + int(area.argmax())
+        keep[i + 1] = prev
+    return keep
@@ -17,8 +17,11 @@ def prepare_events_schedule(ma_df):
     events.sort_values(by="Announce Date", inplace=True)
     events.reset_index(drop=True, inplace=True)
     
-    # Return only essential columns
-    return events[["event_id", "Target Ticker", "Announce Date", "Completion/Termination Date"]]
+    # Return only essential columns (plus deal_id, when the table has one)
+    columns = ["event_id", "Target Ticker", "Announce Date", "Completion/Termination Date"]
+    if "deal_id" in events.columns:
+        columns.insert(1, "deal_id")
+    return events[columns]
 
 def main():
     deals_df = pd.read_excel("MA_deals_largest_100_past_20_years.xlsx", sheet_name=0)
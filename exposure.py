@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+############################################
+# Position and Price Matrices
+############################################
+def _with_leg(df: pd.DataFrame) -> pd.DataFrame:
+    # Orders/prices call the leg 'leg' (strategy_Shuhan) or 'price_type' (backtester_stock)
+    if 'leg' not in df.columns and 'price_type' in df.columns:
+        df = df.rename(columns={'price_type': 'leg'})
+    return df
+
+def position_matrix(orders_df: pd.DataFrame, dates: pd.DatetimeIndex) -> pd.DataFrame:
+    """
+    End-of-day shares held per (deal_id, leg), as a date x key matrix:
+    the cumulative sum of the orders pivoted onto the trading calendar.
+    """
+    orders_df = _with_leg(orders_df)
+    deltas = orders_df.pivot_table(index='date', columns=['deal_id', 'leg'], values='shares',
+                                   aggfunc='sum', observed=True)
+    return deltas.reindex(dates).fillna(0.0).cumsum()
+
+def key_price_matrix(price_df: pd.DataFrame, dates: pd.DatetimeIndex, keys: pd.MultiIndex) -> pd.DataFrame:
+    """
+    Daily price per (deal_id, leg) aligned to `dates` x `keys`, NaN where there is no price.
+    Duplicate (date, deal_id, leg) rows are averaged, as in backtester_stock.
+    """
+    price_df = _with_leg(price_df)
+    price_col = 'price' if 'price' in price_df.columns else 'prc'
+    matrix = price_df.pivot_table(index='date', columns=['deal_id', 'leg'], values=price_col,
+                                  aggfunc='mean', observed=True)
+    return matrix.reindex(index=dates, columns=keys)
+
+############################################
+# Exposure Analytics
+############################################
+def _long(matrix: pd.DataFrame, name: str) -> pd.Series:
+    stacked = matrix.stack()
+    return stacked[stacked != 0].rename(name)
+
+def compute_exposures(
+    orders_df: pd.DataFrame,
+    price_df: pd.DataFrame,
+    deal_legs: pd.DataFrame,
+    sector_map: Optional[pd.Series] = None
+) -> dict:
+    """
+    Aggregate daily dollar exposures by underlying security, deal and (optionally) sector.
+
+    A position is valued at that day's price for its (deal_id, leg) and contributes 0 on
+    days without a price, exactly as in backtester_stock.backtest. Exposures of the same
+    security held through different deals are summed (net) and summed in absolute value
+    (gross), so two deals shorting the same acquirer show up as one concentrated position.
+
+    Parameters
+    ----------
+    orders_df : pd.DataFrame
+        Orders with 'date', 'deal_id', 'leg' (or 'price_type') and 'shares'.
+    price_df : pd.DataFrame
+        Per-deal prices with 'date', 'deal_id', 'leg' (or 'price_type'), 'price' (or 'prc').
+    deal_legs : pd.DataFrame
+        Mapping with 'deal_id', 'leg', 'security_id' (security_master's 'deal_legs').
+    sector_map : pd.Series, optional
+        security_id -> sector label.
+
+    Returns
+    -------
+    dict of pd.DataFrame
+        'by_security' - date, security_id, net_exposure, gross_exposure
+        'by_deal'     - date, deal_id, net_exposure, gross_exposure
+        'by_sector'   - date, sector, net_exposure, gross_exposure (if sector_map given)
+        'concentration' - per date: gross_exposure, net_exposure, largest security share
+                          of gross and the Herfindahl index of |net| security exposures
+    """
+    orders_df = _with_leg(orders_df.copy())
+    orders_df['date'] = pd.to_datetime(orders_df['date'])
+    price_df = _with_leg(price_df)
+    dates = pd.DatetimeIndex(sorted(pd.to_datetime(price_df['date']).unique()))
+
+    positions = position_matrix(orders_df, dates)
+    prices = key_price_matrix(price_df, dates, positions.columns)
+    exposure = positions * prices.fillna(0.0)
+
+    mapping = deal_legs.set_index(['deal_id', 'leg'])['security_id']
+    security_ids = mapping.reindex(positions.columns).to_numpy()
+    if np.isnan(security_ids.astype(float)).any():
+        missing = positions.columns[pd.isna(security_ids)].tolist()
+        raise ValueError(f"No security_id for deal legs {missing[:5]}{'...' if len(missing) > 5 else ''}")
+    deal_ids = positions.columns.get_level_values('deal_id')
+
+    def grouped(keys, name):
+        net = exposure.T.groupby(keys).sum().T
+        gross = exposure.abs().T.groupby(keys).sum().T
+        frame = pd.concat([_long(net, 'net_exposure'), _long(gross, 'gross_exposure')], axis=1).fillna(0.0)
+        frame.index.names = ['date', name]
+        return frame.reset_index(), net
+
+    by_security, security_net = grouped(security_ids, 'security_id')
+    by_deal, _ = grouped(deal_ids, 'deal_id')
+    result = {'by_security': by_security, 'by_deal': by_deal}
+
+    if sector_map is not None:
+        sectors = sector_map.reindex(security_ids).fillna('Unknown').to_numpy()
+        result['by_sector'], _ = grouped(sectors, 'sector')
+
+    abs_net = security_net.abs()
+    total = abs_net.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = abs_net.div(total, axis=0)
+    result['concentration'] = pd.DataFrame({
+        'gross_exposure': exposure.abs().sum(axis=1),
+        'net_exposure': exposure.sum(axis=1),
+        'largest_security_share': shares.max(axis=1),
+        'herfindahl': (shares ** 2).sum(axis=1, min_count=1),
+    }, index=dates)
+    return result
+
+############################################
+# Order Netting
+############################################
+def net_orders_by_security(orders_df: pd.DataFrame, deal_legs: pd.DataFrame) -> pd.DataFrame:
+    """
+    Net offsetting orders on the same security on the same day before execution.
+
+    Returns security-level orders ('date', 'deal_id' = security_id, 'price_type' =
+    'security', 'shares', plus 'gross_shares' = sum of |deal-level shares|), ready for
+    backtester_stock.backtest with `security_price_frame` prices. Days where deals'
+    orders fully offset produce no order.
+    """
+    orders_df = _with_leg(orders_df)
+    mapped = orders_df.merge(deal_legs[['deal_id', 'leg', 'security_id']], on=['deal_id', 'leg'], how='left')
+    if mapped['security_id'].isna().any():
+        raise ValueError("Some orders have no security_id in deal_legs")
+    mapped['abs_shares'] = mapped['shares'].abs()
+    netted = mapped.groupby(['date', 'security_id'], as_index=False).agg(
+        shares=('shares', 'sum'), gross_shares=('abs_shares', 'sum')
+    )
+    netted = netted[netted['shares'] != 0].rename(columns={'security_id': 'deal_id'})
+    netted['price_type'] = 'security'
+    return netted[['date', 'deal_id', 'price_type', 'shares', 'gross_shares']]
+
+def security_price_frame(master: dict) -> pd.DataFrame:
+    """
+    Security-level prices from the security master in backtester_stock layout
+    ('deal_id' holds the security_id, 'price_type' is 'security').
+    """
+    prices = master['prices']
+    price_col = 'price' if 'price' in prices.columns else 'prc'
+    return pd.DataFrame({
+        'date': prices['date'],
+        'deal_id': prices['security_id'],
+        'price_type': 'security',
+        'price': prices[price_col].abs(),
+    })
+
+def turnover_report(orders_df: pd.DataFrame, price_df: pd.DataFrame, deal_legs: pd.DataFrame) -> pd.Series:
+    """
+    Traded notional with orders executed deal by deal versus netted by security.
+    """
+    orders_df = _with_leg(orders_df.copy())
+    price_df = _with_leg(price_df)
+    price_col = 'price' if 'price' in price_df.columns else 'prc'
+    priced = orders_df.merge(
+        price_df.groupby(['date', 'deal_id', 'leg'], as_index=False, observed=True)[price_col].mean(),
+        on=['date', 'deal_id', 'leg'], how='left'
+    ).merge(deal_legs[['deal_id', 'leg', 'security_id']], on=['deal_id', 'leg'], how='left')
+    priced['notional'] = priced['shares'] * priced[price_col]
+    gross = priced['notional'].abs().sum()
+    netted = priced.groupby(['date', 'security_id'])['notional'].sum().abs().sum()
+    return pd.Series({'gross_turnover': gross, 'netted_turnover': netted,
+                      'netting_saving': 1 - netted / gross if gross else np.nan})
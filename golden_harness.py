@@ -0,0 +1,256 @@
+import ast
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import backtester
+import backtester_stock
+import deal_returns
+import portfolio_kernel
+import sql_backtester
+
+############################################
+# Engines
+############################################
+# Every engine takes (orders_df, price_df) and returns a frame indexed by date with
+# 'value' and, where it produces them, 'invested_capital' and 'holdings'. The
+# reference loops get copies because they modify their inputs.
+Engine = Callable[[pd.DataFrame, pd.DataFrame], pd.DataFrame]
+
+def _unit_vector_backtest(orders_df: pd.DataFrame, price_df: pd.DataFrame) -> pd.DataFrame:
+    vectors = deal_returns.unit_return_vectors(orders_df, price_df)
+    return deal_returns.portfolio_values(vectors, deal_returns.as_generated(vectors['legs'])).to_frame()
+
+STOCK_ENGINES: Dict[str, Engine] = {
+    'reference': lambda o, p: backtester_stock.backtest(o.copy(), p.copy()),
+    'kernel': lambda o, p: portfolio_kernel.backtest(o, p),
+    'kernel_numpy': lambda o, p: portfolio_kernel.backtest(o, p, engine='numpy'),
+    'kernel_loop': lambda o, p: portfolio_kernel.backtest(o, p, engine='python'),
+    'sql': lambda o, p: sql_backtester.backtest(o, p),
+    'unit_vectors': _unit_vector_backtest,
+}
+
+def _as_cash_engine(engine: Engine) -> Engine:
+    """
+    Run a stock-layout engine on cash-layout frames (one leg per deal) and report
+    holdings the way backtester.backtest does: {deal_id: shares} for long positions.
+    """
+    def run(orders_df: pd.DataFrame, price_df: pd.DataFrame) -> pd.DataFrame:
+        result = engine(orders_df.assign(price_type='target'), price_df.assign(price_type='target'))
+        if 'holdings' in result.columns:
+            result['holdings'] = [
+                {int(deal_id): shares for (deal_id, _), shares in
+                 ((ast.literal_eval(key), shares) for key, shares in day.items()) if shares > 0}
+                for day in result['holdings']
+            ]
+        return result
+    return run
+
+CASH_ENGINES: Dict[str, Engine] = {
+    'reference': lambda o, p: backtester.backtest(o.copy(), p.copy()),
+    **{name: _as_cash_engine(engine) for name, engine in STOCK_ENGINES.items() if name != 'reference'},
+}
+
+ENGINES = {'stock': STOCK_ENGINES, 'cash': CASH_ENGINES}
+
+############################################
+# Cases
+############################################
+# A case is {'name', 'kind' ('stock' or 'cash'), 'orders', 'prices'} plus an
+# optional 'expected' frame; without one, engines are compared to the reference.
+
+def load_snapshot(path: str = "portfolio_daily_tracking.csv") -> pd.DataFrame:
+    """A saved backtester_stock.backtest output, with its holdings parsed back into dicts."""
+    snapshot = pd.read_csv(path, parse_dates=['date'], index_col='date')
+    snapshot['holdings'] = snapshot['holdings'].map(ast.literal_eval)
+    return snapshot
+
+def snapshot_orders(snapshot: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reconstruct the orders behind a saved backtest from its day-to-day holdings
+    changes (a position opened and closed on the same day leaves no trace).
+    """
+    positions = pd.DataFrame([{ast.literal_eval(key): shares for key, shares in day.items()}
+                              for day in snapshot['holdings']], index=snapshot.index).fillna(0)
+    positions.columns = pd.MultiIndex.from_tuples(positions.columns, names=['deal_id', 'price_type'])
+    changes = positions.diff()
+    changes.iloc[0] = positions.iloc[0]
+    orders = changes.stack(['deal_id', 'price_type'], future_stack=True)
+    orders = orders[orders != 0].rename('shares').reset_index()
+    orders['shares'] = orders['shares'].astype(int)
+    return orders.sort_values(['date', 'deal_id', 'price_type']).reset_index(drop=True)
+
+def bundled_cases(root: str = ".") -> List[dict]:
+    """
+    Cases on the bundled data:
+      - 'stock_strategy': strategy_Shuhan orders on price_stock_deals.csv;
+      - 'cash_buy_and_hold': 100 shares of every deal in price.csv, bought on its
+        first price date and sold on its last;
+      - 'snapshot': the orders behind portfolio_daily_tracking.csv replayed on
+        Target_Prices.csv + Acquirer_Prices.csv, checked against the snapshot itself.
+    """
+    import os
+    import strategy_Shuhan
+
+    path = lambda name: os.path.join(root, name)
+    deals_df = strategy_Shuhan.load_deals(path("deals_stock.csv"))
+    stock_prices = strategy_Shuhan.load_prices(path("price_stock_deals.csv"))
+    stock_orders = strategy_Shuhan.generate_orders(deals_df, stock_prices, capital_each_side=30000)
+
+    cash_prices = pd.read_csv(path("price.csv"), parse_dates=['date'])
+    window = cash_prices.groupby('deal_id')['date'].agg(['min', 'max']).reset_index()
+    cash_orders = pd.concat([
+        pd.DataFrame({'date': window['min'], 'deal_id': window['deal_id'], 'shares': 100}),
+        pd.DataFrame({'date': window['max'], 'deal_id': window['deal_id'], 'shares': -100}),
+    ], ignore_index=True)
+
+    snapshot = load_snapshot(path("portfolio_daily_tracking.csv"))
+    leg_prices = pd.concat([pd.read_csv(path("Target_Prices.csv"), parse_dates=['date']),
+                            pd.read_csv(path("Acquirer_Prices.csv"), parse_dates=['date'])], ignore_index=True)
+    return [
+        {'name': 'stock_strategy', 'kind': 'stock', 'orders': stock_orders, 'prices': stock_prices},
+        {'name': 'cash_buy_and_hold', 'kind': 'cash', 'orders': cash_orders, 'prices': cash_prices},
+        {'name': 'snapshot', 'kind': 'stock', 'orders': snapshot_orders(snapshot), 'prices': leg_prices,
+         'expected': snapshot},
+    ]
+
+def synthetic_case(seed: int, kind: str = 'stock', n_deals: int = 20, n_days: int = 250,
+                   missing_rate: float = 0.05, duplicate_rate: float = 0.02) -> dict:
+    """
+    Random but reproducible case: random-walk prices over each deal's lifetime with
+    missing days (and, for stock cases, duplicated price rows, which engines must
+    average), and one to three round trips per deal, the last sometimes left open
+    and some with several orders on one day. Orders always fall on days their leg
+    is priced.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2020-01-01', periods=n_days)
+    legs = ['target', 'acquirer'] if kind == 'stock' else ['target']
+    price_rows, order_rows = [], []
+
+    for deal_id in range(n_deals):
+        first, last = np.sort(rng.choice(n_days, size=2, replace=False))
+        days = np.arange(first, last + 1)
+        priced = {leg: days[rng.random(len(days)) >= missing_rate] for leg in legs}
+        for leg in legs:
+            path = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, len(priced[leg]))))
+            price_rows += [(dates[d], deal_id, leg, p) for d, p in zip(priced[leg], np.round(path, 2))]
+
+        tradable = np.intersect1d(*[priced[leg] for leg in legs]) if len(legs) > 1 else priced[legs[0]]
+        n_trades = min(len(tradable) // 2, rng.integers(1, 4)) * 2
+        if n_trades < 2:
+            continue
+        trade_days = np.sort(rng.choice(tradable, size=n_trades, replace=False))
+        for i in range(0, n_trades, 2):
+            size = int(rng.integers(1, 500))
+            entry, exit_ = trade_days[i], trade_days[i + 1]
+            add_on = int(rng.integers(1, 100)) if rng.random() < 0.3 else 0
+            keep_open = i + 2 >= n_trades and rng.random() < 0.2
+            for leg, sign in zip(legs, (1, -1)):
+                order_rows.append((dates[entry], deal_id, leg, sign * size))
+                if add_on:
+                    order_rows.append((dates[exit_], deal_id, leg, sign * add_on))
+                if not keep_open:
+                    order_rows.append((dates[exit_], deal_id, leg, -sign * (size + add_on)))
+
+    prices = pd.DataFrame(price_rows, columns=['date', 'deal_id', 'price_type', 'price'])
+    orders = pd.DataFrame(order_rows, columns=['date', 'deal_id', 'price_type', 'shares'])
+    if kind == 'stock':
+        duplicates = prices.sample(frac=duplicate_rate, random_state=seed)
+        prices = pd.concat([prices, duplicates.assign(price=duplicates['price'] + 0.5)], ignore_index=True)
+    else:
+        prices, orders = prices.drop(columns='price_type'), orders.drop(columns='price_type')
+    return {'name': f'synthetic_{kind}_{seed}', 'kind': kind, 'orders': orders, 'prices': prices}
+
+############################################
+# Comparison and Timing
+############################################
+def compare_outputs(expected: pd.DataFrame, actual: pd.DataFrame, atol: float = 1e-6) -> dict:
+    """
+    Diff two backtest outputs over the columns both have: the largest absolute
+    difference in 'value' and 'invested_capital' (NaN on both sides counts as equal)
+    and the number of days whose holdings differ.
+    """
+    report = {'max_value_diff': np.nan, 'max_invested_diff': np.nan, 'holdings_mismatch_days': np.nan}
+    if not expected.index.equals(actual.index):
+        report['passed'] = False
+        report['note'] = f"dates differ ({len(expected)} vs {len(actual)} rows)"
+        return report
+
+    passed = True
+    for column, key in (('value', 'max_value_diff'), ('invested_capital', 'max_invested_diff')):
+        if column in expected.columns and column in actual.columns:
+            e, a = expected[column].to_numpy(dtype=float), actual[column].to_numpy(dtype=float)
+            diff = np.where(np.isnan(e) & np.isnan(a), 0.0, np.abs(e - a))
+            report[key] = float(np.nan_to_num(diff, nan=np.inf).max(initial=0.0))
+            passed &= report[key] <= atol
+    if 'holdings' in expected.columns and 'holdings' in actual.columns:
+        mismatches = [day for day, e, a in zip(expected.index, expected['holdings'], actual['holdings']) if e != a]
+        report['holdings_mismatch_days'] = len(mismatches)
+        passed &= not mismatches
+        if mismatches:
+            report['note'] = f"first holdings mismatch on {mismatches[0].date()}"
+    report['passed'] = bool(passed)
+    return report
+
+def time_engine(engine: Engine, orders_df: pd.DataFrame, price_df: pd.DataFrame, repeat: int = 1) -> tuple:
+    """Best-of-`repeat` wall time of one engine, with its output."""
+    best, result = np.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = engine(orders_df, price_df)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def run_harness(cases: List[dict], engines: Optional[List[str]] = None, repeat: int = 1,
+                atol: float = 1e-6) -> pd.DataFrame:
+    """
+    Run every engine on every case, diff each against the case's expected output
+    (or the reference engine's) and time it.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per case and engine: seconds, speedup over the reference, the diff
+        report of `compare_outputs` and 'passed'. An engine that raises fails with
+        the error in 'note'.
+    """
+    rows = []
+    for case in cases:
+        kind_engines = ENGINES[case['kind']]
+        names = ['reference'] + [name for name in (engines or kind_engines) if name != 'reference']
+        reference, reference_time = time_engine(kind_engines['reference'], case['orders'], case['prices'], repeat)
+        expected = case.get('expected', reference)
+        for name in names:
+            if name == 'reference':
+                result, seconds = reference, reference_time
+            else:
+                try:
+                    result, seconds = time_engine(kind_engines[name], case['orders'], case['prices'], repeat)
+                except Exception as e:
+                    rows.append({'case': case['name'], 'engine': name, 'passed': False,
+                                 'note': f"{type(e).__name__}: {e}"})
+                    continue
+            rows.append({'case': case['name'], 'engine': name, 'seconds': seconds,
+                         'speedup': reference_time / seconds, **compare_outputs(expected, result, atol)})
+    columns = ['case', 'engine', 'seconds', 'speedup', 'max_value_diff', 'max_invested_diff',
+               'holdings_mismatch_days', 'passed', 'note']
+    return pd.DataFrame(rows).reindex(columns=columns)
+
+def main(synthetic: int = 5, seed: int = 0, bundled: bool = True, engines: Optional[List[str]] = None,
+         repeat: int = 1) -> int:
+    cases = bundled_cases() if bundled else []
+    cases += [synthetic_case(seed + i, kind) for i in range(synthetic) for kind in ('stock', 'cash')]
+    results = run_harness(cases, engines, repeat)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(results.to_string(index=False))
+    failed = results[~results['passed'].astype(bool)]
+    print(f"{len(results) - len(failed)}/{len(results)} engine runs match"
+          + ("" if failed.empty else f"; FAILED: {', '.join(failed['case'] + '/' + failed['engine'])}"))
+    return 1 if len(failed) else 0
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,313 @@
+import time
+import numpy as np
+import pandas as pd
+from typing import Callable, Optional
+
+from exposure import key_price_matrix, position_matrix
+
+############################################
+# Index Prices
+############################################
+# The hedge instrument trades in the backtesters as one more key: deal_id
+# HEDGE_DEAL_ID (and price_type 'index' for backtester_stock), with its prices
+# appended to the deal prices by `with_index_prices`.
+HEDGE_DEAL_ID = -1
+HEDGE_LEG = 'index'
+
+def load_index_prices(path: str, price_column: Optional[str] = None) -> pd.Series:
+    """
+    Daily index/ETF prices from a local CSV with a 'date' column and a price column
+    (`price_column`, else the first of 'adj_close', 'close', 'price', 'prc').
+    Returns a Series indexed by date; duplicate dates are averaged.
+    """
+    index_df = pd.read_csv(path)
+    index_df.columns = [c.lower().replace(' ', '_') for c in index_df.columns]
+    index_df['date'] = pd.to_datetime(index_df['date'])
+    if price_column is None:
+        candidates = [c for c in ('adj_close', 'close', 'price', 'prc') if c in index_df.columns]
+        if not candidates:
+            raise ValueError(f"No price column in {path}; pass price_column (columns: {list(index_df.columns)})")
+        price_column = candidates[0]
+    return index_df.groupby('date')[price_column].mean().abs().rename('index')
+
+def with_index_prices(price_df: pd.DataFrame, index_prices: pd.Series) -> pd.DataFrame:
+    """
+    price_df with the index appended as the hedge key, on the deal price calendar
+    only (the backtesters' calendar is every date in price_df) and forward-filled
+    over days the index did not trade, so an open hedge is never valued at 0.
+    """
+    dates = pd.DatetimeIndex(np.sort(pd.to_datetime(price_df['date']).unique()))
+    prices = index_prices.reindex(index_prices.index.union(dates)).ffill().reindex(dates).dropna()
+    leg_col = 'leg' if 'leg' in price_df.columns else ('price_type' if 'price_type' in price_df.columns else None)
+    price_col = 'price' if 'price' in price_df.columns else 'prc'
+    rows = pd.DataFrame({'date': prices.index, 'deal_id': HEDGE_DEAL_ID, price_col: prices.to_numpy()})
+    if leg_col is not None:
+        rows[leg_col] = HEDGE_LEG
+    return pd.concat([price_df.assign(date=pd.to_datetime(price_df['date'])), rows], ignore_index=True)
+
+############################################
+# Rolling Betas
+############################################
+def rolling_betas(returns: pd.DataFrame, index_returns: pd.Series, window: int = 60,
+                  min_periods: int = 20) -> pd.DataFrame:
+    """
+    Rolling OLS beta of every column of `returns` on `index_returns`, all columns
+    and days at once.
+
+    Each column uses only the days where both it and the index have a return, so
+    the regression sums differ per column; they are kept as running sums over the
+    date x column matrix and windowed by differencing, making the whole estimate
+    a handful of cumulative sums rather than a loop over deals.
+
+    Parameters
+    ----------
+    returns : pd.DataFrame
+        Date x key daily returns (NaN where a key has none).
+    index_returns : pd.Series
+        Daily index returns, aligned to returns.index.
+    window : int, optional
+        Trading days in each regression window.
+    min_periods : int, optional
+        Minimum paired observations for a beta; fewer gives NaN.
+
+    Returns
+    -------
+    pd.DataFrame
+        Betas estimated from returns up to and including each day.
+    """
+    y = returns.to_numpy(dtype=float)
+    x = np.broadcast_to(index_returns.reindex(returns.index).to_numpy(dtype=float)[:, None], y.shape)
+    paired = np.isfinite(y) & np.isfinite(x)
+    x = np.where(paired, x, 0.0)
+    y = np.where(paired, y, 0.0)
+
+    def windowed(values):
+        running = np.cumsum(values, axis=0)
+        running[window:] = running[window:] - running[:-window]
+        return running
+
+    n = windowed(paired.astype(float))
+    sum_x, sum_y = windowed(x), windowed(y)
+    sum_xx, sum_xy = windowed(x * x), windowed(x * y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_x = sum_xx - sum_x * sum_x / n
+        beta = (sum_xy - sum_x * sum_y / n) / var_x
+    beta[(n < min_periods) | ~(var_x > 1e-12 * np.maximum(n, 1))] = np.nan
+    return pd.DataFrame(beta, index=returns.index, columns=returns.columns)
+
+def _key_returns(prices: pd.DataFrame) -> pd.DataFrame:
+    # Return between consecutive calendar days only; a missing price breaks the pair
+    return prices / prices.shift(1) - 1
+
+############################################
+# Dollar Beta and Hedge Orders
+############################################
+def _with_leg(df: pd.DataFrame) -> pd.DataFrame:
+    # Cash orders/prices have one leg per deal and no leg column
+    if 'leg' not in df.columns and 'price_type' not in df.columns:
+        df = df.assign(leg='target')
+    return df
+
+def dollar_betas(
+    orders_df: pd.DataFrame,
+    price_df: pd.DataFrame,
+    index_prices: pd.Series,
+    window: int = 60,
+    min_periods: int = 20,
+    default_beta: float = 0.0
+) -> dict:
+    """
+    Daily dollar beta of the book, position by position: each open (deal_id, leg)
+    position's market value times its rolling beta to the index.
+
+    Positions are valued as in the backtesters (0 on days without a price).
+    Positions whose key does not yet have `min_periods` paired returns get
+    `default_beta`.
+
+    Returns
+    -------
+    dict of pd.DataFrame
+        'betas'       - date x key rolling betas
+        'exposure'    - date x key market value of the open positions
+        'dollar_beta' - per date: 'gross_exposure', 'net_exposure', 'dollar_beta'
+    """
+    orders_df = _with_leg(orders_df.assign(date=pd.to_datetime(orders_df['date'])))
+    price_df = _with_leg(price_df.assign(date=pd.to_datetime(price_df['date'])))
+    dates = pd.DatetimeIndex(np.sort(price_df['date'].unique()))
+    positions = position_matrix(orders_df, dates)
+    prices = key_price_matrix(price_df, dates, positions.columns)
+    index_returns = _key_returns(index_prices.reindex(dates))
+
+    betas = rolling_betas(_key_returns(prices), index_returns, window, min_periods)
+    exposure = positions * prices.fillna(0.0)
+    return {
+        'betas': betas,
+        'exposure': exposure,
+        'dollar_beta': pd.DataFrame({
+            'gross_exposure': exposure.abs().sum(axis=1),
+            'net_exposure': exposure.sum(axis=1),
+            'dollar_beta': (exposure * betas.fillna(default_beta)).sum(axis=1),
+        }, index=pd.Index(dates, name='date')),
+    }
+
+def book_dollar_beta(portfolio_values: pd.Series, index_prices: pd.Series, window: int = 60,
+                     min_periods: int = 20) -> pd.Series:
+    """
+    Dollar beta of the whole book from its daily values: the rolling beta of the
+    portfolio's returns to the index times the portfolio value.
+    """
+    index_returns = _key_returns(index_prices.reindex(portfolio_values.index))
+    returns = _key_returns(portfolio_values.to_frame('book'))
+    beta = rolling_betas(returns, index_returns, window, min_periods)['book']
+    return (beta.fillna(0.0) * portfolio_values).rename('dollar_beta')
+
+def hedge_orders(
+    dollar_beta: pd.Series,
+    index_prices: pd.Series,
+    rebalance_every: int = 5,
+    min_trade: int = 1,
+    leg_column: Optional[str] = 'leg'
+) -> pd.DataFrame:
+    """
+    Index orders that keep the book's dollar beta near zero: every
+    `rebalance_every` trading days the hedge is reset to
+    -round(dollar beta / index price) shares; trades smaller than `min_trade`
+    shares are skipped.
+
+    Returns
+    -------
+    pd.DataFrame
+        Orders with 'date', 'deal_id' (HEDGE_DEAL_ID), 'shares' and, unless
+        leg_column is None, a leg column set to 'index' - ready to concatenate
+        with the strategy's orders.
+    """
+    prices = index_prices.reindex(index_prices.index.union(dollar_beta.index)).ffill().reindex(dollar_beta.index)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        target = -np.round(dollar_beta.to_numpy(dtype=float) / prices.to_numpy(dtype=float))
+    rebalance_days = np.arange(0, len(target), rebalance_every)
+
+    # Hedge held after each rebalance; a small or unpriced change keeps the old hedge
+    current, after = 0.0, []
+    for value in target[rebalance_days]:
+        if np.isfinite(value) and abs(value - current) >= min_trade:
+            current = value
+        after.append(current)
+    held = np.repeat(after, np.diff(np.append(rebalance_days, len(target))))
+    trades = np.diff(held, prepend=0.0)
+    traded = trades != 0
+    orders_df = pd.DataFrame({'date': dollar_beta.index[traded], 'deal_id': HEDGE_DEAL_ID,
+                              'shares': trades[traded].astype(np.int64)})
+    if leg_column is not None:
+        orders_df[leg_column] = HEDGE_LEG
+    return orders_df
+
+############################################
+# Hedged Backtest and Report
+############################################
+def _default_backtest(orders_df: pd.DataFrame) -> Callable:
+    if 'leg' in orders_df.columns or 'price_type' in orders_df.columns:
+        import backtester_stock
+        return backtester_stock.backtest
+    import backtester
+    return backtester.backtest
+
+def hedge_report(unhedged_df: pd.DataFrame, hedged_df: pd.DataFrame, index_prices: pd.Series) -> pd.DataFrame:
+    """
+    Summary stats (stats_utils.compute_summary_stats) of the unhedged and hedged
+    runs, plus the realized full-period beta and correlation of their daily
+    returns to the index.
+    """
+    from stats_utils import compute_summary_stats
+
+    rows = {}
+    for name, portfolio_values_df in (('unhedged', unhedged_df), ('hedged', hedged_df)):
+        values = portfolio_values_df['value']
+        returns = _key_returns(values.to_frame('book'))['book']
+        index_returns = _key_returns(index_prices.reindex(values.index))
+        paired = pd.concat([returns, index_returns], axis=1).replace([np.inf, -np.inf], np.nan).dropna()
+        stats = compute_summary_stats(values)
+        stats['realized_beta'] = paired.cov().iloc[0, 1] / paired.iloc[:, 1].var()
+        stats['index_correlation'] = paired.corr().iloc[0, 1]
+        rows[name] = stats
+    return pd.DataFrame(rows).T
+
+def hedged_backtest(
+    orders_df: pd.DataFrame,
+    price_df: pd.DataFrame,
+    index_prices: pd.Series,
+    mode: str = 'positions',
+    window: int = 60,
+    min_periods: int = 20,
+    rebalance_every: int = 5,
+    initial_capital: float = 1_000_000,
+    backtest: Optional[Callable] = None
+) -> dict:
+    """
+    Run a strategy with and without an index hedge overlay.
+
+    Parameters
+    ----------
+    orders_df, price_df : pd.DataFrame
+        Strategy orders and prices, as for the backtester that runs them.
+    index_prices : pd.Series
+        Index prices by date (see `load_index_prices`).
+    mode : str, optional
+        'positions' - dollar beta summed from per-position rolling betas;
+        'book'      - rolling beta of the unhedged portfolio's own returns.
+    window, min_periods : int, optional
+        Rolling regression window and minimum observations.
+    rebalance_every : int, optional
+        Trading days between hedge rebalances.
+    initial_capital : float, optional
+        Starting cash for both runs.
+    backtest : callable, optional
+        backtest(orders_df, price_df, initial_capital) to use; defaults to
+        backtester_stock.backtest for orders with legs, else backtester.backtest.
+
+    Returns
+    -------
+    dict
+        'unhedged', 'hedged' - backtest outputs
+        'hedge_orders'       - the index orders added
+        'dollar_beta'        - the dollar beta the hedge targets
+        'report'             - `hedge_report`
+    """
+    backtest = backtest or _default_backtest(orders_df)
+    unhedged = backtest(orders_df.copy(), price_df.copy(), initial_capital)
+    if mode == 'positions':
+        dollar_beta = dollar_betas(orders_df, price_df, index_prices, window, min_periods)['dollar_beta']['dollar_beta']
+    elif mode == 'book':
+        dollar_beta = book_dollar_beta(unhedged['value'], index_prices, window, min_periods)
+    else:
+        raise ValueError(f"Unknown mode '{mode}' (expected 'positions' or 'book')")
+
+    leg_column = next((c for c in ('leg', 'price_type') if c in orders_df.columns), None)
+    hedges = hedge_orders(dollar_beta, index_prices, rebalance_every, leg_column=leg_column)
+    hedged_orders = pd.concat([orders_df.assign(date=pd.to_datetime(orders_df['date'])), hedges],
+                              ignore_index=True).sort_values('date', kind='stable')
+    hedged = backtest(hedged_orders, with_index_prices(price_df, index_prices), initial_capital)
+    return {
+        'unhedged': unhedged, 'hedged': hedged, 'hedge_orders': hedges, 'dollar_beta': dollar_beta,
+        'report': hedge_report(unhedged, hedged, index_prices),
+    }
+
+def main(index_csv: str = "index_prices.csv"):
+    import strategy_Shuhan
+
+    index_prices = load_index_prices(index_csv)
+    deals_df = strategy_Shuhan.load_deals("deals_stock.csv")
+    price_df = strategy_Shuhan.load_prices("price_stock_deals.csv")
+    orders_df = strategy_Shuhan.generate_orders(deals_df, price_df, capital_each_side=30000)
+
+    start = time.perf_counter()
+    betas = dollar_betas(orders_df, price_df, index_prices)
+    print(f"Rolling betas for {betas['betas'].shape[1]} keys x {betas['betas'].shape[0]} days "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    for mode in ('positions', 'book'):
+        result = hedged_backtest(orders_df, price_df, index_prices, mode=mode)
+        print(f"\n{mode} hedge ({len(result['hedge_orders'])} index orders):")
+        print(result['report'][['final_value', 'cagr', 'sharpe', 'max_drawdown', 'realized_beta', 'index_correlation']])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from typing import Optional, Union
+
+import portfolio_kernel
+from price_schema import compact_prices
+
+############################################
+# Bar Layout
+############################################
+# Intraday bars are kept as one timestamp-sorted columnar table per key: bars are
+# sorted by (key, timestamp), so each key's bars - and within them each day's
+# bars - are contiguous runs, addressed CSR style by their start offsets. The
+# daily valuation path only ever sees one end-of-day price per (date, key), so
+# the number of bars per day only affects the single pass that builds it.
+FILL_RULES = ('close', 'next_open', 'vwap')
+
+def _composite(major: np.ndarray, minor_rank: np.ndarray, n_minor: int) -> np.ndarray:
+    # Sortable (key, rank) pairs as one int64; timestamps are replaced by their rank
+    # so the product cannot overflow
+    return major.astype(np.int64) * (n_minor + 1) + minor_rank
+
+def load_bars(source: Union[pd.DataFrame, str]) -> pd.DataFrame:
+    """
+    Load intraday bars into the compact schema, sorted by key and timestamp.
+
+    Parameters
+    ----------
+    source : pd.DataFrame or str
+        A bar frame, a CSV/Parquet file or a price_store directory. Must contain
+        columns 'timestamp', 'deal_id', 'price_type' (or 'leg') and 'price', and
+        optionally 'volume'. Daily prices (a 'date' column only) load as one bar
+        per day.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns timestamp, date, deal_id, price_type, price and (if given) volume.
+    """
+    if isinstance(source, str):
+        if os.path.isdir(source):
+            import price_store
+            source = price_store.read_prices(source)
+        elif source.endswith('.parquet'):
+            source = pd.read_parquet(source)
+        else:
+            source = pd.read_csv(source)
+    bars = source.rename(columns={'leg': 'price_type'})
+    if 'timestamp' not in bars.columns:
+        bars = bars.rename(columns={'date': 'timestamp'})
+    columns = ['timestamp', 'deal_id', 'price_type', 'price'] + (['volume'] if 'volume' in bars.columns else [])
+    bars = compact_prices(bars[columns])
+    bars['timestamp'] = pd.to_datetime(bars['timestamp'])
+    bars.insert(1, 'date', bars['timestamp'].dt.normalize())
+    return bars.sort_values(['deal_id', 'price_type', 'timestamp'], kind='stable').reset_index(drop=True)
+
+def bar_layout(bars: pd.DataFrame) -> dict:
+    """
+    Array layout of loaded bars (see `load_bars`).
+
+    Returns
+    -------
+    dict
+        'keys'        - (deal_id, price_type) MultiIndex
+        'key'         - key code of each bar
+        'timestamp'   - int64 nanosecond timestamps of the bars
+        'times', 'bar_code' - the distinct timestamps, and each bar's (key,
+                        timestamp rank) as one sorted int64 for next-bar lookups
+        'price', 'volume' - bar prices and volumes (volume is None if not given)
+        'group_start' - offsets of the (key, day) runs, plus the total bar count
+        'group_key', 'group_date' - key code and date of each run
+    """
+    deal_id = bars['deal_id'].to_numpy()
+    price_type = pd.Categorical(bars['price_type']).codes
+    timestamp = bars['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    date = bars['date'].to_numpy(dtype='datetime64[ns]')
+
+    # Keys are contiguous runs, so key codes are a running count of key changes
+    new_key = np.ones(len(deal_id), dtype=np.bool_)
+    new_key[1:] = (deal_id[1:] != deal_id[:-1]) | (price_type[1:] != price_type[:-1])
+    key_start = np.flatnonzero(new_key)
+    key = np.cumsum(new_key) - 1
+    keys = pd.MultiIndex.from_arrays([deal_id[key_start], np.asarray(bars['price_type'].iloc[key_start], dtype=str)],
+                                     names=['deal_id', 'price_type'])
+    if not keys.is_unique or np.any(np.diff(timestamp)[~new_key[1:]] < 0):
+        raise ValueError("Bars must be sorted by key and timestamp (use load_bars)")
+
+    times, time_rank = np.unique(timestamp, return_inverse=True)
+    new_group = np.ones(len(key), dtype=np.bool_)
+    new_group[1:] = (key[1:] != key[:-1]) | (date[1:] != date[:-1])
+    group_start = np.flatnonzero(new_group)
+    return {
+        'keys': keys,
+        'key': key,
+        'timestamp': timestamp,
+        'times': times,
+        'bar_code': _composite(key, time_rank, len(times)),
+        'price': bars['price'].to_numpy(dtype=float),
+        'volume': bars['volume'].to_numpy(dtype=float) if 'volume' in bars.columns else None,
+        'group_start': np.append(group_start, len(key)),
+        'group_key': key[group_start],
+        'group_date': date[group_start],
+    }
+
+def eod_prices(layout: dict) -> pd.DataFrame:
+    """
+    End-of-day prices: the last bar of every (key, day), in the daily price layout
+    the backtesters take (date, deal_id, price_type, price).
+    """
+    last_bar = layout['group_start'][1:] - 1
+    keys = layout['keys'][layout['group_key']]
+    return pd.DataFrame({
+        'date': layout['group_date'],
+        'deal_id': keys.get_level_values('deal_id'),
+        'price_type': keys.get_level_values('price_type'),
+        'price': layout['price'][last_bar],
+    })
+
+############################################
+# Fills
+############################################
+def fill_prices(orders_df: pd.DataFrame, layout: dict, fill: str = 'next_open') -> pd.DataFrame:
+    """
+    Attach an intraday fill price to every order.
+
+    Parameters
+    ----------
+    orders_df : pd.DataFrame
+        Orders as for backtester_stock.backtest, optionally with a 'timestamp'
+        column giving the time the signal was generated (default: the order
+        date at midnight, i.e. before that day's first bar).
+    layout : dict
+        From `bar_layout`.
+    fill : str, optional
+        'close'     - the last bar of the order date (the daily backtest's fill);
+        'next_open' - the first bar strictly after the signal; the order moves to
+                      that bar's date if it falls on a later day;
+        'vwap'      - the volume-weighted average price of the order date's bars
+                      (their plain mean if the bars have no volume).
+
+    Returns
+    -------
+    pd.DataFrame
+        orders_df with a 'fill_price' column (and 'date' updated for next_open).
+        Orders that cannot be filled (no bar for their key and day, or none after
+        the signal) are reported and dropped.
+    """
+    if fill not in FILL_RULES:
+        raise ValueError(f"Unknown fill '{fill}'; expected one of {FILL_RULES}")
+    orders_df = orders_df.rename(columns={'leg': 'price_type'})
+    order_key = layout['keys'].get_indexer(
+        pd.MultiIndex.from_arrays([orders_df['deal_id'], orders_df['price_type'].astype(str)]))
+    order_date = pd.to_datetime(orders_df['date']).to_numpy(dtype='datetime64[ns]')
+
+    if fill == 'next_open':
+        signal = (pd.to_datetime(orders_df['timestamp']) if 'timestamp' in orders_df.columns
+                  else pd.to_datetime(orders_df['date'])).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        times = layout['times']
+        bar_pos = np.searchsorted(layout['bar_code'],
+                                  _composite(order_key, np.searchsorted(times, signal, side='right'), len(times)))
+        bar = np.minimum(bar_pos, len(layout['key']) - 1)
+        filled = (order_key >= 0) & (bar_pos < len(layout['key'])) & (layout['key'][bar] == order_key)
+        fill_price = layout['price'][bar]
+        group = np.searchsorted(layout['group_start'], bar, side='right') - 1
+        order_date = np.where(filled, layout['group_date'][group], order_date)
+    else:
+        days, group_rank = np.unique(layout['group_date'], return_inverse=True)
+        day_rank = np.searchsorted(days, order_date)
+        known_day = days[np.minimum(day_rank, len(days) - 1)] == order_date
+        group_codes = _composite(layout['group_key'], group_rank, len(days))
+        group = np.searchsorted(group_codes, _composite(order_key, day_rank, len(days)))
+        group = np.minimum(group, len(group_codes) - 1)
+        filled = (order_key >= 0) & known_day & (group_codes[group] == _composite(order_key, day_rank, len(days)))
+        if fill == 'close':
+            fill_price = layout['price'][layout['group_start'][1:] - 1][group]
+        else:
+            starts = layout['group_start'][:-1]
+            counts = np.diff(layout['group_start'])
+            volume = layout['volume'] if layout['volume'] is not None else np.ones(len(layout['price']))
+            traded = np.add.reduceat(layout['price'] * volume, starts)
+            total = np.add.reduceat(volume, starts)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                vwap = np.where(total > 0, traded / total, np.add.reduceat(layout['price'], starts) / counts)
+            fill_price = vwap[group]
+
+    if not filled.all():
+        dropped = orders_df[~filled]
+        print(f"Dropping {len(dropped)} orders with no '{fill}' fill: deals {sorted(dropped['deal_id'].unique())}")
+    orders_df = orders_df.assign(date=order_date, fill_price=np.where(filled, fill_price, np.nan))
+    return orders_df[filled].reset_index(drop=True)
+
+############################################
+# Backtest
+############################################
+def backtest(
+    orders_df: pd.DataFrame,
+    bars: Union[pd.DataFrame, dict],
+    fill: str = 'next_open',
+    initial_capital: float = 1_000_000,
+    stop_loss: Optional[float] = None,
+    min_cash: Optional[float] = None,
+    include_holdings: bool = True,
+    engine: str = 'auto'
+) -> pd.DataFrame:
+    """
+    Backtest orders against intraday bars: orders fill at the `fill` bar (see
+    `fill_prices`) and positions are valued at the end-of-day price.
+
+    Parameters
+    ----------
+    orders_df : pd.DataFrame
+        As in backtester_stock.backtest, optionally with a signal 'timestamp'.
+    bars : pd.DataFrame or dict
+        Bars from `load_bars`, or their `bar_layout` (reuse it across runs).
+    fill : str, optional
+        'close', 'next_open' or 'vwap'.
+    initial_capital, stop_loss, min_cash, include_holdings, engine
+        As in portfolio_kernel.backtest.
+
+    Returns
+    -------
+    pd.DataFrame
+        Same layout as backtester_stock.backtest, one row per day with bars.
+    """
+    layout = bars if isinstance(bars, dict) else bar_layout(bars)
+    return portfolio_kernel.backtest(fill_prices(orders_df, layout, fill), eod_prices(layout), initial_capital,
+                                     stop_loss=stop_loss, min_cash=min_cash, include_holdings=include_holdings,
+                                     engine=engine)
+
+def synthetic_bars(price_df: pd.DataFrame, bars_per_day: int = 8, volatility: float = 0.002,
+                   seed: int = 0) -> pd.DataFrame:
+    """
+    Expand daily closes into `bars_per_day` evenly spaced bars from 09:30 to 16:00
+    whose last bar is the close (a random walk back from it), with random volumes.
+    For exercising the intraday path on the daily data sets.
+    """
+    rng = np.random.default_rng(seed)
+    price_df = price_df.rename(columns={'leg': 'price_type'})
+    n = len(price_df)
+    steps = rng.normal(0.0, volatility, size=(n, bars_per_day))
+    steps[:, -1] = 0.0
+    walk = np.exp(np.cumsum(steps[:, ::-1], axis=1)[:, ::-1])
+    offsets = pd.to_timedelta(np.linspace(9.5, 16.0, bars_per_day), unit='h')
+    return pd.DataFrame({
+        'timestamp': (pd.to_datetime(price_df['date']).to_numpy().repeat(bars_per_day)
+                      + np.tile(offsets.to_numpy(), n)),
+        'deal_id': price_df['deal_id'].to_numpy().repeat(bars_per_day),
+        'price_type': price_df['price_type'].to_numpy().repeat(bars_per_day),
+        'price': (price_df['price'].to_numpy()[:, None] * walk).ravel(),
+        'volume': rng.integers(100, 10_000, size=n * bars_per_day),
+    })
+
+def main():
+    import strategy_Shuhan
+
+    deals_df = strategy_Shuhan.load_deals("deals_stock.csv")
+    price_df = strategy_Shuhan.load_prices("price_stock_deals.csv")
+    orders_df = strategy_Shuhan.generate_orders(deals_df, price_df, capital_each_side=30000)
+    price_df = price_df.dropna(subset=['price']).drop_duplicates(['date', 'deal_id', 'leg'])
+    daily = portfolio_kernel.backtest(orders_df, price_df, include_holdings=False)
+
+    for bars_per_day in (1, 8, 78):
+        start = time.perf_counter()
+        layout = bar_layout(load_bars(synthetic_bars(price_df, bars_per_day)))
+        layout_time = time.perf_counter() - start
+        results = {}
+        start = time.perf_counter()
+        for fill in FILL_RULES:
+            results[fill] = backtest(orders_df, layout, fill, include_holdings=False)
+        run_time = (time.perf_counter() - start) / len(FILL_RULES)
+        print(f"{bars_per_day:>3} bars/day: {len(layout['key']):>9,} bars, layout {layout_time:.2f}s, "
+              f"{run_time:.3f}s per backtest")
+        print(f"    close fills vs daily backtest: max difference "
+              f"{np.nanmax(np.abs(results['close']['value'] - daily['value'])):.2e}")
+        print("    final values: " + ", ".join(f"{fill} {results[fill]['value'].iloc[-1]:,.2f}" for fill in FILL_RULES))
+
+if __name__ == "__main__":
+    main()
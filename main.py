@@ -1,13 +1,13 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 from strategy import generate_orders_from_deals
 from backtester import backtest
 from stats_utils import compute_cagr, compute_sharpe_ratio, compute_max_drawdown
-from report_generator import save_portfolio_report_csv, save_portfolio_report_html
+from plotting import render_portfolio_charts
+from price_schema import read_price_csv
+from report_generator import save_portfolio_report_parquet, save_portfolio_report_summary_html
 
 def main():
     # 1) Load price data and extract trading dates
-    price_df = pd.read_csv("price.csv", parse_dates=["date"])
+    price_df = read_price_csv("price.csv")
     
     trading_dates = sorted(price_df['date'].unique())
 
@@ -39,30 +39,11 @@ def main():
     print("Sharpe Ratio:", sharpe)
     print("Max Drawdown:", max_dd)
 
-    fig, axes = plt.subplots(nrows=1, ncols=2, figsize=(14, 6), sharex=True)
-
-    # Plot 1: Total Portfolio Value
-    axes[0].plot(portfolio_values_df.index, portfolio_values_df['value'], label='Portfolio Value', linewidth=2)
-    axes[0].set_title('Portfolio Value Over Time')
-    axes[0].set_xlabel('Date')
-    axes[0].set_ylabel('USD')
-    axes[0].grid(True)
-    axes[0].legend()
-
-    # Plot 2: Invested Capital
-    axes[1].plot(portfolio_values_df.index, portfolio_values_df['invested_capital'], label='Invested Capital', linewidth=2, color='orange')
-    axes[1].set_title('Invested Capital Over Time')
-    axes[1].set_xlabel('Date')
-    axes[1].set_ylabel('USD')
-    axes[1].grid(True)
-    axes[1].legend()
-
-    plt.tight_layout()
-    plt.show()
+    render_portfolio_charts(portfolio_values_df, "portfolio_performance.png")
 
     # 6) Generate a daily portfolio document
-    save_portfolio_report_csv(portfolio_values_df, "daily_portfolio_report.csv")
-    save_portfolio_report_html(portfolio_values_df, "daily_portfolio_report.html")
+    save_portfolio_report_parquet(portfolio_values_df, "daily_portfolio_report.parquet")
+    save_portfolio_report_summary_html(portfolio_values_df, "daily_portfolio_report.html")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,366 @@
+import asyncio
+import csv
+import os
+import time
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from price_schema import compact_prices
+
+############################################
+# Replay Server
+############################################
+# Stand-in for a live feed: historical prices are grouped into one bar per date
+# (every (deal_id, price_type) priced that day, duplicates averaged as in
+# backtester_stock.backtest) and streamed to subscriber queues over asyncio.
+# A bar is (date, key indices, prices), the indices pointing into server['keys'].
+
+def make_replay_server(price_df: pd.DataFrame, price_column: str = 'price') -> dict:
+    """Precompute the bars of a price frame and return the (not yet running) server."""
+    price_df = price_df.rename(columns={'leg': 'price_type'})
+    if 'prc' in price_df.columns and 'price' not in price_df.columns:
+        price_df = price_df.rename(columns={'prc': 'price'})
+    if price_column != 'price':
+        price_df = price_df.drop(columns=['price'], errors='ignore').rename(columns={price_column: 'price'})
+    price_df = compact_prices(price_df[['date', 'deal_id', 'price_type', 'price']])
+    price_df['date'] = pd.to_datetime(price_df['date'])
+    prices = price_df.groupby(['date', 'deal_id', 'price_type'], observed=True)['price'].mean().reset_index()
+    prices['price_type'] = prices['price_type'].astype(str)
+
+    keys = pd.MultiIndex.from_frame(prices[['deal_id', 'price_type']].drop_duplicates()).sort_values()
+    key_idx = keys.get_indexer(pd.MultiIndex.from_frame(prices[['deal_id', 'price_type']]))
+    day_codes, dates = pd.factorize(prices['date'], sort=True)
+    bounds = np.searchsorted(day_codes, np.arange(len(dates) + 1))
+    values = prices['price'].to_numpy(dtype=float)
+    bars = [(dates[d], key_idx[bounds[d]:bounds[d + 1]], values[bounds[d]:bounds[d + 1]]) for d in range(len(dates))]
+    return {'keys': keys, 'dates': dates, 'bars': bars, 'subscribers': []}
+
+def subscribe(server: dict, maxsize: int = 1000) -> asyncio.Queue:
+    """A queue receiving every bar the server streams, then None at the end of the feed."""
+    queue = asyncio.Queue(maxsize=maxsize)
+    server['subscribers'].append(queue)
+    return queue
+
+async def run_replay(server: dict, bars_per_second: Optional[float] = None) -> int:
+    """
+    Stream the bars to all subscribers, at `bars_per_second` (None = as fast as
+    the subscribers consume them). Returns the number of bars sent.
+    """
+    interval = None if not bars_per_second else 1.0 / bars_per_second
+    next_time = time.perf_counter()
+    for bar in server['bars']:
+        for queue in server['subscribers']:
+            await queue.put(bar)
+        if interval is not None:
+            next_time += interval
+            await asyncio.sleep(max(0.0, next_time - time.perf_counter()))
+    for queue in server['subscribers']:
+        await queue.put(None)
+    return len(server['bars'])
+
+############################################
+# Order Sources
+############################################
+# An order source is called once per bar as source(date, bar_price), bar_price
+# holding every key's price on the bar (NaN where it has none), and returns the
+# orders to execute on that bar as a list of (key index, shares), or of
+# (key index, shares, price) to fill at a carried-forward price instead of the
+# bar's (closing a leg that stopped printing at its last known price); such fills
+# are marked 'stale' for the sink.
+
+def scheduled_orders(orders_df: pd.DataFrame, keys: pd.MultiIndex) -> Callable:
+    """
+    Replay a precomputed orders frame (e.g. strategy_Shuhan.generate_orders) bar
+    by bar; the paper portfolio then matches backtester_stock.backtest exactly.
+    """
+    orders_df = orders_df.rename(columns={'leg': 'price_type'})
+    key_idx = keys.get_indexer(pd.MultiIndex.from_arrays([orders_df['deal_id'], orders_df['price_type'].astype(str)]))
+    if (key_idx < 0).any():
+        first = orders_df[key_idx < 0].iloc[0]
+        raise ValueError(f"Price not found for date {first['date']}, deal_id {first['deal_id']}, "
+                         f"price_type {first['price_type']}")
+    by_date = {}
+    for date, key, shares in zip(pd.to_datetime(orders_df['date']), key_idx, orders_df['shares']):
+        by_date.setdefault(date, []).append((key, shares))
+    return lambda date, bar_price: by_date.get(date, [])
+
+def forward_stock_strategy(deals_df: pd.DataFrame, keys: pd.MultiIndex, capital_each_side: float = 30000,
+                           hedge_mode: str = "dollar", stale_bars: Optional[int] = None) -> Callable:
+    """
+    strategy_Shuhan's rule decided bar by bar without look-ahead: a deal is entered
+    (long target, short acquirer, sized as in size_hedges at that bar's prices) on
+    the first bar on/after its announce date with both legs priced, and exited
+    either on the first bar with both legs priced whose next business day is after
+    its completion date, or - when its legs stop printing - at the prices of its
+    last bar with both legs priced, once the completion date has passed.
+
+    The backtest exits on the last bar with prices on/before completion, so a deal
+    whose prices end early is closed at the same prices, only recorded on a later
+    bar (its position is valued at 0 on the unpriced bars in between, as in the
+    backtest). Those fills are marked 'stale' in the sink payload. A gap before
+    completion (e.g. a halted leg) keeps the deal open unless `stale_bars` is set,
+    in which case it is also closed at its last prices after that many bars
+    without both legs priced (opt-in: this exits earlier than the backtest).
+    """
+    deals = deals_df.drop_duplicates('deal_id').sort_values('Announce Date')
+    target_idx = keys.get_indexer(pd.MultiIndex.from_arrays([deals['deal_id'], np.repeat('target', len(deals))]))
+    acquirer_idx = keys.get_indexer(pd.MultiIndex.from_arrays([deals['deal_id'], np.repeat('acquirer', len(deals))]))
+    announce = pd.to_datetime(deals['Announce Date']).to_numpy()
+    completion = pd.to_datetime(deals['Completion/Termination Date'])
+    # Exit once the next business day is past the completion date
+    last_full_day = (completion - pd.offsets.BDay(1)).to_numpy()
+    completion = completion.to_numpy()
+    ratio = deals['Exchange Ratio'].to_numpy(dtype=float) if 'Exchange Ratio' in deals.columns else np.full(len(deals), np.nan)
+    tradable = (target_idx >= 0) & (acquirer_idx >= 0)
+    state = {'announced': 0, 'pending': set(), 'open': {}, 'bar': 0}
+    # Per open deal: (bar number, target price, acquirer price) of its last fully priced bar
+    last_priced = {}
+
+    def size(d: int, target_price: float, acquirer_price: float) -> Optional[tuple]:
+        if not (target_price > 0 and acquirer_price > 0):
+            return None
+        shares_target = capital_each_side // target_price
+        if hedge_mode == "dollar":
+            shares_acquirer = capital_each_side // acquirer_price
+        else:
+            shares_acquirer = round(ratio[d] * shares_target) if ratio[d] > 0 else 0
+        if shares_target <= 0 or shares_acquirer <= 0:
+            return None
+        return int(shares_target), int(shares_acquirer)
+
+    def source(date, bar_price: np.ndarray) -> list:
+        now = date.to_datetime64()
+        state['bar'] += 1
+        while state['announced'] < len(deals) and announce[state['announced']] <= now:
+            if tradable[state['announced']]:
+                state['pending'].add(state['announced'])
+            state['announced'] += 1
+        orders = []
+        for d in list(state['pending']):
+            if completion[d] < now:
+                state['pending'].discard(d)
+                continue
+            sized = size(d, bar_price[target_idx[d]], bar_price[acquirer_idx[d]])
+            if sized is not None:
+                orders += [(target_idx[d], sized[0]), (acquirer_idx[d], -sized[1])]
+                state['open'][d] = sized
+                state['pending'].discard(d)
+                last_priced[d] = (state['bar'], bar_price[target_idx[d]], bar_price[acquirer_idx[d]])
+                continue
+        for d, (shares_target, shares_acquirer) in list(state['open'].items()):
+            target_price, acquirer_price = bar_price[target_idx[d]], bar_price[acquirer_idx[d]]
+            if not (np.isnan(target_price) or np.isnan(acquirer_price)):
+                if last_full_day[d] < now:
+                    orders += [(target_idx[d], -shares_target), (acquirer_idx[d], shares_acquirer)]
+                    del state['open'][d], last_priced[d]
+                else:
+                    last_priced[d] = (state['bar'], target_price, acquirer_price)
+                continue
+            seen_bar, target_price, acquirer_price = last_priced[d]
+            if completion[d] < now or (stale_bars is not None and state['bar'] - seen_bar >= stale_bars):
+                orders += [(target_idx[d], -shares_target, target_price),
+                           (acquirer_idx[d], shares_acquirer, acquirer_price)]
+                del state['open'][d], last_priced[d]
+        return orders
+    return source
+
+############################################
+# Order Sinks
+############################################
+# A sink receives each bar's executed orders as sink(date, orders), where orders is
+# a list of {'date', 'deal_id', 'price_type', 'shares', 'price', 'stale'} dicts;
+# 'stale' is True for orders filled at a carried-forward price instead of the bar's.
+
+def list_sink(store: list) -> Callable:
+    """Collect orders in `store`."""
+    return lambda date, orders: store.extend(orders)
+
+def csv_sink(path: str) -> Callable:
+    """Append orders to a CSV file (header written when the file is new)."""
+    fields = ['date', 'deal_id', 'price_type', 'shares', 'price', 'stale']
+
+    def sink(date, orders: list) -> None:
+        is_new = not os.path.exists(path)
+        with open(path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            if is_new:
+                writer.writeheader()
+            writer.writerows(orders)
+    return sink
+
+############################################
+# Paper Trading Session
+############################################
+async def paper_trade(
+    queue: asyncio.Queue,
+    keys: pd.MultiIndex,
+    order_source: Callable,
+    sink: Optional[Callable] = None,
+    initial_capital: float = 1_000_000,
+    integer_shares: bool = True
+) -> dict:
+    """
+    Consume bars from `queue` until the feed ends, keeping the backtester_stock
+    state (cash and per-key positions) as arrays: each bar executes the source's
+    orders at the bar's prices, or at the price given with the order (an order for
+    a key without either raises ValueError), hands them to `sink` and revalues the
+    held positions that are priced on the bar, touching only that bar's keys.
+
+    Returns
+    -------
+    dict
+        'portfolio'      - same layout as backtester_stock.backtest (value,
+                           invested_capital, holdings) per bar
+        'latency'        - per-bar processing time in microseconds
+        'open_positions' - positions still held when the feed ended, with their
+                           last price and the value at that price (the last
+                           'value' counts a position that is not priced on the
+                           final bar as 0)
+    """
+    positions = np.zeros(len(keys))
+    deal_ids = [int(deal_id) for deal_id in keys.get_level_values('deal_id')]
+    price_types = [str(price_type) for price_type in keys.get_level_values('price_type')]
+    labels = [str((deal_id, price_type)) for deal_id, price_type in zip(deal_ids, price_types)]
+    cast = int if integer_shares else float
+    bar_price = np.full(len(keys), np.nan)
+    last_price = np.full(len(keys), np.nan)
+    last_date = np.full(len(keys), np.datetime64('NaT'), dtype='datetime64[ns]')
+    on_bar = np.zeros(len(keys), dtype=bool)
+    cash = float(initial_capital)
+    holdings = {}
+    dates, values, invested_values, holdings_history, latency = [], [], [], [], []
+
+    while True:
+        bar = await queue.get()
+        if bar is None:
+            break
+        start = time.perf_counter()
+        date, key_idx, prices = bar
+        bar_price[key_idx] = prices
+        on_bar[key_idx] = True
+        last_price[key_idx] = prices
+        last_date[key_idx] = date.to_datetime64()
+
+        orders = order_source(date, bar_price)
+        if orders:
+            executed = []
+            for order in orders:
+                key, shares = order[0], order[1]
+                if len(order) > 2:
+                    price = order[2]
+                elif on_bar[key]:
+                    price = bar_price[key]
+                else:
+                    raise ValueError(f"Price not found for date {date}, deal_id {deal_ids[key]}, price_type {price_types[key]}")
+                positions[key] += shares
+                cash -= price * shares
+                executed.append({'date': date, 'deal_id': deal_ids[key], 'price_type': price_types[key],
+                                 'shares': shares, 'price': float(price), 'stale': len(order) > 2})
+            # Earlier bars keep their own holdings dict; only the traded keys change
+            holdings = dict(holdings)
+            for key in {order[0] for order in orders}:
+                holdings.pop(labels[key], None)
+                if positions[key] != 0:
+                    holdings[labels[key]] = cast(positions[key])
+            if sink is not None:
+                sink(date, executed)
+
+        position = positions[key_idx]
+        held = position != 0
+        invested = float(position[held] @ prices[held])
+        bar_price[key_idx] = np.nan
+        on_bar[key_idx] = False
+
+        dates.append(date)
+        values.append(cash + invested)
+        invested_values.append(invested)
+        holdings_history.append(holdings)
+        latency.append((time.perf_counter() - start) * 1e6)
+
+    portfolio = pd.DataFrame({'value': values, 'invested_capital': invested_values, 'holdings': holdings_history},
+                             index=pd.DatetimeIndex(dates, name='date'))
+    held = np.flatnonzero(positions)
+    open_positions = pd.DataFrame({
+        'deal_id': [deal_ids[key] for key in held], 'price_type': [price_types[key] for key in held],
+        'shares': positions[held], 'last_date': last_date[held], 'last_price': last_price[held],
+        'market_value': positions[held] * last_price[held],
+    })
+    return {'portfolio': portfolio, 'latency': pd.Series(latency, index=portfolio.index, name='latency_us'),
+            'open_positions': open_positions}
+
+async def _session(server: dict, order_source: Callable, sink: Optional[Callable], initial_capital: float,
+                   bars_per_second: Optional[float], integer_shares: bool) -> dict:
+    queue = subscribe(server)
+    result, _ = await asyncio.gather(
+        paper_trade(queue, server['keys'], order_source, sink, initial_capital, integer_shares),
+        run_replay(server, bars_per_second),
+    )
+    return result
+
+def run_paper_trading(
+    price_df: pd.DataFrame,
+    make_source: Callable[[pd.MultiIndex], Callable],
+    sink: Optional[Callable] = None,
+    initial_capital: float = 1_000_000,
+    bars_per_second: Optional[float] = None,
+    integer_shares: bool = True
+) -> dict:
+    """
+    Replay `price_df` through a paper-trading session.
+
+    Parameters
+    ----------
+    price_df : pd.DataFrame
+        Price bars (as for backtester_stock.backtest).
+    make_source : callable
+        Builds the order source from the server's key index, e.g.
+        lambda keys: forward_stock_strategy(deals_df, keys).
+    sink : callable, optional
+        Receives the executed orders of each bar (see `list_sink`, `csv_sink`).
+    bars_per_second : float, optional
+        Replay speed (default: as fast as possible).
+
+    Returns
+    -------
+    dict
+        See `paper_trade`.
+    """
+    server = make_replay_server(price_df)
+    return asyncio.run(_session(server, make_source(server['keys']), sink, initial_capital,
+                                bars_per_second, integer_shares))
+
+def main():
+    import backtester_stock
+    import strategy_Shuhan
+
+    deals_df = strategy_Shuhan.load_deals("deals_stock.csv")
+    price_df = strategy_Shuhan.load_prices("price_stock_deals.csv")
+    orders_df = strategy_Shuhan.generate_orders(deals_df, price_df, capital_each_side=30000)
+
+    replay = run_paper_trading(price_df, lambda keys: scheduled_orders(orders_df, keys))
+    reference = backtester_stock.backtest(orders_df.copy(), price_df.copy())
+    print(f"Scheduled orders: max value difference vs backtest "
+          f"{np.nanmax(np.abs(replay['portfolio']['value'] - reference['value'])):.2e}")
+
+    emitted = []
+    live = run_paper_trading(price_df, lambda keys: forward_stock_strategy(deals_df, keys, 30000),
+                             sink=list_sink(emitted))
+    latency = live['latency']
+    print(f"Forward run: {len(emitted)} orders over {len(latency)} bars, final value "
+          f"{live['portfolio']['value'].iloc[-1]:,.2f} (backtest {reference['value'].iloc[-1]:,.2f})")
+    # Every deal the backtest closes must be closed by the forward run as well
+    open_deals = set(live['open_positions']['deal_id'])
+    net = orders_df.groupby(['deal_id', 'leg'])['shares'].sum()
+    closed_in_backtest = set(orders_df['deal_id']) - set(net[net != 0].index.get_level_values('deal_id'))
+    not_closed = sorted(open_deals & closed_in_backtest)
+    if not_closed:
+        print(f"Deals closed by the backtest but still open after the forward run: {not_closed}")
+    if len(open_deals):
+        print(f"Open at end of feed:\n{live['open_positions']}")
+    print(f"Per-bar latency: median {latency.median():.1f} us, p99 {latency.quantile(0.99):.1f} us, "
+          f"max {latency.max():.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import pandas as pd
+
+from downsampling import lttb_indices, min_max_indices
+
+PLOT_CACHE_DIR = ".plot_cache"
+
+############################################
+# Cache Keys
+############################################
+def results_hash(portfolio_values_df: pd.DataFrame, columns: List[str], **plot_params) -> str:
+    """
+    Content hash of the plotted columns plus the plot parameters, used as the cache key.
+    """
+    digest = hashlib.sha256()
+    digest.update(portfolio_values_df.index.to_numpy(dtype="datetime64[ns]").tobytes())
+    for col in columns:
+        digest.update(col.encode())
+        digest.update(portfolio_values_df[col].to_numpy(dtype=float).tobytes())
+    digest.update(json.dumps(plot_params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+############################################
+# Rendering
+############################################
+def _pyplot():
+    # matplotlib takes most of a second to import, so only load it when a chart is drawn
+    import matplotlib
+    matplotlib.use("Agg")  # headless: never opens a window or blocks a batch run
+    import matplotlib.pyplot as plt
+    return plt
+
+def _downsample(index: pd.DatetimeIndex, values: pd.Series, max_points: int, method: str):
+    if method == "lttb":
+        keep = lttb_indices(index.asi8, values.to_numpy(dtype=float), max_points)
+    elif method == "minmax":
+        keep = min_max_indices(values.to_numpy(dtype=float), max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method '{method}' (expected 'lttb' or 'minmax')")
+    return index[keep], values.to_numpy(dtype=float)[keep]
+
+def render_portfolio_charts(
+    portfolio_values_df: pd.DataFrame,
+    output_path: str,
+    title: str = "",
+    max_points: int = 2000,
+    method: str = "lttb",
+    cache_dir: Optional[str] = PLOT_CACHE_DIR
+) -> str:
+    """
+    Render the portfolio value and invested capital (exposure) charts to an image file.
+
+    Both series are downsampled to at most `max_points` points before drawing.
+    When `cache_dir` is set, the rendered image is stored under a hash of the
+    plotted data and parameters, and an unchanged input is copied from the cache
+    instead of being redrawn.
+
+    Parameters
+    ----------
+    portfolio_values_df : pd.DataFrame
+        Backtest output indexed by date with 'value' and 'invested_capital' columns.
+    output_path : str
+        Destination image path (format taken from the extension, e.g. .png).
+    title : str, optional
+        Figure title.
+    max_points : int, optional
+        Maximum number of points drawn per series.
+    method : str, optional
+        'lttb' (shape preserving) or 'minmax' (keeps every bucket's extremes).
+    cache_dir : str, optional
+        Image cache directory; None disables caching.
+
+    Returns
+    -------
+    str
+        `output_path`.
+    """
+    columns = [col for col in ("value", "invested_capital") if col in portfolio_values_df.columns]
+    ext = os.path.splitext(output_path)[1] or ".png"
+    cached_path = None
+    if cache_dir is not None:
+        key = results_hash(portfolio_values_df, columns, title=title, max_points=max_points, method=method, ext=ext)
+        cached_path = os.path.join(cache_dir, key + ext)
+        if os.path.exists(cached_path):
+            shutil.copyfile(cached_path, output_path)
+            return output_path
+
+    labels = {"value": ("Portfolio Value Over Time", "Portfolio Value", None),
+              "invested_capital": ("Invested Capital Over Time", "Invested Capital", "orange")}
+    index = pd.DatetimeIndex(portfolio_values_df.index)
+    plt = _pyplot()
+    fig, axes = plt.subplots(nrows=1, ncols=len(columns), figsize=(14, 6), sharex=True, squeeze=False)
+    for ax, col in zip(axes[0], columns):
+        plot_title, label, color = labels[col]
+        x, y = _downsample(index, portfolio_values_df[col], max_points, method)
+        ax.plot(x, y, label=label, linewidth=2, color=color)
+        ax.set_title(plot_title)
+        ax.set_xlabel('Date')
+        ax.set_ylabel('USD')
+        ax.grid(True)
+        ax.legend()
+    if title:
+        fig.suptitle(title)
+    fig.tight_layout()
+    fig.savefig(output_path)
+    plt.close(fig)
+
+    if cached_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        shutil.copyfile(output_path, cached_path)
+    return output_path
+
+def render_heatmap(grid_df: pd.DataFrame, output_path: str, title: str = "", cmap: str = "viridis") -> str:
+    """
+    Render a 2-D grid of a metric (e.g. Sharpe by entry x exit offset, see
+    timing_sensitivity.py) as an annotated heatmap image.
+
+    Parameters
+    ----------
+    grid_df : pd.DataFrame
+        Metric values; the index is drawn on the y axis and the columns on the x axis.
+    output_path : str
+        Destination image path.
+    title : str, optional
+        Figure title.
+    cmap : str, optional
+        Matplotlib colormap name.
+
+    Returns
+    -------
+    str
+        `output_path`.
+    """
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(1 + 0.7 * grid_df.shape[1], 1 + 0.5 * grid_df.shape[0]))
+    image = ax.imshow(grid_df.to_numpy(dtype=float), cmap=cmap, aspect="auto", origin="lower")
+    ax.set_xticks(range(grid_df.shape[1]), [str(c) for c in grid_df.columns])
+    ax.set_yticks(range(grid_df.shape[0]), [str(i) for i in grid_df.index])
+    ax.set_xlabel(grid_df.columns.name or "")
+    ax.set_ylabel(grid_df.index.name or "")
+    for (row, col), value in pd.DataFrame(grid_df.to_numpy(dtype=float)).stack().items():
+        ax.text(col, row, f"{value:.2f}", ha="center", va="center", fontsize=7, color="white")
+    fig.colorbar(image, ax=ax)
+    if title:
+        ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(output_path)
+    plt.close(fig)
+    return output_path
+
+def _render_job(job: dict) -> str:
+    return render_portfolio_charts(**job)
+
+def render_many(jobs: List[dict], max_workers: Optional[int] = None) -> List[str]:
+    """
+    Render many chart jobs in parallel worker processes (e.g. one per sweep configuration).
+
+    Each job is a dict of `render_portfolio_charts` keyword arguments. Jobs whose
+    images are already cached return immediately.
+    """
+    if max_workers == 1 or len(jobs) <= 1:
+        return [_render_job(job) for job in jobs]
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render_job, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
@@ -0,0 +1,362 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+from price_schema import compact_prices
+
+try:
+    import numba
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+############################################
+# Array Layout
+############################################
+def build_arrays(orders_df: pd.DataFrame, price_df: pd.DataFrame, price_column: str = 'price') -> dict:
+    """
+    Lay orders and prices out as preallocated date x key arrays, with the same
+    conventions as backtester_stock.backtest: the calendar is every date in
+    price_df, duplicate prices are averaged, orders on dates outside the calendar
+    are ignored and an order on a day its key has no price raises ValueError.
+
+    Orders trade at the day's price, or at their 'fill_price' when orders_df has
+    one (e.g. an intraday fill, see intraday.py); positions are always valued at
+    the day's price.
+
+    Keys are the (deal_id, price_type) pairs that have orders, sorted so that the
+    legs of a deal are contiguous.
+    """
+    orders_df = orders_df.rename(columns={'leg': 'price_type'})
+    price_df = price_df.rename(columns={'leg': 'price_type'})
+    if 'prc' in price_df.columns and 'price' not in price_df.columns:
+        price_df = price_df.rename(columns={'prc': 'price'})
+    if price_column != 'price':
+        price_df = price_df.drop(columns=['price'], errors='ignore').rename(columns={price_column: 'price'})
+    price_df = compact_prices(price_df[['date', 'deal_id', 'price_type', 'price']])
+    if not pd.api.types.is_datetime64_any_dtype(price_df['date']):
+        price_df['date'] = pd.to_datetime(price_df['date'])
+    if not pd.api.types.is_datetime64_any_dtype(orders_df['date']):
+        orders_df = orders_df.assign(date=pd.to_datetime(orders_df['date']))
+
+    prices = price_df.groupby(['date', 'deal_id', 'price_type'], observed=True)['price'].mean()
+    dates = pd.DatetimeIndex(np.sort(price_df['date'].unique()))
+    keys = pd.MultiIndex.from_frame(
+        orders_df[['deal_id', 'price_type']].drop_duplicates().astype({'price_type': str})
+    ).sort_values()
+
+    n_days, n_keys = len(dates), len(keys)
+    price_matrix = np.full((n_days, n_keys), np.nan)
+    has_price = np.zeros((n_days, n_keys), dtype=np.bool_)
+    day = dates.get_indexer(prices.index.get_level_values('date'))
+    key = keys.get_indexer(pd.MultiIndex.from_arrays([
+        prices.index.get_level_values('deal_id'), prices.index.get_level_values('price_type').astype(str)
+    ]))
+    found = key >= 0
+    price_matrix[day[found], key[found]] = prices.to_numpy()[found]
+    has_price[day[found], key[found]] = True
+
+    deltas = np.zeros((n_days, n_keys))
+    has_order = np.zeros((n_days, n_keys), dtype=np.bool_)
+    order_day = dates.get_indexer(orders_df['date'])
+    order_key = keys.get_indexer(pd.MultiIndex.from_arrays([orders_df['deal_id'], orders_df['price_type'].astype(str)]))
+    on_calendar = order_day >= 0
+    np.add.at(deltas, (order_day[on_calendar], order_key[on_calendar]), orders_df['shares'].to_numpy(dtype=float)[on_calendar])
+    has_order[order_day[on_calendar], order_key[on_calendar]] = True
+    if 'fill_price' in orders_df.columns:
+        costs = np.zeros((n_days, n_keys))
+        notional = (orders_df['shares'].to_numpy(dtype=float) * orders_df['fill_price'].to_numpy(dtype=float))
+        np.add.at(costs, (order_day[on_calendar], order_key[on_calendar]), notional[on_calendar])
+    else:
+        costs = np.where(has_order, deltas * price_matrix, 0.0)
+
+    missing = has_order & ~has_price
+    if missing.any():
+        t, k = np.argwhere(missing)[0]
+        raise ValueError(f"Price not found for date {dates[t]}, deal_id {keys[k][0]}, price_type {keys[k][1]}")
+
+    deal_codes, deal_ids = pd.factorize(keys.get_level_values('deal_id'), sort=True)
+    return {
+        'dates': dates, 'keys': keys, 'prices': price_matrix, 'has_price': has_price,
+        'deltas': deltas, 'has_order': has_order, 'costs': costs, 'key_deal': deal_codes.astype(np.int64),
+        'n_deals': len(deal_ids), 'integer_shares': pd.api.types.is_integer_dtype(orders_df['shares']),
+    }
+
+############################################
+# Kernels
+############################################
+def _kernel_loop(prices, has_price, deltas, has_order, costs, key_deal, n_deals, initial_capital, stop_loss, min_cash):
+    """
+    Day-by-day position/cash state machine (compiled with numba when available).
+
+    Each day, each deal's orders execute together. An order that opens a deal (all
+    its legs flat) is rejected, and the deal disabled, if it would take cash below
+    `min_cash`. After trading, a deal whose mark-to-market P&L is below
+    -stop_loss x its entry gross notional is closed at that day's prices and
+    disabled; orders for disabled deals are ignored. NaN disables a hook.
+    """
+    n_days, n_keys = prices.shape
+    pos = np.zeros(n_keys)
+    positions = np.zeros((n_days, n_keys))
+    values = np.zeros(n_days)
+    invested = np.zeros(n_days)
+    basis = np.zeros(n_deals)
+    entry_gross = np.zeros(n_deals)
+    disabled = np.zeros(n_deals, dtype=np.bool_)
+    first = np.full(n_deals, n_keys)
+    last = np.zeros(n_deals, dtype=np.int64)
+    for k in range(n_keys):
+        first[key_deal[k]] = min(first[key_deal[k]], k)
+        last[key_deal[k]] = k + 1
+    cash = initial_capital
+
+    for t in range(n_days):
+        for d in range(n_deals):
+            if disabled[d]:
+                continue
+            trades = False
+            is_open = False
+            cost = 0.0
+            gross = 0.0
+            for k in range(first[d], last[d]):
+                if has_order[t, k]:
+                    trades = True
+                    cost += costs[t, k]
+                    gross += abs(costs[t, k])
+                if pos[k] != 0:
+                    is_open = True
+            if not trades:
+                continue
+            if not is_open and not np.isnan(min_cash) and cash - cost < min_cash:
+                disabled[d] = True
+                continue
+            if not is_open:
+                entry_gross[d] = gross
+                basis[d] = 0.0
+            for k in range(first[d], last[d]):
+                if has_order[t, k]:
+                    pos[k] += deltas[t, k]
+            cash -= cost
+            basis[d] += cost
+
+        if not np.isnan(stop_loss):
+            for d in range(n_deals):
+                if disabled[d] or entry_gross[d] == 0:
+                    continue
+                mtm = 0.0
+                priced = True
+                is_open = False
+                for k in range(first[d], last[d]):
+                    if pos[k] != 0:
+                        is_open = True
+                        if has_price[t, k]:
+                            mtm += pos[k] * prices[t, k]
+                        else:
+                            priced = False
+                if is_open and priced and mtm - basis[d] < -stop_loss * entry_gross[d]:
+                    cash += mtm
+                    for k in range(first[d], last[d]):
+                        pos[k] = 0.0
+                    disabled[d] = True
+
+        total = 0.0
+        for k in range(n_keys):
+            if pos[k] != 0 and has_price[t, k]:
+                total += pos[k] * prices[t, k]
+        positions[t] = pos
+        invested[t] = total
+        values[t] = cash + total
+    return values, invested, positions
+
+if HAVE_NUMBA:
+    _kernel_loop_jit = numba.njit(cache=True)(_kernel_loop)
+
+def _kernel_vectorized(prices, has_price, deltas, costs, initial_capital):
+    # Without path-dependent hooks positions and cash are plain cumulative sums
+    positions = np.cumsum(deltas, axis=0)
+    priced = np.where(has_price, prices, 0.0)
+    cash = initial_capital - np.cumsum(costs.sum(axis=1))
+    nan_prices = np.isnan(priced)
+    if nan_prices.any():
+        # A held position at a NaN price makes the day's value NaN, as in the loop
+        nan_days = (nan_prices & (positions != 0)).any(axis=1)
+        priced = np.where(nan_prices, 0.0, priced)
+    invested = np.einsum('ij,ij->i', positions, priced)
+    if nan_prices.any():
+        invested[nan_days] = np.nan
+    return cash + invested, invested, positions
+
+def _kernel_numpy(prices, has_price, deltas, has_order, costs, key_deal, n_deals, initial_capital, stop_loss, min_cash):
+    """
+    NumPy fallback with the same semantics as `_kernel_loop`: the day loop stays in
+    Python but every per-key step is a vector operation; only the cash check walks
+    the (few) deals that open on a given day.
+    """
+    n_days, n_keys = prices.shape
+    pos = np.zeros(n_keys)
+    positions = np.zeros((n_days, n_keys))
+    values = np.zeros(n_days)
+    invested = np.zeros(n_days)
+    basis = np.zeros(n_deals)
+    entry_gross = np.zeros(n_deals)
+    disabled = np.zeros(n_deals, dtype=bool)
+    cash = initial_capital
+
+    def per_deal(weights):
+        return np.bincount(key_deal, weights=weights, minlength=n_deals)
+
+    for t in range(n_days):
+        active = has_order[t] & ~disabled[key_deal]
+        if active.any():
+            notional = np.where(active, costs[t], 0.0)
+            cost = per_deal(notional)
+            gross = per_deal(np.abs(notional))
+            trades = per_deal(active.astype(float)) > 0
+            is_open = per_deal((pos != 0).astype(float)) > 0
+            accepted = trades.copy()
+            if not np.isnan(min_cash):
+                # Deals execute in deal order, so the cash check is sequential
+                running = cash
+                for d in np.flatnonzero(trades):
+                    if not is_open[d] and running - cost[d] < min_cash:
+                        accepted[d] = False
+                        disabled[d] = True
+                    else:
+                        running -= cost[d]
+            opening = accepted & ~is_open
+            entry_gross[opening] = gross[opening]
+            basis[opening] = 0.0
+            pos += np.where(active & accepted[key_deal], deltas[t], 0.0)
+            cash -= cost[accepted].sum()
+            basis[accepted] += cost[accepted]
+
+        if not np.isnan(stop_loss):
+            held = pos != 0
+            mtm = per_deal(np.where(held & has_price[t], pos * prices[t], 0.0))
+            unpriced = per_deal((held & ~has_price[t]).astype(float)) > 0
+            is_open = per_deal(held.astype(float)) > 0
+            stopped = (~disabled & (entry_gross != 0) & is_open & ~unpriced
+                       & (mtm - basis < -stop_loss * entry_gross))
+            if stopped.any():
+                cash += mtm[stopped].sum()
+                pos[stopped[key_deal]] = 0.0
+                disabled |= stopped
+
+        invested[t] = np.where((pos != 0) & has_price[t], pos * prices[t], 0.0).sum()
+        positions[t] = pos
+        values[t] = cash + invested[t]
+    return values, invested, positions
+
+############################################
+# Backtest Entry Point
+############################################
+def run_kernel(arrays: dict, initial_capital: float = 1_000_000, stop_loss: Optional[float] = None,
+               min_cash: Optional[float] = None, engine: str = 'auto'):
+    """
+    Run the portfolio state machine over `build_arrays` output.
+
+    engine : 'auto' (vectorized without hooks, else numba if installed, else numpy),
+             'numba', 'numpy', 'python' (the uncompiled loop, for testing) or 'vectorized'.
+
+    Returns (values, invested_capital, positions) arrays.
+    """
+    hooks = stop_loss is not None or min_cash is not None
+    if engine == 'auto':
+        engine = 'numba' if hooks and HAVE_NUMBA else ('numpy' if hooks else 'vectorized')
+    if engine == 'vectorized':
+        if hooks:
+            raise ValueError("The vectorized engine does not support stop_loss/min_cash")
+        return _kernel_vectorized(arrays['prices'], arrays['has_price'], arrays['deltas'], arrays['costs'],
+                                  float(initial_capital))
+
+    kernels = {'numpy': _kernel_numpy, 'python': _kernel_loop}
+    if HAVE_NUMBA:
+        kernels['numba'] = _kernel_loop_jit
+    if engine not in kernels:
+        raise ValueError(f"Unknown or unavailable engine '{engine}'; available: {['vectorized'] + list(kernels)}")
+    return kernels[engine](
+        arrays['prices'], arrays['has_price'], arrays['deltas'], arrays['has_order'], arrays['costs'], arrays['key_deal'],
+        arrays['n_deals'], float(initial_capital),
+        np.nan if stop_loss is None else float(stop_loss), np.nan if min_cash is None else float(min_cash)
+    )
+
+def holdings_dicts(positions: np.ndarray, keys: pd.MultiIndex, integer_shares: bool = True) -> list:
+    """
+    Per-day {str((deal_id, price_type)): shares} dicts of the nonzero positions, in
+    the format backtester_stock.backtest reports.
+    """
+    labels = [str((int(deal_id), str(price_type))) for deal_id, price_type in keys]
+    cast = int if integer_shares else float
+    holdings = []
+    for row in positions:
+        held = np.flatnonzero(row)
+        holdings.append({labels[k]: cast(row[k]) for k in held})
+    return holdings
+
+def backtest(
+    orders_df: pd.DataFrame,
+    price_df: pd.DataFrame,
+    initial_capital: float = 1_000_000,
+    price_column: str = 'price',
+    stop_loss: Optional[float] = None,
+    min_cash: Optional[float] = None,
+    include_holdings: bool = True,
+    engine: str = 'auto'
+) -> pd.DataFrame:
+    """
+    Array-kernel replacement for backtester_stock.backtest with optional
+    path-dependent hooks.
+
+    Parameters
+    ----------
+    orders_df, price_df, initial_capital, price_column
+        As in backtester_stock.backtest.
+    stop_loss : float, optional
+        Close a deal (all legs, at that day's prices) once its mark-to-market P&L
+        falls below -stop_loss x the gross notional it was opened with; the deal's
+        later orders are ignored.
+    min_cash : float, optional
+        Reject orders that open a deal if they would take cash below this level;
+        the deal's later orders are ignored.
+    include_holdings : bool, optional
+        Build the per-day 'holdings' dicts (the slowest part; skip for sweeps).
+    engine : str, optional
+        See `run_kernel`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Same layout as backtester_stock.backtest: index date, columns 'value',
+        'invested_capital' and (optionally) 'holdings'.
+    """
+    arrays = build_arrays(orders_df, price_df, price_column)
+    values, invested, positions = run_kernel(arrays, initial_capital, stop_loss, min_cash, engine)
+    portfolio_values_df = pd.DataFrame({'value': values, 'invested_capital': invested},
+                                       index=pd.Index(arrays['dates'], name='date'))
+    if include_holdings:
+        portfolio_values_df['holdings'] = holdings_dicts(positions, arrays['keys'], arrays['integer_shares'])
+    return portfolio_values_df
+
+def main():
+    import time
+    import backtester_stock
+    import strategy_Shuhan
+
+    deals_df = strategy_Shuhan.load_deals("deals_stock.csv")
+    price_df = strategy_Shuhan.load_prices("price_stock_deals.csv")
+    orders_df = strategy_Shuhan.generate_orders(deals_df, price_df, capital_each_side=30000)
+
+    start = time.perf_counter()
+    reference = backtester_stock.backtest(orders_df.copy(), price_df.copy())
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    fast = backtest(orders_df, price_df)
+    kernel_time = time.perf_counter() - start
+    print(f"Loop: {loop_time:.2f}s, kernel: {kernel_time:.3f}s ({loop_time / kernel_time:.0f}x)")
+    print(f"Max value difference: {np.nanmax(np.abs(fast['value'] - reference['value'])):.2e}")
+
+    stopped = backtest(orders_df, price_df, stop_loss=0.10, min_cash=0.0, include_holdings=False)
+    print(f"Final value with 10% stop-loss and no borrowing: {stopped['value'].iloc[-1]:,.2f}")
+
+if __name__ == "__main__":
+    main()
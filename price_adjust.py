@@ -0,0 +1,74 @@
+import pandas as pd
+from typing import List, Sequence
+
+from price_store import DEFAULT_STORE_DIR, write_prices
+
+############################################
+# Cleaning
+############################################
+def clean_prices(price_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clean raw CRSP prices.
+
+    CRSP stores a bid/ask midpoint as a negative `prc` when there was no trade,
+    so the cleaned 'price' is |prc| (flagged in 'is_midpoint'); zero or missing
+    prices become NaN. The raw 'prc' column is kept unchanged.
+    """
+    price_df = price_df.copy()
+    prc = pd.to_numeric(price_df['prc'], errors='coerce')
+    price_df['is_midpoint'] = (prc < 0).to_numpy()
+    price_df['price'] = prc.abs().where(prc != 0)
+    price_df['ret'] = pd.to_numeric(price_df['ret'], errors='coerce')
+    return price_df
+
+############################################
+# Return-Based Adjustment
+############################################
+def adjust_prices(price_df: pd.DataFrame, group_cols: Sequence[str] = ('deal_id', 'price_type')) -> pd.DataFrame:
+    """
+    Reconstruct split/dividend-adjusted prices and a total-return index from CRSP `ret`.
+
+    Per (deal_id, leg) group, sorted by date:
+      - 'tr_index' = cumulative product of (1 + ret), starting at 1.0 on the first day
+        (the first day's return, which refers to the day before, is ignored);
+      - 'adj_price' = tr_index rescaled so that it equals the cleaned price on the
+        group's last priced day, i.e. a backward-adjusted price whose day-to-day
+        changes are the total returns.
+    Missing returns are treated as 0. Everything uses grouped cumulative products.
+    """
+    group_cols = list(group_cols)
+    price_df = price_df.sort_values(group_cols + ['date']).reset_index(drop=True)
+    groups = price_df.groupby(group_cols, sort=False, observed=True)
+
+    ret = price_df['ret'].fillna(0.0)
+    ret = ret.where(groups.cumcount() > 0, 0.0)
+    tr_index = (1.0 + ret).groupby([price_df[c] for c in group_cols], sort=False, observed=True).cumprod()
+
+    # Anchor each group's index to its last valid cleaned price
+    anchor = price_df['price'] / tr_index
+    last_anchor = anchor.groupby([price_df[c] for c in group_cols], sort=False, observed=True).transform('last')
+
+    price_df['tr_index'] = tr_index.to_numpy()
+    price_df['adj_price'] = (tr_index * last_anchor).to_numpy()
+    return price_df
+
+def build_adjusted_prices(price_csv_paths: List[str]) -> pd.DataFrame:
+    """
+    Load one or more CRSP-style price CSVs (columns date, prc, ret, ticker, deal_id,
+    price_type), clean them and add the adjusted series alongside the raw ones.
+    """
+    frames = [pd.read_csv(path, parse_dates=['date']) for path in price_csv_paths]
+    price_df = pd.concat(frames, ignore_index=True)
+    return adjust_prices(clean_prices(price_df))
+
+def main():
+    price_df = build_adjusted_prices(["Target_Prices.csv", "Acquirer_Prices.csv"])
+    print(f"Midpoint (negative) prices: {int(price_df['is_midpoint'].sum())}")
+    print(f"Missing/zero prices: {int(price_df['price'].isna().sum())}")
+    drift = (price_df['adj_price'] / price_df['price'] - 1).abs()
+    print(f"Rows where adjusted differs from raw by >1%: {int((drift > 0.01).sum())}")
+    path = write_prices(price_df, DEFAULT_STORE_DIR, part_name="adjusted", overwrite=True)
+    print(f"Saved raw and adjusted prices to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+############################################
+# Compact Price Schema
+############################################
+# Repeated string keys become categoricals, integer ids the smallest integer type
+# that holds them (int32 for deal ids), and prices optionally float32.
+CATEGORICAL_COLUMNS = ('leg', 'price_type', 'ticker', 'target_ticker')
+ID_COLUMNS = ('deal_id', 'permno')
+PRICE_COLUMNS = ('price', 'prc', 'adj_price', 'tr_index', 'ret')
+
+def _to_int_id(values: pd.Series) -> pd.Series:
+    if values.isna().any() or not pd.api.types.is_integer_dtype(values):
+        return values
+    low, high = values.min(), values.max()
+    if np.iinfo(np.int32).min <= low and high <= np.iinfo(np.int32).max:
+        return values.astype(np.int32)
+    return values
+
+def _to_float32(values: pd.Series, max_abs_error: float) -> Optional[pd.Series]:
+    """
+    float32 copy of `values`, or None if it would move any value by more than
+    `max_abs_error` (prices are compared in their own units, e.g. dollars).
+    """
+    as64 = values.to_numpy(dtype=np.float64)
+    as32 = as64.astype(np.float32)
+    error = np.nanmax(np.abs(as32.astype(np.float64) - as64), initial=0.0)
+    if error > max_abs_error:
+        print(f"Keeping '{values.name}' as float64: float32 would change values by up to {error:.2e}")
+        return None
+    return pd.Series(as32, index=values.index, name=values.name)
+
+def compact_prices(price_df: pd.DataFrame, float32: bool = False, max_abs_error: float = 1e-4) -> pd.DataFrame:
+    """
+    Return `price_df` with compact dtypes:
+      - string key columns (leg, price_type, ticker, target_ticker) as categoricals;
+      - integer id columns (deal_id, permno) as int32 when their range allows;
+      - with float32=True, price/return columns as float32, except any column where
+        the conversion would change a value by more than `max_abs_error`.
+
+    Columns that are already compact are left untouched, so calling it twice is cheap.
+    Grouping by a categorical key should pass observed=True.
+    """
+    price_df = price_df.copy(deep=False)
+    for col in CATEGORICAL_COLUMNS:
+        if col in price_df.columns and not isinstance(price_df[col].dtype, pd.CategoricalDtype):
+            price_df[col] = price_df[col].astype('category')
+    for col in ID_COLUMNS:
+        if col in price_df.columns:
+            price_df[col] = _to_int_id(price_df[col])
+    if float32:
+        for col in PRICE_COLUMNS:
+            if col in price_df.columns and price_df[col].dtype == np.float64:
+                converted = _to_float32(price_df[col], max_abs_error)
+                if converted is not None:
+                    price_df[col] = converted
+    return price_df
+
+def read_price_csv(path: str, float32: bool = False, max_abs_error: float = 1e-4) -> pd.DataFrame:
+    """
+    Read a price CSV straight into the compact schema: key columns are parsed as
+    categoricals while reading, and a leftover saved index column is dropped.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    dtype = {col: 'category' for col in CATEGORICAL_COLUMNS if col in header}
+    price_df = pd.read_csv(path, parse_dates=['date'], dtype=dtype)
+    price_df = price_df.drop(columns=[c for c in price_df.columns if c.startswith('Unnamed:')])
+    return compact_prices(price_df, float32=float32, max_abs_error=max_abs_error)
+
+############################################
+# Memory Reporting
+############################################
+def memory_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame, label: str = "prices") -> dict:
+    """
+    Print and return the deep memory usage of a frame before and after compaction.
+    """
+    before_mb, after_mb = memory_mb(before), memory_mb(after)
+    print(f"{label}: {before_mb:.1f} MB -> {after_mb:.1f} MB ({before_mb / max(after_mb, 1e-9):.1f}x smaller)")
+    return {'label': label, 'before_mb': before_mb, 'after_mb': after_mb}
+
+def main():
+    for path in ["price.csv", "price_stock_deals.csv", "Target_Prices.csv", "Acquirer_Prices.csv"]:
+        raw = pd.read_csv(path, parse_dates=['date'])
+        memory_report(raw, read_price_csv(path, float32=True), label=path)
+
+if __name__ == "__main__":
+    main()
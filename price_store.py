@@ -0,0 +1,65 @@
+import glob
+import os
+import pandas as pd
+from typing import List, Optional
+
+############################################
+# Columnar Price Store
+############################################
+# A store is a directory of Parquet part files that together form one table.
+# Appending writes a new part; reading loads only the requested columns.
+DEFAULT_STORE_DIR = "price_store"
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("The columnar price store requires pyarrow (pip install pyarrow)") from e
+
+def list_parts(store_dir: str = DEFAULT_STORE_DIR) -> List[str]:
+    """
+    Sorted paths of the Parquet part files in the store.
+    """
+    return sorted(glob.glob(os.path.join(store_dir, "part-*.parquet")))
+
+def write_prices(price_df: pd.DataFrame, store_dir: str = DEFAULT_STORE_DIR, part_name: Optional[str] = None,
+                 overwrite: bool = False) -> str:
+    """
+    Write a price frame as a new part of the store.
+
+    Parameters
+    ----------
+    price_df : pd.DataFrame
+        Long price frame (one row per date and key).
+    store_dir : str, optional
+        Store directory (created if missing).
+    part_name : str, optional
+        Name of the part (default: next sequence number).
+    overwrite : bool, optional
+        Remove all existing parts first (full rebuild).
+
+    Returns
+    -------
+    str
+        Path of the written part file.
+    """
+    _require_pyarrow()
+    os.makedirs(store_dir, exist_ok=True)
+    if overwrite:
+        for path in list_parts(store_dir):
+            os.remove(path)
+    if part_name is None:
+        part_name = f"{len(list_parts(store_dir)):05d}"
+    path = os.path.join(store_dir, f"part-{part_name}.parquet")
+    price_df.to_parquet(path, index=False)
+    return path
+
+def read_prices(store_dir: str = DEFAULT_STORE_DIR, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read the whole store (all parts) as one frame, loading only `columns` if given.
+    """
+    _require_pyarrow()
+    parts = list_parts(store_dir)
+    if not parts:
+        raise FileNotFoundError(f"No price store parts found in {store_dir}")
+    return pd.concat([pd.read_parquet(path, columns=columns) for path in parts], ignore_index=True)
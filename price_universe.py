@@ -0,0 +1,158 @@
+import os
+from typing import Callable, Optional
+
+import pandas as pd
+
+from deal_ingest import fetch_ticker_prices, price_window
+from price_store import list_parts, read_prices, write_prices
+
+DEFAULT_UNIVERSE_DIR = "price_universe"
+PRICE_COLUMNS = ['date', 'prc', 'ret', 'ticker', 'deal_id', 'price_type']
+LEG_TICKERS = {'target': 'Clean Target Ticker', 'acquirer': 'Clean Acquirer Ticker'}
+
+############################################
+# Coverage of the Store
+############################################
+# Besides the price parts, the store keeps a small manifest of how far each deal
+# leg has been fetched. A leg's stored prices can legitimately stop before the end
+# of its window (weekends, holidays, delistings), so the last stored date alone
+# would make finished legs look incomplete and refetched on every update.
+MANIFEST_FILE = "fetched.parquet"
+
+def _read_manifest(store_dir: str) -> pd.DataFrame:
+    path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=['deal_id', 'price_type', 'fetched_through'])
+    return pd.read_parquet(path)
+
+def _update_manifest(fetched: pd.DataFrame, store_dir: str) -> None:
+    frames = [_read_manifest(store_dir), fetched[['deal_id', 'price_type', 'fetched_through']]]
+    manifest = pd.concat([frame for frame in frames if not frame.empty])
+    manifest = manifest.groupby(['deal_id', 'price_type'], as_index=False)['fetched_through'].max()
+    os.makedirs(store_dir, exist_ok=True)
+    manifest.to_parquet(os.path.join(store_dir, MANIFEST_FILE), index=False)
+
+def deal_windows(deals_df: pd.DataFrame, as_of: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """
+    Required price window per deal leg: `price_window`, capped at `as_of` (default:
+    today) for deals that have not closed yet.
+    """
+    as_of = pd.Timestamp(as_of or pd.Timestamp.today().normalize())
+    windows = []
+    for _, deal in deals_df.iterrows():
+        if pd.isna(deal['Completion/Termination Date']):
+            deal = deal.copy()
+            deal['Completion/Termination Date'] = as_of + pd.Timedelta(days=1)
+        start, end = (pd.Timestamp(d) for d in price_window(deal))
+        for leg, ticker_col in LEG_TICKERS.items():
+            windows.append({'deal_id': deal['deal_id'], 'price_type': leg, 'ticker': deal[ticker_col],
+                            'window_start': start, 'window_end': min(end, as_of)})
+    return pd.DataFrame(windows)
+
+def seed_universe(price_csv_paths, deals_df: pd.DataFrame, store_dir: str = DEFAULT_UNIVERSE_DIR,
+                  as_of: Optional[pd.Timestamp] = None) -> None:
+    """
+    Start the universe store from existing price files (e.g. Target_Prices.csv and
+    Acquirer_Prices.csv), marking the legs they contain as fetched over their whole
+    window, so the first update only fetches what they are missing.
+    """
+    price_df = pd.concat([pd.read_csv(path, parse_dates=['date']) for path in price_csv_paths], ignore_index=True)
+    write_prices(price_df[PRICE_COLUMNS], store_dir, part_name="00000", overwrite=True)
+    stored = price_df[['deal_id', 'price_type']].drop_duplicates()
+    windows = deal_windows(deals_df, as_of).merge(stored, on=['deal_id', 'price_type'])
+    _update_manifest(windows.rename(columns={'window_end': 'fetched_through'}), store_dir)
+
+def coverage(store_dir: str = DEFAULT_UNIVERSE_DIR) -> pd.DataFrame:
+    """
+    Date through which each (deal_id, price_type) is covered: the later of its last
+    stored price and how far it has been fetched. Only the key columns are read.
+    """
+    covered = _read_manifest(store_dir).rename(columns={'fetched_through': 'covered_through'})
+    if list_parts(store_dir):
+        keys = read_prices(store_dir, columns=['date', 'deal_id', 'price_type'])
+        stored = keys.groupby(['deal_id', 'price_type'], as_index=False)['date'].max()
+        covered = pd.concat([covered, stored.rename(columns={'date': 'covered_through'})])
+    return covered.groupby(['deal_id', 'price_type'], as_index=False)['covered_through'].max()
+
+def plan_updates(deals_df: pd.DataFrame, covered: pd.DataFrame, as_of: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """
+    Work out which price windows are missing from the store.
+
+    Legs with nothing covered are fetched over their whole `deal_windows` window
+    ('new'); legs covered only part of the way (pending deals, or deals whose close
+    date moved) are fetched from the day after their coverage ends ('extend').
+    Everything else is skipped.
+
+    Returns
+    -------
+    pd.DataFrame
+        deal_id, price_type, ticker, start_date, end_date, reason
+    """
+    plan = deal_windows(deals_df, as_of).merge(covered, on=['deal_id', 'price_type'], how='left')
+    is_new = plan['covered_through'].isna()
+    plan['start_date'] = plan['window_start'].where(is_new, plan['covered_through'] + pd.Timedelta(days=1))
+    plan['end_date'] = plan['window_end']
+    plan['reason'] = is_new.map({True: 'new', False: 'extend'})
+    plan = plan[plan['start_date'] <= plan['end_date']]
+    return plan[['deal_id', 'price_type', 'ticker', 'start_date', 'end_date', 'reason']].reset_index(drop=True)
+
+############################################
+# Incremental Update
+############################################
+def update_price_universe(
+    deals_path: str = 'deals_stock.csv',
+    store_dir: str = DEFAULT_UNIVERSE_DIR,
+    connect: Optional[Callable] = None,
+    as_of: Optional[pd.Timestamp] = None
+) -> pd.DataFrame:
+    """
+    Fetch only the missing price windows (see `plan_updates`) and append them to the
+    store as one new part; stored parts are never rewritten.
+
+    Returns
+    -------
+    pd.DataFrame
+        The plan that was executed, with the number of rows fetched per leg.
+    """
+    deals_df = pd.read_csv(deals_path, parse_dates=['Announce Date', 'Completion/Termination Date'])
+    plan = plan_updates(deals_df, coverage(store_dir), as_of)
+    print(f"{(plan['reason'] == 'new').sum()} new and {(plan['reason'] == 'extend').sum()} extended deal legs to fetch")
+    if plan.empty:
+        return plan.assign(rows=0)
+
+    if connect is None:
+        import wrds
+        connect = wrds.Connection
+    db = connect()
+    fetched, rows = [], []
+    try:
+        for _, leg in plan.iterrows():
+            prices = fetch_ticker_prices(db, leg['ticker'], leg['start_date'].strftime('%Y-%m-%d'),
+                                         leg['end_date'].strftime('%Y-%m-%d'))
+            prices['prc'] = prices['prc'].abs()
+            prices['deal_id'] = leg['deal_id']
+            prices['price_type'] = leg['price_type']
+            fetched.append(prices[PRICE_COLUMNS])
+            rows.append(len(prices))
+    finally:
+        db.close()
+
+    plan['rows'] = rows
+    new_prices = pd.concat(fetched, ignore_index=True)
+    if not new_prices.empty:
+        path = write_prices(new_prices, store_dir)
+        print(f"Appended {len(new_prices)} price rows to {path}")
+    _update_manifest(plan.rename(columns={'end_date': 'fetched_through'}), store_dir)
+    return plan
+
+def main():
+    if not list_parts(DEFAULT_UNIVERSE_DIR):
+        deals_df = pd.read_csv("deals_stock.csv", parse_dates=['Announce Date', 'Completion/Termination Date'])
+        seed_universe(["Target_Prices.csv", "Acquirer_Prices.csv"], deals_df)
+        print(f"Seeded {DEFAULT_UNIVERSE_DIR}/ from Target_Prices.csv and Acquirer_Prices.csv")
+    plan = update_price_universe()
+    if not plan.empty:
+        print(plan.groupby('reason')['rows'].agg(['count', 'sum']))
+
+if __name__ == "__main__":
+    main()
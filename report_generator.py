@@ -1,5 +1,12 @@
+import html
+import json
+import os
+import numpy as np
 import pandas as pd
 
+from downsampling import min_max_indices
+from stats_utils import compute_summary_stats
+
 def save_portfolio_report_csv(portfolio_values_df: pd.DataFrame, file_path: str = "daily_portfolio_report.csv"):
     """
     Save the portfolio DataFrame to a CSV file.
@@ -15,3 +22,161 @@ def save_portfolio_report_html(portfolio_values_df: pd.DataFrame, file_path: str
     with open(file_path, "w") as f:
         f.write(html_content)
     print(f"Portfolio report saved to {file_path}")
+
+############################################
+# Columnar Output
+############################################
+def holdings_to_long(portfolio_values_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Flatten the per-day 'holdings' dicts into a long frame with columns
+    'date', 'position' and 'shares' (one row per open position per day).
+    """
+    holdings = portfolio_values_df["holdings"]
+    counts = holdings.map(len).to_numpy()
+    positions = [str(key) for day in holdings for key in day]
+    shares = [float(value) for day in holdings for value in day.values()]
+    return pd.DataFrame({
+        "date": np.repeat(portfolio_values_df.index.to_numpy(), counts),
+        "position": pd.Categorical(positions),
+        "shares": np.asarray(shares, dtype=float),
+    })
+
+def save_portfolio_report_parquet(portfolio_values_df: pd.DataFrame, file_path: str = "daily_portfolio_report.parquet"):
+    """
+    Save the daily values to Parquet, with holdings written as a separate long-format
+    table (`<file>_holdings.parquet`) instead of stringified dicts.
+
+    Requires pyarrow.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("save_portfolio_report_parquet requires pyarrow (pip install pyarrow)") from e
+
+    values_df = portfolio_values_df.drop(columns=["holdings"], errors="ignore")
+    values_df.to_parquet(file_path)
+
+    if "holdings" in portfolio_values_df.columns:
+        holdings_path = os.path.splitext(file_path)[0] + "_holdings.parquet"
+        holdings_to_long(portfolio_values_df).to_parquet(holdings_path, index=False)
+        print(f"Portfolio holdings saved to {holdings_path}")
+    print(f"Portfolio report saved to {file_path}")
+
+############################################
+# Summary HTML
+############################################
+def _equity_svg(values: pd.Series, max_points: int, width: int = 800, height: int = 250) -> str:
+    keep = min_max_indices(values.to_numpy(dtype=float), max_points)
+    y = values.to_numpy(dtype=float)[keep]
+    x = keep / max(len(values) - 1, 1) * width
+    span = (y.max() - y.min()) or 1.0
+    y = height - (y - y.min()) / span * height
+    points = " ".join(f"{px:.1f},{py:.1f}" for px, py in zip(x, y))
+    return (
+        f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+        f'<polyline fill="none" stroke="steelblue" stroke-width="1.5" points="{points}"/></svg>'
+    )
+
+def _top_positions(portfolio_values_df: pd.DataFrame, top_n: int) -> pd.DataFrame:
+    holdings_long = holdings_to_long(portfolio_values_df)
+    if holdings_long.empty:
+        return pd.DataFrame(columns=["position", "days_held", "max_abs_shares", "first_date", "last_date"])
+    holdings_long["abs_shares"] = holdings_long["shares"].abs()
+    summary = holdings_long.groupby("position", observed=True).agg(
+        days_held=("date", "size"),
+        max_abs_shares=("abs_shares", "max"),
+        first_date=("date", "min"),
+        last_date=("date", "max"),
+    ).reset_index()
+    return summary.sort_values("days_held", ascending=False).head(top_n)
+
+def _write_detail_json(portfolio_values_df: pd.DataFrame, file_path: str) -> None:
+    # One record per line inside a JSON array, written row by row
+    columns = [col for col in ("value", "invested_capital") if col in portfolio_values_df.columns]
+    has_holdings = "holdings" in portfolio_values_df.columns
+    dates = portfolio_values_df.index.strftime("%Y-%m-%d")
+    value_columns = {col: portfolio_values_df[col].to_numpy(dtype=float) for col in columns}
+    holdings = portfolio_values_df["holdings"] if has_holdings else None
+    with open(file_path, "w") as f:
+        f.write("[\n")
+        for i, date in enumerate(dates):
+            record = {"date": date}
+            record.update({col: float(values[i]) for col, values in value_columns.items()})
+            if has_holdings:
+                record["holdings"] = {str(k): float(v) for k, v in holdings.iloc[i].items()}
+            f.write(("," if i else "") + json.dumps(record) + "\n")
+        f.write("]\n")
+
+_PAGER_SCRIPT = """<script>
+const PAGE_SIZE = %d;
+let rows = [], page = 0;
+function render() {
+  const body = document.getElementById("detail-body");
+  body.innerHTML = "";
+  for (const r of rows.slice(page * PAGE_SIZE, (page + 1) * PAGE_SIZE)) {
+    const tr = document.createElement("tr");
+    const holdings = r.holdings ? Object.entries(r.holdings).map(([k, v]) => k + ": " + v).join(", ") : "";
+    for (const cell of [r.date, (r.value ?? "").toLocaleString(), (r.invested_capital ?? "").toLocaleString(), holdings]) {
+      const td = document.createElement("td");
+      td.textContent = cell;
+      tr.appendChild(td);
+    }
+    body.appendChild(tr);
+  }
+  document.getElementById("page-label").textContent =
+    "Page " + (page + 1) + " of " + Math.max(1, Math.ceil(rows.length / PAGE_SIZE));
+}
+function turn(step) {
+  page = Math.min(Math.max(0, page + step), Math.max(0, Math.ceil(rows.length / PAGE_SIZE) - 1));
+  render();
+}
+function loadDetail() {
+  fetch(%s).then(r => r.json()).then(data => { rows = data; render(); })
+    .catch(() => { document.getElementById("page-label").textContent =
+      "Could not load the detail file; serve this folder over HTTP (python -m http.server)."; });
+  document.getElementById("load-button").remove();
+}
+</script>
+"""
+
+def save_portfolio_report_summary_html(
+    portfolio_values_df: pd.DataFrame,
+    file_path: str = "daily_portfolio_report.html",
+    max_points: int = 500,
+    top_n: int = 20,
+    page_size: int = 100
+):
+    """
+    Save a compact summary HTML report plus a JSON sidecar with the daily detail.
+
+    The HTML holds the precomputed stats, a downsampled equity curve (inline SVG)
+    and the longest-held positions; the daily rows live in `<file>_detail.json`
+    and are loaded and paginated in the browser on demand. Both files are written
+    piece by piece rather than built as one string.
+    """
+    detail_path = os.path.splitext(file_path)[0] + "_detail.json"
+    _write_detail_json(portfolio_values_df, detail_path)
+
+    stats = compute_summary_stats(portfolio_values_df["value"])
+    with open(file_path, "w") as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Portfolio Report</title>\n")
+        f.write("<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}"
+                "td,th{border:1px solid #ccc;padding:2px 8px;text-align:right}</style></head><body>\n")
+        f.write("<h1>Portfolio Report</h1>\n<h2>Summary</h2>\n<table>\n")
+        for key, value in stats.items():
+            shown = f"{value:,.4f}" if isinstance(value, float) else str(value)
+            f.write(f"<tr><th>{html.escape(key)}</th><td>{html.escape(shown)}</td></tr>\n")
+        f.write("</table>\n<h2>Portfolio Value</h2>\n")
+        f.write(_equity_svg(portfolio_values_df["value"], max_points))
+        f.write("\n<h2>Top Positions</h2>\n")
+        if "holdings" in portfolio_values_df.columns:
+            _top_positions(portfolio_values_df, top_n).to_html(f, index=False)
+        f.write("\n<h2>Daily Detail</h2>\n")
+        f.write('<button id="load-button" onclick="loadDetail()">Load daily detail</button>\n')
+        f.write('<div><button onclick="turn(-1)">&lt;</button> <span id="page-label"></span> '
+                '<button onclick="turn(1)">&gt;</button></div>\n')
+        f.write("<table><thead><tr><th>date</th><th>value</th><th>invested_capital</th><th>holdings</th></tr></thead>"
+                '<tbody id="detail-body"></tbody></table>\n')
+        f.write(_PAGER_SCRIPT % (page_size, json.dumps(os.path.basename(detail_path))))
+        f.write("</body></html>\n")
+    print(f"Portfolio report saved to {file_path} (detail in {detail_path})")
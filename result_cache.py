@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from types import ModuleType
+from typing import Any, Callable, Iterable, Optional
+
+import pandas as pd
+
+DEFAULT_CACHE_DIR = ".result_cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GiB
+
+############################################
+# Cache Keys
+############################################
+_file_digests = {}
+
+def file_digest(path: str) -> str:
+    """
+    SHA-256 of a file's contents, memoised on (path, size, mtime) so unchanged
+    inputs are only read once per process.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _file_digests[memo_key] = digest.hexdigest()
+    return _file_digests[memo_key]
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """
+    Content hash of a DataFrame (values, index and column names).
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(json.dumps([str(c) for c in df.columns]).encode())
+    return digest.hexdigest()
+
+def code_digest(modules: Iterable[ModuleType]) -> str:
+    """
+    SHA-256 over the source files of `modules`, so results computed by an older
+    version of the code that produced them are not reused.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(module.__name__.encode())
+        digest.update(file_digest(module.__file__).encode())
+    return digest.hexdigest()
+
+def make_key(stage: str, input_files: Iterable[str] = (), upstream: Iterable[str] = (),
+             code: Iterable[ModuleType] = (), **params) -> str:
+    """
+    Cache key for a stage: hash of the stage name, the contents of its input files,
+    the keys/digests of upstream results, the source of the modules in `code` and
+    its parameters.
+    """
+    payload = {
+        "stage": stage,
+        "files": [file_digest(path) for path in input_files],
+        "code": code_digest(code),
+        "upstream": list(upstream),
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+############################################
+# Storage with LRU Eviction
+############################################
+def _entry_path(key: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, key[:2], key + ".pkl")
+
+def get(key: str, cache_dir: str = DEFAULT_CACHE_DIR) -> Optional[Any]:
+    """
+    Return the cached value for `key`, or None. A hit refreshes the entry's access
+    time, which is what eviction orders by. An entry evicted by another process
+    while it is being read counts as a miss.
+    """
+    path = _entry_path(key, cache_dir)
+    try:
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (EOFError, pickle.UnpicklingError):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+    now = time.time()
+    try:
+        os.utime(path, (now, now))
+    except FileNotFoundError:
+        pass
+    return value
+
+def put(key: str, value: Any, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+    """
+    Store `value` under `key` (written atomically), then evict least recently used
+    entries until the cache is below `max_bytes`.
+    """
+    path = _entry_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    evict(cache_dir, max_bytes)
+
+def evict(cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> int:
+    """
+    Delete least recently used entries until the total size is at most `max_bytes`.
+    Returns the number of entries removed.
+    """
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(".pkl"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:  # evicted by another process meanwhile
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+def cached(key: str, compute: Callable[[], Any], cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+           max_bytes: int = DEFAULT_MAX_BYTES) -> Any:
+    """
+    Return the cached value for `key`, computing and storing it on a miss.
+    With cache_dir=None the cache is bypassed.
+    """
+    if cache_dir is None:
+        return compute()
+    value = get(key, cache_dir)
+    if value is None:
+        value = compute()
+        put(key, value, cache_dir, max_bytes)
+    return value
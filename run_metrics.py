@@ -0,0 +1,114 @@
+import json
+from typing import Iterable, Optional
+
+############################################
+# Run Metrics
+############################################
+# Data problems found inside per-deal and per-row loops (unparseable terms,
+# missing prices, duplicate rows) are recorded here instead of printed: each
+# (stage, event) pair keeps a count, its level and the first few examples. Nothing
+# is written while a run is in progress unless verbose tracing is enabled; the
+# aggregate is printed or saved as JSON at the end of the run.
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+_config = {'verbose': False, 'trace_level': 'debug', 'max_examples': 5}
+_events = {}
+
+def configure(verbose: bool = False, trace_level: str = 'debug', max_examples: int = 5) -> None:
+    """
+    Set how events are handled.
+
+    Parameters
+    ----------
+    verbose : bool, optional
+        Print every event at or above `trace_level` as it is recorded (the old
+        behaviour of the hot loops); off by default.
+    trace_level : str, optional
+        Lowest level printed while verbose: 'debug', 'info', 'warning' or 'error'.
+    max_examples : int, optional
+        Examples kept per (stage, event).
+    """
+    if trace_level not in LEVELS:
+        raise ValueError(f"Unknown level '{trace_level}'; expected one of {list(LEVELS)}")
+    _config.update(verbose=verbose, trace_level=trace_level, max_examples=max_examples)
+
+def config() -> dict:
+    """Current settings, e.g. to pass to worker processes."""
+    return dict(_config)
+
+def _entry(stage: str, event: str, level: str) -> dict:
+    key = (stage, event)
+    if key not in _events:
+        _events[key] = {'level': level, 'count': 0, 'examples': []}
+    return _events[key]
+
+def record(stage: str, event: str, level: str = 'info', **example) -> None:
+    """
+    Count one occurrence of `event` in `stage`, keeping `example` (e.g. deal_id=...)
+    if fewer than max_examples have been kept.
+    """
+    entry = _entry(stage, event, level)
+    entry['count'] += 1
+    if len(entry['examples']) < _config['max_examples']:
+        entry['examples'].append(example)
+    if _config['verbose'] and LEVELS[level] >= LEVELS[_config['trace_level']]:
+        print(f"[{level}] {stage}: {event} {example}")
+
+def record_many(stage: str, event: str, count: int, examples: Iterable[dict] = (), level: str = 'info') -> None:
+    """
+    Count `count` occurrences at once, for checks done over a whole frame; only
+    the first max_examples of `examples` are kept (pass a bounded sample).
+    """
+    if count <= 0:
+        return
+    entry = _entry(stage, event, level)
+    entry['count'] += int(count)
+    room = _config['max_examples'] - len(entry['examples'])
+    kept = list(examples)[:max(room, 0)]
+    entry['examples'].extend(kept)
+    if _config['verbose'] and LEVELS[level] >= LEVELS[_config['trace_level']]:
+        print(f"[{level}] {stage}: {event} x{count} {kept}")
+
+############################################
+# Summaries
+############################################
+def summary(min_level: str = 'debug') -> dict:
+    """
+    {stage: {event: {'level', 'count', 'examples'}}} for events at or above
+    `min_level`.
+    """
+    result = {}
+    for (stage, event), entry in sorted(_events.items()):
+        if LEVELS[entry['level']] >= LEVELS[min_level]:
+            result.setdefault(stage, {})[event] = {**entry, 'examples': list(entry['examples'])}
+    return result
+
+def print_summary(min_level: str = 'info') -> None:
+    """One line per event: level, stage, event, count and the first example."""
+    for stage, events in summary(min_level).items():
+        for event, entry in events.items():
+            example = f" e.g. {entry['examples'][0]}" if entry['examples'] else ""
+            print(f"{entry['level'].upper():<7} {stage}: {event} x{entry['count']}{example}")
+
+def write_summary(path: str, min_level: str = 'debug') -> str:
+    """Save `summary` as JSON (examples are stringified where needed)."""
+    with open(path, "w") as f:
+        json.dump(summary(min_level), f, indent=2, default=str)
+    return path
+
+def collect() -> dict:
+    """Return and clear the recorded events (e.g. at the end of a worker task)."""
+    events = {key: {**entry, 'examples': list(entry['examples'])} for key, entry in _events.items()}
+    _events.clear()
+    return events
+
+def merge(events: Optional[dict]) -> None:
+    """Add events returned by `collect` (e.g. from a worker process) without re-tracing them."""
+    for (stage, event), entry in (events or {}).items():
+        merged = _entry(stage, event, entry['level'])
+        merged['count'] += entry['count']
+        room = _config['max_examples'] - len(merged['examples'])
+        merged['examples'].extend(entry['examples'][:max(room, 0)])
+
+def reset() -> None:
+    _events.clear()
@@ -0,0 +1,318 @@
+import glob
+import itertools
+import os
+import sys
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import strategy
+import strategy_imp_prob
+import strategy_Shuhan
+import backtester
+import backtester_stock
+import deal_timeline
+import price_schema
+import result_cache
+import run_metrics
+from price_schema import read_price_csv
+from security_master import deal_prices, load_security_master
+from stats_utils import compute_summary_stats
+from plotting import render_portfolio_charts
+from report_generator import save_portfolio_report_parquet, save_portfolio_report_summary_html
+
+############################################
+# Strategy Registry
+############################################
+# name -> {"orders": callable(data, **params) -> orders_df, "engine": key into ENGINES,
+#          "params": default strategy parameters}
+STRATEGIES: Dict[str, dict] = {}
+
+# Backtest engines: name -> (callable(data, orders_df, **params) -> portfolio_values_df,
+#                            shared-data price key the engine reads)
+ENGINES: Dict[str, tuple] = {
+    "cash": (lambda data, orders_df, **params: backtester.backtest(
+        orders_df.copy(), data["cash_prices"].copy(), **params), "cash_prices"),
+    "stock": (lambda data, orders_df, **params: backtester_stock.backtest(
+        orders_df.copy(), data["stock_prices"].copy(), **params), "stock_prices"),
+}
+
+DEFAULT_BACKTEST_PARAMS = {"initial_capital": 1_000_000}
+
+# Modules whose source is part of each stage's cache key, so editing a strategy or
+# an engine invalidates the results it produced
+ORDERS_CODE = (sys.modules[__name__], strategy, strategy_imp_prob, strategy_Shuhan, price_schema)
+BACKTEST_CODE = (sys.modules[__name__], backtester, backtester_stock, deal_timeline, price_schema)
+
+def register_strategy(name: str, engine: str, **default_params) -> Callable:
+    """
+    Decorator that registers an order generator under `name`.
+
+    The decorated function receives the shared data dict (see `load_shared_data`)
+    plus keyword parameters and returns an orders frame, which is then run through
+    the backtest engine `engine` ('cash' or 'stock').
+    """
+    def decorator(func: Callable) -> Callable:
+        STRATEGIES[name] = {"orders": func, "engine": engine, "params": default_params}
+        return func
+    return decorator
+
+@register_strategy("cash", engine="cash", shares_on_announce=300)
+def cash_orders(data: dict, shares_on_announce: int) -> pd.DataFrame:
+    deals_df = strategy.prepare_deals(data["deals"])
+    return strategy.generate_orders(deals_df, data["cash_trading_dates"], shares_on_announce)
+
+@register_strategy("imp_prob", engine="cash", shares_on_announce=300, min_prob_threshold=0.75,
+                   scale_with_probability=True)
+def imp_prob_orders(data: dict, shares_on_announce: int, min_prob_threshold: float,
+                    scale_with_probability: bool) -> pd.DataFrame:
+    deals_df = strategy_imp_prob.prepare_deals(data["deals"], data["cash_prices"].copy(), min_prob_threshold)
+    return strategy_imp_prob.generate_orders(
+        deals_df, data["cash_trading_dates"], shares_on_announce, scale_with_probability
+    )
+
+@register_strategy("stock", engine="stock", capital_each_side=30000, hedge_mode="dollar")
+def stock_orders(data: dict, capital_each_side: float, hedge_mode: str) -> pd.DataFrame:
+    deals_df = strategy_Shuhan.prepare_deals(data["deals"])
+    return strategy_Shuhan.generate_orders(deals_df, data["stock_prices"], capital_each_side, hedge_mode)
+
+############################################
+# Shared Data Loading
+############################################
+def load_shared_data(
+    deals_csv_path: str = "deals.csv",
+    cash_prices_csv_path: str = "price.csv",
+    stock_prices_csv_path: str = "price_stock_deals.csv",
+    security_master_dir: Optional[str] = None
+) -> dict:
+    """
+    Load the deal table and both price universes once so every strategy can reuse them.
+
+    If `security_master_dir` is given, the stock-deal prices are read through the
+    security master (see security_master.py) instead of `stock_prices_csv_path`.
+
+    Returns
+    -------
+    dict
+        'deals' (raw deal table), 'cash_prices' (price.csv layout),
+        'cash_trading_dates' (sorted dates of the cash universe) and
+        'stock_prices' (price_stock_deals.csv layout after record selection) and
+        'input_files' (the source paths behind each entry).
+    """
+    cash_prices = read_price_csv(cash_prices_csv_path)
+    stock_price_files = [stock_prices_csv_path]
+    if security_master_dir is not None:
+        stock_price_files = sorted(glob.glob(os.path.join(security_master_dir, "**", "*.parquet"), recursive=True))
+        master = load_security_master(security_master_dir)
+        price_column = 'price' if 'price' in master['prices'].columns else 'prc'
+        stock_prices = deal_prices(master, columns=[price_column]).rename(columns={price_column: 'price'})
+        stock_prices = strategy_Shuhan.select_prices(stock_prices)
+    else:
+        stock_prices = strategy_Shuhan.load_prices(stock_prices_csv_path)
+    return {
+        "deals": pd.read_csv(deals_csv_path),
+        "cash_prices": cash_prices,
+        "cash_trading_dates": sorted(cash_prices["date"].unique()),
+        "stock_prices": stock_prices,
+        # Source files of each entry, hashed by the result cache
+        "input_files": {
+            "deals": [deals_csv_path],
+            "cash_prices": [cash_prices_csv_path],
+            "stock_prices": stock_price_files,
+        },
+    }
+
+############################################
+# Execution
+############################################
+_shared_data: Optional[dict] = None
+
+def _init_worker(data: dict, metrics_config: Optional[dict] = None) -> None:
+    # Runs once per worker process, so the data is shipped once per worker, not per task
+    global _shared_data
+    _shared_data = data
+    if metrics_config is not None:
+        run_metrics.configure(**metrics_config)
+
+def _run_one(name: str, params: dict, backtest_params: dict, cache_dir: Optional[str]):
+    """
+    Run the orders stage and the backtest stage of one configuration, each checking
+    the result cache on its own: changing only a backtest parameter reuses the
+    cached orders.
+    """
+    spec = STRATEGIES[name]
+    engine, price_key = ENGINES[spec["engine"]]
+    input_files = _shared_data["input_files"]
+    start = time.perf_counter()
+
+    orders_key = result_cache.make_key(
+        f"orders:{name}", input_files=input_files["deals"] + input_files[price_key], code=ORDERS_CODE, **params
+    )
+    orders_df = result_cache.cached(
+        orders_key, lambda: spec["orders"](_shared_data, **params), cache_dir
+    )
+    backtest_key = result_cache.make_key(
+        f"backtest:{spec['engine']}", input_files=input_files[price_key], upstream=[orders_key],
+        code=BACKTEST_CODE, **backtest_params
+    )
+    portfolio_values_df = result_cache.cached(
+        backtest_key, lambda: engine(_shared_data, orders_df, **backtest_params), cache_dir
+    )
+    return name, params, backtest_params, orders_df, portfolio_values_df, time.perf_counter() - start
+
+def _run_with_metrics(task: tuple, cache_dir: Optional[str]):
+    run_metrics.reset()
+    output = _run_one(*task, cache_dir)
+    return output, run_metrics.collect()
+
+def _execute(data: dict, tasks: list, max_workers: Optional[int], cache_dir: Optional[str]) -> list:
+    max_workers = max_workers or min(len(tasks), os.cpu_count() or 1) or 1
+    if max_workers == 1:
+        _init_worker(data)
+        return [_run_one(*task, cache_dir) for task in tasks]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(data, run_metrics.config())) as pool:
+        futures = [pool.submit(_run_with_metrics, task, cache_dir) for task in tasks]
+        outputs = []
+        for future in futures:
+            output, events = future.result()
+            # Events recorded in the worker are added to this process's run metrics
+            run_metrics.merge(events)
+            outputs.append(output)
+        return outputs
+
+def run_strategies(
+    data: dict,
+    strategy_names: Optional[List[str]] = None,
+    params: Optional[Dict[str, dict]] = None,
+    backtest_params: Optional[dict] = None,
+    max_workers: Optional[int] = None,
+    cache_dir: Optional[str] = result_cache.DEFAULT_CACHE_DIR
+) -> Dict[str, dict]:
+    """
+    Run several registered strategies concurrently over the same shared data.
+
+    Each strategy runs in its own worker process (the backtest loops are pure
+    Python, so threads would serialise on the GIL), which keeps the total wall
+    time close to that of the slowest strategy.
+
+    Parameters
+    ----------
+    data : dict
+        Output of `load_shared_data`.
+    strategy_names : list of str, optional
+        Registered strategy names to run (default: all of them).
+    params : dict, optional
+        Per-strategy parameter overrides, e.g. {'stock': {'capital_each_side': 50000}}.
+    backtest_params : dict, optional
+        Backtest parameters shared by all strategies (default: initial_capital=1,000,000).
+    max_workers : int, optional
+        Number of worker processes (default: one per strategy, up to the CPU count).
+        Use 1 to run in-process.
+    cache_dir : str, optional
+        Result cache directory (see result_cache.py); None disables caching.
+
+    Returns
+    -------
+    dict
+        name -> {'orders': orders_df, 'portfolio': portfolio_values_df, 'runtime': seconds}
+    """
+    strategy_names = strategy_names or list(STRATEGIES)
+    params = params or {}
+    backtest_params = {**DEFAULT_BACKTEST_PARAMS, **(backtest_params or {})}
+    unknown = [name for name in strategy_names if name not in STRATEGIES]
+    if unknown:
+        raise ValueError(f"Unknown strategies {unknown}; registered: {list(STRATEGIES)}")
+
+    tasks = [(name, {**STRATEGIES[name]["params"], **params.get(name, {})}, backtest_params)
+             for name in strategy_names]
+    outputs = _execute(data, tasks, max_workers, cache_dir)
+    return {
+        name: {"orders": orders_df, "portfolio": portfolio_values_df, "runtime": runtime}
+        for name, _, _, orders_df, portfolio_values_df, runtime in outputs
+    }
+
+def run_sweep(
+    data: dict,
+    strategy_name: str,
+    param_grid: Dict[str, list],
+    backtest_grid: Optional[Dict[str, list]] = None,
+    max_workers: Optional[int] = None,
+    cache_dir: Optional[str] = result_cache.DEFAULT_CACHE_DIR
+) -> pd.DataFrame:
+    """
+    Run one strategy over the cartesian product of strategy and backtest parameters.
+
+    Configurations already in the result cache are not recomputed, and configurations
+    that share strategy parameters share one cached orders stage.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per configuration: its parameters plus the summary stats.
+    """
+    strategy_configs = [dict(zip(param_grid, values)) for values in itertools.product(*param_grid.values())]
+    backtest_grid = backtest_grid or {}
+    backtest_configs = [
+        {**DEFAULT_BACKTEST_PARAMS, **dict(zip(backtest_grid, values))}
+        for values in itertools.product(*backtest_grid.values())
+    ]
+    defaults = STRATEGIES[strategy_name]["params"]
+    tasks = [(strategy_name, {**defaults, **config}, backtest_config)
+             for config in strategy_configs for backtest_config in backtest_configs]
+    outputs = _execute(data, tasks, max_workers, cache_dir)
+
+    rows = []
+    for _, task_params, task_backtest_params, orders_df, portfolio_values_df, runtime in outputs:
+        row = {**task_params, **task_backtest_params}
+        row.update(compute_summary_stats(portfolio_values_df["value"]))
+        row["num_orders"] = len(orders_df)
+        row["runtime_sec"] = runtime
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+############################################
+# Output
+############################################
+def build_stats_table(results: Dict[str, dict]) -> pd.DataFrame:
+    """
+    Side-by-side performance statistics, one column per strategy.
+    """
+    stats = {}
+    for name, result in results.items():
+        row = compute_summary_stats(result["portfolio"]["value"])
+        row["num_orders"] = len(result["orders"])
+        row["runtime_sec"] = result["runtime"]
+        stats[name] = row
+    return pd.DataFrame(stats)
+
+def save_results(results: Dict[str, dict], output_dir: str = "results") -> pd.DataFrame:
+    """
+    Write each strategy's orders, daily report (Parquet + summary HTML) and charts under `output_dir/<name>/`
+    and the comparison table to `output_dir/strategy_comparison.csv`.
+    """
+    for name, result in results.items():
+        strategy_dir = os.path.join(output_dir, name)
+        os.makedirs(strategy_dir, exist_ok=True)
+        result["orders"].to_csv(os.path.join(strategy_dir, "orders.csv"), index=False)
+        save_portfolio_report_parquet(result["portfolio"], os.path.join(strategy_dir, "daily_portfolio_report.parquet"))
+        save_portfolio_report_summary_html(result["portfolio"], os.path.join(strategy_dir, "daily_portfolio_report.html"))
+        render_portfolio_charts(result["portfolio"], os.path.join(strategy_dir, "portfolio_performance.png"), title=name)
+
+    stats_df = build_stats_table(results)
+    stats_df.to_csv(os.path.join(output_dir, "strategy_comparison.csv"))
+    return stats_df
+
+def main():
+    start = time.perf_counter()
+    data = load_shared_data("deals.csv", "price.csv", "price_stock_deals.csv")
+    print(f"Loaded shared data in {time.perf_counter() - start:.1f}s")
+
+    results = run_strategies(data)
+    stats_df = save_results(results, "results")
+    print(stats_df)
+    print(f"Total run time: {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
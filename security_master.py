@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Iterable, Optional
+
+from price_store import read_prices, write_prices
+
+DEFAULT_MASTER_DIR = "security_master"
+
+############################################
+# Security Keys
+############################################
+def clean_ticker(ticker: pd.Series) -> pd.Series:
+    """
+    Vectorized `clean_ticker` from fetch_price.ipynb: drop a trailing exchange
+    code ('IP US' -> 'IP') and surrounding whitespace.
+    """
+    return ticker.astype('string').str.strip().str.replace(r'\s+[A-Z]+$', '', regex=True)
+
+def _security_keys(price_df: pd.DataFrame) -> pd.Series:
+    # CRSP permno identifies a security for its whole life; fall back to the cleaned ticker
+    if 'permno' in price_df.columns:
+        return 'permno:' + price_df['permno'].astype('Int64').astype('string')
+    return clean_ticker(price_df['ticker'])
+
+############################################
+# Building the Master
+############################################
+def build_security_master(price_df: pd.DataFrame, value_columns: Optional[Iterable[str]] = None,
+                          conflict_tolerance: float = 0.005) -> dict:
+    """
+    Deduplicate per-deal price histories into one history per underlying security.
+
+    Parameters
+    ----------
+    price_df : pd.DataFrame
+        Long per-deal prices with 'date', 'deal_id', 'ticker' (or 'permno'), a leg
+        column ('leg' or 'price_type') and value columns (e.g. 'prc', 'ret', 'price').
+    value_columns : iterable of str, optional
+        Columns stored per security and date (default: every column that is not a key).
+    conflict_tolerance : float, optional
+        Max relative price difference on shared dates for two deals' histories to be
+        treated as the same security. A reused ticker that disagrees by more gets its
+        own security id ('<ticker>#<deal_id>').
+
+    Returns
+    -------
+    dict of pd.DataFrame
+        'securities'     - security_id, key, ticker
+        'prices'         - security_id, date, value columns (one row per security and date)
+        'deal_legs'      - deal_id, leg, security_id, start_date, end_date
+        'conflicts'      - deal_id, leg, key, max_rel_diff of the split-off histories
+    """
+    leg_col = 'leg' if 'leg' in price_df.columns else 'price_type'
+    key_cols = {'date', 'deal_id', 'ticker', 'permno', leg_col}
+    value_columns = list(value_columns or [c for c in price_df.columns if c not in key_cols])
+    price_col = 'price' if 'price' in value_columns else 'prc'
+
+    rows = price_df.rename(columns={leg_col: 'leg'}).copy()
+    rows['key'] = _security_keys(rows).to_numpy()
+    rows = rows.sort_values(['key', 'deal_id', 'leg', 'date'], kind='stable')
+
+    # Compare each deal leg's prices with the first-seen price for the same key and date
+    canonical = rows.drop_duplicates(['key', 'date'])[['key', 'date', price_col]]
+    compared = rows[['key', 'date', 'deal_id', 'leg', price_col]].merge(
+        canonical, on=['key', 'date'], suffixes=('', '_canonical')
+    )
+    rel_diff = (compared[price_col].abs() / compared[f'{price_col}_canonical'].abs() - 1).abs()
+    max_diff = rel_diff.groupby([compared['key'], compared['deal_id'], compared['leg']], observed=True).max()
+    conflicts = max_diff[max_diff > conflict_tolerance].rename('max_rel_diff').reset_index()
+
+    if not conflicts.empty:
+        split = rows.merge(conflicts[['key', 'deal_id', 'leg']].assign(_split=True),
+                           on=['key', 'deal_id', 'leg'], how='left')['_split'].fillna(False).to_numpy(dtype=bool)
+        rows.loc[split, 'key'] = rows.loc[split, 'key'] + '#' + rows.loc[split, 'deal_id'].astype(str)
+
+    keys = pd.Index(sorted(rows['key'].unique()))
+    rows['security_id'] = keys.get_indexer(rows['key']).astype(np.int32)
+
+    ticker_col = 'ticker' if 'ticker' in rows.columns else 'key'
+    securities = rows.groupby('security_id', sort=True).agg(key=('key', 'first'), ticker=(ticker_col, 'first')).reset_index()
+    prices = (rows.drop_duplicates(['security_id', 'date'])[['security_id', 'date'] + value_columns]
+              .sort_values(['security_id', 'date']).reset_index(drop=True))
+    deal_legs = rows.groupby(['deal_id', 'leg', 'security_id'], sort=True, observed=True)['date'].agg(['min', 'max']).reset_index()
+    deal_legs = deal_legs.rename(columns={'min': 'start_date', 'max': 'end_date'})
+
+    return {'securities': securities, 'prices': prices, 'deal_legs': deal_legs, 'conflicts': conflicts}
+
+############################################
+# Reading Through the Mapping
+############################################
+def deal_prices(master: dict, deal_ids: Optional[Iterable] = None, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Expand the master back into the per-deal long layout used by the strategies and
+    backtesters (columns 'date', 'deal_id', 'leg', 'ticker' plus the value columns),
+    keeping each deal leg's date window.
+    """
+    deal_legs = master['deal_legs']
+    if deal_ids is not None:
+        deal_legs = deal_legs[deal_legs['deal_id'].isin(list(deal_ids))]
+    prices = master['prices']
+    if columns is not None:
+        prices = prices[['security_id', 'date'] + list(columns)]
+
+    expanded = deal_legs.merge(prices, on='security_id')
+    expanded = expanded[(expanded['date'] >= expanded['start_date']) & (expanded['date'] <= expanded['end_date'])]
+    expanded = expanded.merge(master['securities'][['security_id', 'ticker']], on='security_id')
+    return expanded.drop(columns=['start_date', 'end_date']).sort_values(['date', 'deal_id', 'leg']).reset_index(drop=True)
+
+############################################
+# Storage
+############################################
+def save_security_master(master: dict, master_dir: str = DEFAULT_MASTER_DIR) -> None:
+    """
+    Save the master: one Parquet file each for securities and the deal-leg mapping,
+    and the deduplicated histories as a price store under `<master_dir>/prices`.
+    """
+    os.makedirs(master_dir, exist_ok=True)
+    master['securities'].to_parquet(os.path.join(master_dir, "securities.parquet"), index=False)
+    master['deal_legs'].to_parquet(os.path.join(master_dir, "deal_legs.parquet"), index=False)
+    write_prices(master['prices'], os.path.join(master_dir, "prices"), part_name="00000", overwrite=True)
+
+def load_security_master(master_dir: str = DEFAULT_MASTER_DIR) -> dict:
+    return {
+        'securities': pd.read_parquet(os.path.join(master_dir, "securities.parquet")),
+        'deal_legs': pd.read_parquet(os.path.join(master_dir, "deal_legs.parquet")),
+        'prices': read_prices(os.path.join(master_dir, "prices")),
+    }
+
+def main():
+    price_df = pd.concat([
+        pd.read_csv("Target_Prices.csv", parse_dates=['date']),
+        pd.read_csv("Acquirer_Prices.csv", parse_dates=['date']),
+    ], ignore_index=True)
+    master = build_security_master(price_df)
+
+    print(f"Per-deal price rows: {len(price_df)}")
+    print(f"Securities: {len(master['securities'])}, deduplicated price rows: {len(master['prices'])}")
+    print(f"Deal legs: {len(master['deal_legs'])}, split-off conflicting histories: {len(master['conflicts'])}")
+    save_security_master(master)
+    print(f"Security master saved to {DEFAULT_MASTER_DIR}/")
+
+if __name__ == "__main__":
+    main()
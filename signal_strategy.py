@@ -0,0 +1,248 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Optional
+
+from deal_spreads import compute_deal_panels
+
+# A rule maps the panels dict (date x deal DataFrames from deal_spreads.compute_deal_panels,
+# plus the derived panels below) to a boolean date x deal array.
+Rule = Callable[[Dict[str, pd.DataFrame]], np.ndarray]
+
+############################################
+# Derived Panels
+############################################
+def add_derived_panels(panels: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    Add panels that rules commonly need, all computed column-wise at once:
+      - 'days_to_close': trading days left until the last live day of each deal
+      - 'days_since_announce': trading days since the first live day of each deal
+      - 'drawdown': target price drawdown from its running peak within the live window
+    """
+    live = panels['live'].to_numpy()
+    n_dates = live.shape[0]
+    live_count = np.cumsum(live, axis=0)
+    panels['days_since_announce'] = pd.DataFrame(
+        np.where(live, live_count - 1, np.nan), index=panels['live'].index, columns=panels['live'].columns
+    )
+    panels['days_to_close'] = pd.DataFrame(
+        np.where(live, live_count[-1][None, :] - live_count, np.nan) if n_dates else live.astype(float),
+        index=panels['live'].index, columns=panels['live'].columns
+    )
+    target = panels['target']
+    peak = target.ffill().cummax()
+    panels['drawdown'] = target / peak - 1
+    return panels
+
+############################################
+# Rule Builders
+############################################
+def spread_above(threshold: float) -> Rule:
+    """Gross spread (fraction of offer) is above `threshold`."""
+    return lambda p: (p['spread'] > threshold).to_numpy()
+
+def spread_below(threshold: float) -> Rule:
+    """Gross spread (fraction of offer) is below `threshold` (spread has mostly converged)."""
+    return lambda p: (p['spread'] < threshold).to_numpy()
+
+def prob_above(threshold: float) -> Rule:
+    """Implied completion probability is above `threshold`."""
+    return lambda p: (p['implied_prob'] > threshold).to_numpy()
+
+def prob_below(threshold: float) -> Rule:
+    """Implied completion probability is below `threshold`."""
+    return lambda p: (p['implied_prob'] < threshold).to_numpy()
+
+def days_to_close_at_most(days: int) -> Rule:
+    """At most `days` trading days remain before the deal's last live day."""
+    return lambda p: (p['days_to_close'] <= days).to_numpy()
+
+def days_since_announce_at_least(days: int) -> Rule:
+    """At least `days` trading days have passed since announcement."""
+    return lambda p: (p['days_since_announce'] >= days).to_numpy()
+
+def drawdown_stop(max_drawdown: float) -> Rule:
+    """Target has fallen more than `max_drawdown` (e.g. 0.1) from its peak since announcement."""
+    return lambda p: (p['drawdown'] < -max_drawdown).to_numpy()
+
+def all_of(*rules: Rule) -> Rule:
+    return lambda p: np.logical_and.reduce([rule(p) for rule in rules])
+
+def any_of(*rules: Rule) -> Rule:
+    return lambda p: np.logical_or.reduce([rule(p) for rule in rules])
+
+############################################
+# Position State and Orders
+############################################
+def position_state(entry: np.ndarray, exit_: np.ndarray, live: np.ndarray) -> np.ndarray:
+    """
+    Turn entry/exit signal arrays into a 0/1 in-position array for all deals at once.
+
+    A position opens on an entry signal and stays open until an exit signal or the
+    end of the live window (exit wins when both fire on the same day). The state is
+    a forward fill of the last signal, so no loop over deals or days is needed.
+    """
+    signal = np.full(entry.shape, np.nan)
+    signal[entry] = 1.0
+    signal[exit_ | ~live] = 0.0
+    state = pd.DataFrame(signal).ffill().fillna(0.0).to_numpy()
+    return state
+
+def generate_signal_orders(
+    panels: Dict[str, pd.DataFrame],
+    entry_rule: Rule,
+    exit_rule: Rule,
+    size: float = 100,
+    size_rule: Optional[Callable[[Dict[str, pd.DataFrame]], np.ndarray]] = None,
+    leg: Optional[str] = None,
+    hedge_ratio: Optional[pd.Series] = None
+) -> pd.DataFrame:
+    """
+    Evaluate entry/exit (and optional resize) rules over the full date x deal panels
+    and emit the orders frame consumed by the backtesters.
+
+    Orders are placed on the day a rule fires, so they trade at that day's close
+    in `backtester.backtest` / `backtester_stock.backtest`.
+
+    Parameters
+    ----------
+    panels : dict
+        Output of `compute_deal_panels` (derived panels are added if missing).
+    entry_rule, exit_rule : Rule
+        Boolean date x deal predicates.
+    size : float, optional
+        Target shares per open deal (default 100).
+    size_rule : callable, optional
+        Returns a date x deal array of position multipliers (e.g. the implied
+        probability), applied while the position is open; target shares are
+        int(size * multiplier), so a changing multiplier produces resize orders.
+    leg : str, optional
+        If set (e.g. 'target'), orders get a 'leg' column for backtester_stock.
+    hedge_ratio : pd.Series, optional
+        Per-deal exchange ratio; when given, acquirer orders are added that keep
+        the acquirer position at -round(ratio x target position), so it returns
+        to 0 with the target (stock deals, backtester_stock format).
+
+    Returns
+    -------
+    pd.DataFrame
+        Orders with columns 'date', 'deal_id', 'shares' (and 'leg' / 'action').
+        A position still open on the last row of the panels gets no exit order
+        and stays open.
+    """
+    if 'days_to_close' not in panels:
+        panels = add_derived_panels(panels)
+    live = panels['live'].to_numpy()
+    tradable = live & ~np.isnan(panels['target'].to_numpy())
+    if hedge_ratio is not None:
+        # For stock deals the offer is ratio x acquirer price, so this also requires an acquirer price
+        tradable &= ~np.isnan(panels['offer'].to_numpy())
+
+    entry = entry_rule(panels) & tradable
+    exit_ = exit_rule(panels) & tradable
+    state = position_state(entry, exit_, live)
+
+    multiplier = np.ones_like(state) if size_rule is None else np.nan_to_num(size_rule(panels))
+    target_shares = np.trunc(size * multiplier * state)
+    # Resize only on tradable days: carry the previous target through days with no price
+    target_shares = pd.DataFrame(np.where(tradable | (state == 0), target_shares, np.nan)).ffill().fillna(0.0).to_numpy()
+
+    deltas = np.diff(target_shares, axis=0, prepend=0.0)
+    # Exits forced by the end of a deal's live window are moved to its last tradable
+    # day below; positions still open on the last row of the panels stay open
+    rows, cols = np.nonzero(deltas)
+    dates = panels['live'].index
+    deal_ids = panels['live'].columns
+    prev_shares = target_shares[rows - 1, cols] if len(rows) else np.array([])
+    prev_shares = np.where(rows > 0, prev_shares, 0.0)
+    action = np.where(prev_shares == 0, 'entry', np.where(target_shares[rows, cols] == 0, 'exit', 'resize'))
+
+    orders_df = pd.DataFrame({
+        'date': dates[rows],
+        'deal_id': deal_ids[cols],
+        'shares': deltas[rows, cols].astype(int),
+        'action': action,
+    })
+    orders_df = orders_df[orders_df['shares'] != 0]
+    orders_df = _move_to_tradable_days(orders_df, tradable, dates, deal_ids)
+
+    if leg is not None or hedge_ratio is not None:
+        orders_df['leg'] = leg or 'target'
+    if hedge_ratio is not None:
+        # Hedge the cumulative target position, not each order, so rounding never
+        # leaves an acquirer residual once the target is closed
+        orders_df = orders_df.sort_values(by='date', kind='stable')
+        ratios = hedge_ratio.reindex(orders_df['deal_id']).to_numpy(dtype=float)
+        target_position = orders_df.groupby('deal_id')['shares'].cumsum().to_numpy()
+        hedge = orders_df.copy()
+        hedge['leg'] = 'acquirer'
+        hedge['_position'] = -np.round(ratios * target_position)
+        hedge['shares'] = hedge.groupby('deal_id')['_position'].diff().fillna(hedge['_position']).astype(int)
+        hedge = hedge.drop(columns='_position')
+        orders_df = pd.concat([orders_df, hedge[hedge['shares'] != 0]], ignore_index=True)
+
+    orders_df.sort_values(by='date', inplace=True, kind='stable')
+    return orders_df.reset_index(drop=True)
+
+def _move_to_tradable_days(orders_df: pd.DataFrame, tradable: np.ndarray, dates, deal_ids) -> pd.DataFrame:
+    """
+    An exit forced by the end of the live window lands on the first non-live day,
+    which has no price; move such orders back to the deal's last tradable day.
+    """
+    row_of = pd.Series(np.arange(len(dates)), index=dates)
+    col_of = pd.Series(np.arange(len(deal_ids)), index=deal_ids)
+    rows = row_of.reindex(orders_df['date']).to_numpy()
+    cols = col_of.reindex(orders_df['deal_id']).to_numpy()
+    ok = tradable[rows, cols]
+    if ok.all():
+        return orders_df
+
+    # Last tradable row at or before each row, per deal
+    idx = np.where(tradable, np.arange(len(dates))[:, None], -1)
+    last_tradable = np.maximum.accumulate(idx, axis=0)
+    fixed_rows = last_tradable[rows[~ok], cols[~ok]]
+    orders_df = orders_df.copy()
+    bad = orders_df.index[~ok]
+    keep = fixed_rows >= 0
+    orders_df.loc[bad[keep], 'date'] = dates[fixed_rows[keep]]
+    return orders_df.drop(index=bad[~keep])
+
+############################################
+# Convenience Wrapper
+############################################
+def generate_orders_from_rules(
+    deals_df: pd.DataFrame,
+    price_df: pd.DataFrame,
+    entry_rules: List[Rule],
+    exit_rules: List[Rule],
+    size: float = 100,
+    size_rule: Optional[Callable] = None,
+    acquirer_price_df: Optional[pd.DataFrame] = None,
+    leg: Optional[str] = None,
+    hedge_ratio: Optional[pd.Series] = None
+) -> pd.DataFrame:
+    """
+    Build the panels and generate orders: enter when all entry rules hold,
+    exit when any exit rule holds. `leg` and `hedge_ratio` are passed to
+    `generate_signal_orders` for two-leg (stock) deals.
+    """
+    panels = compute_deal_panels(deals_df, price_df, acquirer_price_df)
+    return generate_signal_orders(panels, all_of(*entry_rules), any_of(*exit_rules), size, size_rule,
+                                  leg, hedge_ratio)
+
+if __name__ == "__main__":
+    from backtester import backtest
+
+    price_df = pd.read_csv("price.csv", parse_dates=["date"])
+    deals_df = pd.read_csv("deals.csv")
+    deals_df = deals_df[deals_df["Payment Type"].str.strip() == "Cash"]
+
+    orders_df = generate_orders_from_rules(
+        deals_df, price_df,
+        entry_rules=[spread_above(0.02), prob_above(0.5)],
+        exit_rules=[spread_below(0.002), days_to_close_at_most(2), drawdown_stop(0.15)],
+        size=300,
+        size_rule=lambda p: p['implied_prob'].to_numpy(),
+    )
+    print("Number of generated orders:", len(orders_df))
+    portfolio_values_df = backtest(orders_df, price_df, initial_capital=1_000_000)
+    print(portfolio_values_df[['value', 'invested_capital']].tail())
@@ -0,0 +1,307 @@
+import glob
+import os
+import sqlite3
+from typing import Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+############################################
+# Embedded Database
+############################################
+# Prices and orders live in an embedded database file (SQLite by default, DuckDB
+# if installed) and are loaded in chunks, so the universe never has to fit in
+# memory; positions and values are computed by the database with window functions
+# and joins, and only the daily results come back to pandas.
+ENGINES = ('sqlite', 'duckdb')
+
+def connect(database: str = ':memory:', engine: str = 'sqlite'):
+    """
+    Open (or create) the backtest database. `database` is a file path or ':memory:'.
+    """
+    if engine == 'sqlite':
+        return sqlite3.connect(database)
+    if engine == 'duckdb':
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("engine='duckdb' requires duckdb (pip install duckdb)") from e
+        return duckdb.connect(database)
+    raise ValueError(f"Unknown engine '{engine}' (expected one of {ENGINES})")
+
+def _create_tables(con, replace_prices: bool, replace_orders: bool) -> None:
+    if replace_prices:
+        con.execute("DROP TABLE IF EXISTS prices")
+    if replace_orders:
+        con.execute("DROP TABLE IF EXISTS orders")
+    con.execute("CREATE TABLE IF NOT EXISTS prices (date TEXT, deal_id BIGINT, price_type TEXT, price DOUBLE)")
+    con.execute("CREATE TABLE IF NOT EXISTS orders (date TEXT, deal_id BIGINT, price_type TEXT, shares DOUBLE)")
+
+def _normalize(df: pd.DataFrame, value_column: str, price_column: str = 'price') -> pd.DataFrame:
+    # Same column conventions as backtester_stock.backtest; dates are stored as ISO text
+    df = df.rename(columns={'leg': 'price_type', 'deal_index': 'deal_id'})
+    if 'prc' in df.columns and 'price' not in df.columns:
+        df = df.rename(columns={'prc': 'price'})
+    if value_column == 'price' and price_column != 'price':
+        df = df.drop(columns=['price'], errors='ignore').rename(columns={price_column: 'price'})
+    df = df[['date', 'deal_id', 'price_type', value_column]].copy()
+    df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+    df['deal_id'] = df['deal_id'].astype(np.int64)
+    df['price_type'] = df['price_type'].astype(str)
+    df[value_column] = df[value_column].astype(float)
+    return df
+
+def _insert(con, table: str, df: pd.DataFrame) -> None:
+    # NaN is stored as NULL, which the queries below treat as "price is NaN"
+    if hasattr(con, 'register'):
+        # DuckDB scans the frame directly (and keeps NaN as a value, so map it here)
+        value = df.columns[3]
+        con.register('chunk', df)
+        con.execute(f"INSERT INTO {table} SELECT date, deal_id, price_type, "
+                    f"CASE WHEN isnan({value}) THEN NULL ELSE {value} END FROM chunk")
+        con.unregister('chunk')
+        return
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    con.executemany(f"INSERT INTO {table} VALUES (?, ?, ?, ?)", list(rows))
+
+def _price_chunks(source, chunksize: int) -> Iterable[pd.DataFrame]:
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize]
+    elif isinstance(source, str) and os.path.isdir(source):
+        # A price_store directory: one Parquet part at a time
+        for path in sorted(glob.glob(os.path.join(source, "part-*.parquet"))):
+            yield pd.read_parquet(path)
+    else:
+        for path in ([source] if isinstance(source, str) else source):
+            yield from pd.read_csv(path, chunksize=chunksize)
+
+def load_prices(con, source: Union[pd.DataFrame, str, Iterable[str]], price_column: str = 'price',
+                chunksize: int = 500_000, replace: bool = True) -> int:
+    """
+    Load prices into the database chunk by chunk.
+
+    Parameters
+    ----------
+    source : pd.DataFrame, str or list of str
+        A price frame, one or more price CSVs (e.g. Target_Prices.csv and
+        Acquirer_Prices.csv) or a price_store directory of Parquet parts.
+    price_column : str, optional
+        Column to trade and value at (as in backtester_stock.backtest).
+    replace : bool, optional
+        Drop previously loaded prices first (default); False appends.
+
+    Returns
+    -------
+    int
+        Number of price rows loaded.
+    """
+    _create_tables(con, replace_prices=replace, replace_orders=False)
+    loaded = 0
+    for chunk in _price_chunks(source, chunksize):
+        _insert(con, 'prices', _normalize(chunk, 'price', price_column))
+        loaded += len(chunk)
+    con.execute("CREATE INDEX IF NOT EXISTS prices_key ON prices (deal_id, price_type, date)")
+    con.execute("CREATE INDEX IF NOT EXISTS prices_date ON prices (date)")
+    return loaded
+
+def load_orders(con, orders_df: pd.DataFrame, replace: bool = True) -> int:
+    """Load an orders frame (date, deal_id, leg/price_type, shares) into the database."""
+    _create_tables(con, replace_prices=False, replace_orders=replace)
+    _insert(con, 'orders', _normalize(orders_df, 'shares'))
+    con.execute("CREATE INDEX IF NOT EXISTS orders_key ON orders (deal_id, price_type, date)")
+    return len(orders_df)
+
+############################################
+# Queries
+############################################
+# Duplicate prices are averaged and the calendar is every date with a price, as in
+# backtester_stock.backtest. AVG skips NULLs like pandas' mean skips NaN, so a
+# NULL average means every duplicate was NaN.
+_PRICES = """
+px AS (
+    SELECT date, deal_id, price_type, AVG(price) AS price
+    FROM prices GROUP BY date, deal_id, price_type
+),
+calendar AS (SELECT DISTINCT date FROM prices),
+ord AS (
+    SELECT o.date, o.deal_id, o.price_type, SUM(o.shares) AS shares
+    FROM orders o JOIN calendar c ON o.date = c.date
+    GROUP BY o.date, o.deal_id, o.price_type
+)"""
+
+_MISSING_PRICE_QUERY = f"""
+WITH {_PRICES}
+SELECT ord.date, ord.deal_id, ord.price_type
+FROM ord LEFT JOIN px
+  ON px.date = ord.date AND px.deal_id = ord.deal_id AND px.price_type = ord.price_type
+WHERE px.date IS NULL
+ORDER BY ord.date, ord.deal_id, ord.price_type
+LIMIT 1
+"""
+
+# Each key's position on each of its price days is the running sum of its orders up
+# to and including that day (orders execute before the day is valued), taken over
+# the key's order rows and price rows merged in one window.
+_VALUES_QUERY = f"""
+WITH {_PRICES},
+keys AS (
+    SELECT deal_id, price_type, MIN(date) AS first_date FROM ord GROUP BY deal_id, price_type
+),
+events AS (
+    SELECT date, deal_id, price_type, shares, 0 AS is_price, NULL AS price FROM ord
+    UNION ALL
+    SELECT px.date, px.deal_id, px.price_type, 0.0, 1, px.price
+    FROM px JOIN keys ON px.deal_id = keys.deal_id AND px.price_type = keys.price_type
+    WHERE px.date >= keys.first_date
+),
+positions AS (
+    SELECT date, is_price, price,
+           SUM(shares) OVER (PARTITION BY deal_id, price_type ORDER BY date, is_price
+                             ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS position
+    FROM events
+),
+invested AS (
+    SELECT date,
+           SUM(position * price) AS invested,
+           SUM(CASE WHEN price IS NULL THEN 1 ELSE 0 END) AS nan_prices
+    FROM positions WHERE is_price = 1 AND position <> 0
+    GROUP BY date
+),
+cash_flow AS (
+    SELECT ord.date,
+           SUM(ord.shares * px.price) AS cost,
+           SUM(CASE WHEN px.price IS NULL THEN 1 ELSE 0 END) AS nan_prices
+    FROM ord JOIN px ON px.date = ord.date AND px.deal_id = ord.deal_id AND px.price_type = ord.price_type
+    GROUP BY ord.date
+),
+daily AS (
+    SELECT calendar.date,
+           SUM(COALESCE(cash_flow.cost, 0)) OVER w AS spent,
+           SUM(COALESCE(cash_flow.nan_prices, 0)) OVER w AS nan_trades,
+           COALESCE(invested.invested, 0) AS invested,
+           COALESCE(invested.nan_prices, 0) AS nan_holdings
+    FROM calendar
+    LEFT JOIN cash_flow ON cash_flow.date = calendar.date
+    LEFT JOIN invested ON invested.date = calendar.date
+    WINDOW w AS (ORDER BY calendar.date ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+)
+SELECT date, spent, nan_trades, invested, nan_holdings FROM daily ORDER BY date
+"""
+
+# Position of each key after each of its order days, for the holdings column
+_POSITION_CHANGES_QUERY = f"""
+WITH {_PRICES}
+SELECT date, deal_id, price_type,
+       SUM(shares) OVER (PARTITION BY deal_id, price_type ORDER BY date
+                         ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS position
+FROM ord
+ORDER BY date
+"""
+
+def _holdings(con, dates: pd.DatetimeIndex, integer_shares: bool) -> list:
+    # Positions only change on order days: replay the changes along the calendar
+    cast = int if integer_shares else float
+    changes = con.execute(_POSITION_CHANGES_QUERY).fetchall()
+    holdings, current, i = [], {}, 0
+    for date in dates.strftime('%Y-%m-%d'):
+        while i < len(changes) and changes[i][0] == date:
+            _, deal_id, price_type, position = changes[i]
+            key = str((int(deal_id), price_type))
+            current.pop(key, None)
+            if position != 0:
+                current[key] = cast(position)
+            i += 1
+        holdings.append(dict(current))
+    return holdings
+
+def backtest_db(con, initial_capital: float = 1_000_000, include_holdings: bool = True,
+                integer_shares: bool = True) -> pd.DataFrame:
+    """
+    Run the backtest over the prices and orders already loaded into `con` (see
+    `load_prices` and `load_orders`).
+
+    Returns
+    -------
+    pd.DataFrame
+        Same layout as backtester_stock.backtest: index date, columns 'value',
+        'invested_capital' and (optionally) 'holdings'.
+    """
+    missing = con.execute(_MISSING_PRICE_QUERY).fetchall()
+    if missing:
+        date, deal_id, price_type = missing[0]
+        raise ValueError(f"Price not found for date {pd.Timestamp(date)}, deal_id {deal_id}, price_type {price_type}")
+
+    daily = pd.DataFrame(con.execute(_VALUES_QUERY).fetchall(),
+                         columns=['date', 'spent', 'nan_trades', 'invested', 'nan_holdings'])
+    dates = pd.DatetimeIndex(pd.to_datetime(daily['date']), name='date')
+    # A trade or a held position at a NaN price makes the value NaN, as in the loop
+    cash = np.where(daily['nan_trades'] > 0, np.nan, initial_capital - daily['spent'].astype(float))
+    invested = np.where(daily['nan_holdings'] > 0, np.nan, daily['invested'].astype(float))
+    portfolio_values_df = pd.DataFrame({'value': cash + invested, 'invested_capital': invested}, index=dates)
+    if include_holdings:
+        portfolio_values_df['holdings'] = _holdings(con, dates, integer_shares)
+    return portfolio_values_df
+
+def backtest(
+    orders_df: pd.DataFrame,
+    price_df: Union[pd.DataFrame, str, Iterable[str]],
+    initial_capital: float = 1_000_000,
+    price_column: str = 'price',
+    database: str = ':memory:',
+    engine: str = 'sqlite',
+    include_holdings: bool = True
+) -> pd.DataFrame:
+    """
+    SQL-backed equivalent of backtester_stock.backtest.
+
+    Parameters
+    ----------
+    orders_df, initial_capital, price_column
+        As in backtester_stock.backtest.
+    price_df : pd.DataFrame, str or list of str
+        A price frame or anything `load_prices` accepts (CSV paths, a price_store
+        directory), which is then loaded without reading it all into memory.
+    database : str, optional
+        Database file to work in (default: in memory). With a file, the loaded
+        prices are kept and can be reused through `backtest_db`.
+    engine : str, optional
+        'sqlite' (default) or 'duckdb'.
+    include_holdings : bool, optional
+        Build the per-day 'holdings' dicts.
+
+    Returns
+    -------
+    pd.DataFrame
+        Same layout as backtester_stock.backtest.
+    """
+    con = connect(database, engine)
+    try:
+        load_prices(con, price_df, price_column)
+        load_orders(con, orders_df)
+        return backtest_db(con, initial_capital, include_holdings,
+                           pd.api.types.is_integer_dtype(orders_df['shares']))
+    finally:
+        con.close()
+
+def main():
+    import time
+    import backtester_stock
+    import strategy_Shuhan
+
+    deals_df = strategy_Shuhan.load_deals("deals_stock.csv")
+    price_df = strategy_Shuhan.load_prices("price_stock_deals.csv")
+    orders_df = strategy_Shuhan.generate_orders(deals_df, price_df, capital_each_side=30000)
+
+    start = time.perf_counter()
+    reference = backtester_stock.backtest(orders_df.copy(), price_df.copy())
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    result = backtest(orders_df, "price_stock_deals.csv", database="backtest.sqlite")
+    sql_time = time.perf_counter() - start
+    print(f"Loop: {loop_time:.2f}s, SQLite (including load): {sql_time:.2f}s")
+    print(f"Max value difference: {np.nanmax(np.abs(result['value'] - reference['value'])):.2e}")
+    print(f"Holdings identical: {result['holdings'].tolist() == reference['holdings'].tolist()}")
+
+if __name__ == "__main__":
+    main()
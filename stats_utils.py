@@ -12,3 +12,23 @@ def compute_max_drawdown(portfolio_values):
     cum_max = portfolio_values.cummax()
     drawdown = (portfolio_values - cum_max) / cum_max
     return drawdown.min()
+
+def compute_cagr(portfolio_values, start_date, end_date):
+    # Compound annual growth rate between the first and last portfolio value
+    years = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days / 365.25
+    if years <= 0:
+        return np.nan
+    return (portfolio_values.iloc[-1] / portfolio_values.iloc[0]) ** (1 / years) - 1
+
+def compute_summary_stats(portfolio_values):
+    # CAGR, Sharpe and max drawdown of a daily portfolio value series, as a dict
+    start_date = portfolio_values.index.min().strftime("%Y-%m-%d")
+    end_date = portfolio_values.index.max().strftime("%Y-%m-%d")
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "final_value": float(portfolio_values.iloc[-1]),
+        "cagr": compute_cagr(portfolio_values, start_date, end_date),
+        "sharpe": compute_sharpe_ratio(portfolio_values),
+        "max_drawdown": compute_max_drawdown(portfolio_values),
+    }
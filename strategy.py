@@ -46,7 +46,23 @@ def load_deals(deals_csv_path: str) -> pd.DataFrame:
         DataFrame containing deals with converted date columns.
     """
     deals_df = pd.read_csv(deals_csv_path)
-    deals_df = deals_df[deals_df["Payment Type"].str.strip() == "Cash"]
+    return prepare_deals(deals_df)
+
+def prepare_deals(deals_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Filter an already-loaded deals table to cash deals and convert date columns.
+    
+    Parameters
+    ----------
+    deals_df : pd.DataFrame
+        Raw deals table (as read from the deals CSV).
+        
+    Returns
+    -------
+    pd.DataFrame
+        Copy of the cash deals with converted date columns.
+    """
+    deals_df = deals_df[deals_df["Payment Type"].str.strip() == "Cash"].copy()
     
     date_columns = ["Announce Date", "Completion/Termination Date"]
     for col in date_columns:
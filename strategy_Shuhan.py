@@ -3,6 +3,9 @@ import numpy as np
 from datetime import datetime
 from typing import List, Optional
 
+import run_metrics
+from price_schema import compact_prices, read_price_csv
+
 ############################################
 # Special Price Record Selection
 ############################################
@@ -31,31 +34,177 @@ def load_deals(deals_csv_path: str) -> pd.DataFrame:
     """
     Load deals data from CSV and convert date columns.
     """
-    deals_df = pd.read_csv(deals_csv_path, parse_dates=['Announce Date', 'Completion/Termination Date'])
-    deals_df = deals_df[deals_df["Payment Type"].str.strip() == "Stock"]
+    deals_df = pd.read_csv(deals_csv_path)
+    return prepare_deals(deals_df)
+
+def prepare_deals(deals_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Filter an already-loaded deals table to stock deals and convert date columns.
+    """
+    deals_df = deals_df[deals_df["Payment Type"].str.strip() == "Stock"].copy()
+    for col in ['Announce Date', 'Completion/Termination Date']:
+        deals_df[col] = pd.to_datetime(deals_df[col])
 
     return deals_df
 
 def load_prices(prices_csv_path: str) -> pd.DataFrame:
     """
-    Load prices data from CSV, sort, and apply custom record selection.
+    Load prices data from CSV (in the compact schema of price_schema.py), sort, and
+    apply custom record selection.
     """
-    price_df = pd.read_csv(prices_csv_path, parse_dates=['date'])
+    price_df = read_price_csv(prices_csv_path)
+    return select_prices(price_df)
+
+def select_prices(price_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sort an already-loaded price frame and apply custom record selection,
+    leaving one row per (date, deal_id, leg).
+    """
+    price_df = compact_prices(price_df)
     # Sort by date, deal_id, leg, and price so that the first record is the lowest price
     price_df = price_df.sort_values(by=['date', 'deal_id', 'leg', 'price'], ascending=True)
     # For each (date, deal_id, leg), select the record using the custom function
-    price_df = price_df.groupby(['date', 'deal_id', 'leg'], group_keys=False).apply(select_record).reset_index(drop=True)
+    price_df = price_df.groupby(['date', 'deal_id', 'leg'], group_keys=False, observed=True).apply(select_record).reset_index(drop=True)
     # If there are still duplicates, keep the first occurrence
-    price_df = price_df.groupby(['date', 'deal_id', 'leg'], as_index=False).first()
-    return price_df
+    price_df = price_df.groupby(['date', 'deal_id', 'leg'], as_index=False, observed=True).first()
+    return compact_prices(price_df)
+
+############################################
+# Per-Deal Entry/Exit Legs (vectorized)
+############################################
+def compute_deal_legs(deals_df: pd.DataFrame, price_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute entry/exit dates and entry prices for every deal in one pass over the prices.
+
+    The entry date is the later of the two legs' first trading days on/after the
+    announce date; the exit date is the earlier of the two legs' last trading days
+    on/before the completion date.
+
+    Parameters
+    ----------
+    deals_df : pd.DataFrame
+        Deals with columns 'deal_id', 'Announce Date', 'Completion/Termination Date'
+        (and optionally 'Exchange Ratio', 'Amendment Date', 'Amended Exchange Ratio').
+    price_df : pd.DataFrame
+        Prices with columns 'date', 'deal_id', 'leg', 'price' (one row per date/deal/leg).
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per deal that has prices for both legs, in deals_df order, with
+        'deal_id', 'entry_date', 'exit_date', 'target_entry_price',
+        'acquirer_entry_price' plus the deal columns listed above when present.
+    """
+    extra_cols = [c for c in ['Exchange Ratio', 'Amendment Date', 'Amended Exchange Ratio'] if c in deals_df.columns]
+    deals = deals_df[['deal_id', 'Announce Date', 'Completion/Termination Date'] + extra_cols].reset_index(drop=True)
+    deals['deal_order'] = np.arange(len(deals))
+
+    prices = price_df[['date', 'deal_id', 'leg', 'price']].merge(
+        deals[['deal_id', 'Announce Date', 'Completion/Termination Date']], on='deal_id'
+    )
+    after_announce = prices[prices['date'] >= prices['Announce Date']]
+    before_completion = prices[prices['date'] <= prices['Completion/Termination Date']]
+
+    # First date on/after announce and last date on/before completion, per (deal, leg)
+    first_dates = after_announce.groupby(['deal_id', 'leg'], observed=True)['date'].min().unstack('leg')
+    last_dates = before_completion.groupby(['deal_id', 'leg'], observed=True)['date'].max().unstack('leg')
+    for dates in (first_dates, last_dates):
+        for leg in ('target', 'acquirer'):
+            if leg not in dates.columns:
+                dates[leg] = pd.NaT
+
+    legs = pd.DataFrame({
+        'entry_date': first_dates[['target', 'acquirer']].max(axis=1, skipna=False),
+    }).join(pd.DataFrame({
+        'exit_date': last_dates[['target', 'acquirer']].min(axis=1, skipna=False),
+    }), how='inner').dropna()
+
+    # Entry prices of both legs on the common entry date
+    entry_prices = price_df.set_index(['deal_id', 'date', 'leg'])['price']
+    for leg in ('target', 'acquirer'):
+        keys = pd.MultiIndex.from_arrays([legs.index, legs['entry_date'], np.repeat(leg, len(legs))])
+        legs[f'{leg}_entry_price'] = entry_prices.reindex(keys).to_numpy()
+
+    legs = deals.merge(legs, left_on='deal_id', right_index=True).sort_values('deal_order')
+    return legs.drop(columns=['deal_order', 'Announce Date', 'Completion/Termination Date']).reset_index(drop=True)
 
 ############################################
 # Order Generation (Long-Short Capital Matching)
 ############################################
+def size_hedges(
+    legs_df: pd.DataFrame,
+    capital_each_side: float = 10000,
+    hedge_mode: str = "dollar"
+) -> pd.DataFrame:
+    """
+    Size both legs of every deal with vectorized array math.
+
+    hedge_mode:
+      - 'dollar': both legs get `capital_each_side` worth of shares (the original rule).
+      - 'ratio':  the target gets `capital_each_side` worth of shares and the acquirer
+                  short is `Exchange Ratio x target shares`, i.e. the shares the target
+                  converts into on completion.
+
+    Deals with a missing/non-positive entry price (or exchange ratio) or a zero-share
+    leg are dropped. Adds integer columns 'shares_target' and 'shares_acquirer'.
+    """
+    target_price = legs_df['target_entry_price'].to_numpy(dtype=float)
+    acquirer_price = legs_df['acquirer_entry_price'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares_target = np.floor_divide(capital_each_side, target_price)
+        if hedge_mode == "dollar":
+            shares_acquirer = np.floor_divide(capital_each_side, acquirer_price)
+            valid = acquirer_price > 0
+        elif hedge_mode == "ratio":
+            if 'Exchange Ratio' not in legs_df.columns:
+                raise ValueError("hedge_mode='ratio' requires an 'Exchange Ratio' column in deals_df")
+            ratio = legs_df['Exchange Ratio'].to_numpy(dtype=float)
+            shares_acquirer = np.round(ratio * shares_target)
+            valid = (ratio > 0) & (acquirer_price > 0)
+        else:
+            raise ValueError(f"Unknown hedge_mode '{hedge_mode}' (expected 'dollar' or 'ratio')")
+
+    valid &= (target_price > 0) & (shares_target > 0) & (shares_acquirer > 0)
+    sized = legs_df[valid].copy()
+    sized['shares_target'] = shares_target[valid].astype(int)
+    sized['shares_acquirer'] = shares_acquirer[valid].astype(int)
+    return sized
+
+def _amendment_rebalances(sized: pd.DataFrame, price_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Acquirer rebalance orders for deals whose exchange ratio was amended while the
+    position was open: on the first acquirer trading day on/after the 'Amendment Date',
+    the short is resized to `Amended Exchange Ratio x target shares`.
+    """
+    amended = sized.dropna(subset=['Amendment Date', 'Amended Exchange Ratio']).copy()
+    amended['Amendment Date'] = pd.to_datetime(amended['Amendment Date'])
+    amended = amended[(amended['Amendment Date'] > amended['entry_date']) &
+                      (amended['Amendment Date'] < amended['exit_date'])]
+    if amended.empty:
+        return pd.DataFrame(columns=['deal_id', 'date', 'new_shares_acquirer'])
+
+    acquirer_dates = price_df.loc[price_df['leg'] == 'acquirer', ['deal_id', 'date']]
+    candidates = acquirer_dates.merge(amended[['deal_id', 'Amendment Date', 'exit_date']], on='deal_id')
+    candidates = candidates[(candidates['date'] >= candidates['Amendment Date']) &
+                            (candidates['date'] < candidates['exit_date'])]
+    rebalance_dates = candidates.groupby('deal_id')['date'].min()
+
+    amended = amended[amended['deal_id'].isin(rebalance_dates.index)]
+    return pd.DataFrame({
+        'deal_id': amended['deal_id'].to_numpy(),
+        'date': rebalance_dates.reindex(amended['deal_id']).to_numpy(),
+        'new_shares_acquirer': np.round(
+            amended['Amended Exchange Ratio'].to_numpy(dtype=float) * amended['shares_target'].to_numpy()
+        ).astype(int),
+        'old_shares_acquirer': amended['shares_acquirer'].to_numpy(),
+    })
+
 def generate_orders(
     deals_df: pd.DataFrame,
     price_df: pd.DataFrame,
-    capital_each_side: float = 10000
+    capital_each_side: float = 10000,
+    hedge_mode: str = "dollar",
+    rebalance_on_amendment: bool = False
 ) -> pd.DataFrame:
     """
     Generate entry and exit orders for each deal such that:
@@ -64,130 +213,107 @@ def generate_orders(
       - On the exit day (the last valid trading day on/before the completion date for both legs),
         the positions are reversed.
     
-    The number of shares is computed to match a nominal capital allocation on each side.
+    The target leg is sized to a nominal capital allocation; the acquirer leg is sized
+    either to the same capital (hedge_mode='dollar') or to `Exchange Ratio x target shares`
+    (hedge_mode='ratio'). All deals are sized at once with array math (see `size_hedges`).
     
     Parameters
     ----------
     deals_df : pd.DataFrame
-        DataFrame containing deals (with columns 'deal_id', 'Announce Date', 'Completion/Termination Date').
+        DataFrame containing deals (with columns 'deal_id', 'Announce Date', 'Completion/Termination Date',
+        and 'Exchange Ratio' for hedge_mode='ratio').
     price_df : pd.DataFrame
         DataFrame containing prices (with columns 'date', 'deal_id', 'leg', 'price').
     capital_each_side : float, optional
         Nominal capital allocated per side (default is 10000).
+    hedge_mode : str, optional
+        'dollar' (default) or 'ratio'.
+    rebalance_on_amendment : bool, optional
+        With hedge_mode='ratio', resize the acquirer short when a deal has an
+        'Amendment Date' inside the holding period and an 'Amended Exchange Ratio'.
         
     Returns
     -------
     pd.DataFrame
         Orders DataFrame with columns: 'date', 'deal_id', 'shares', 'leg', and 'action'.
     """
-    orders = []
-    # Group prices by deal_id and leg for quick lookup
-    grouped_prices = price_df.groupby(['deal_id', 'leg'])
-    
-    for _, deal in deals_df.iterrows():
-        deal_id = deal['deal_id']
-        announce_date = deal['Announce Date']
-        completion_date = deal['Completion/Termination Date']
-        
-        # Retrieve prices for both legs; skip deal if either is missing
-        if (deal_id, 'target') in grouped_prices.groups:
-            target_prices = grouped_prices.get_group((deal_id, 'target'))
-        else:
-            print(f"DEBUG: missing pricees for deal_id {deal_id}")
-            # raise ValueError(f"Price not found")
-            continue
-        if (deal_id, 'acquirer') in grouped_prices.groups:
-            acquirer_prices = grouped_prices.get_group((deal_id, 'acquirer'))
-        else:
-            print(f"DEBUG: missing prices for deal_id {deal_id}")
-            # raise ValueError(f"Price not found")
-            continue
-        
-        # Determine entry dates: for each leg, take the first date on/after the announce date,
-        # then use the later one so that both legs trade on the same day.
-        target_entry_df = target_prices[target_prices['date'] >= announce_date]
-        acquirer_entry_df = acquirer_prices[acquirer_prices['date'] >= announce_date]
-        if target_entry_df.empty or acquirer_entry_df.empty:
-            continue
-        target_entry_date = target_entry_df['date'].min()
-        acquirer_entry_date = acquirer_entry_df['date'].min()
-        entry_date = max(target_entry_date, acquirer_entry_date)
-        
-        # Get the entry prices for each leg on the entry date
-        target_entry_price_series = target_prices[target_prices['date'] == entry_date]['price']
-        acquirer_entry_price_series = acquirer_prices[acquirer_prices['date'] == entry_date]['price']
-        if target_entry_price_series.empty or acquirer_entry_price_series.empty:
-            continue
-        target_entry_price = target_entry_price_series.iloc[0]
-        acquirer_entry_price = acquirer_entry_price_series.iloc[0]
-        
-        # Determine exit dates: for each leg, take the last date on/before the completion date,
-        # then choose the earlier date to ensure both legs exit on the same day.
-        target_exit_df = target_prices[target_prices['date'] <= completion_date]
-        acquirer_exit_df = acquirer_prices[acquirer_prices['date'] <= completion_date]
-        if target_exit_df.empty or acquirer_exit_df.empty:
-            continue
-        target_exit_date = target_exit_df['date'].max()
-        acquirer_exit_date = acquirer_exit_df['date'].max()
-        exit_date = min(target_exit_date, acquirer_exit_date)
-        
-        # Calculate shares for each leg based on the nominal capital
-        if target_entry_price <= 0 or np.isnan(target_entry_price):
-            continue
-        shares_target = int(capital_each_side // target_entry_price)
-        if shares_target == 0:
-            continue
-        
-        if acquirer_entry_price <= 0 or np.isnan(acquirer_entry_price):
-            continue
-        shares_acquirer = int(capital_each_side // acquirer_entry_price)
-        if shares_acquirer == 0:
-            continue
-        
-        # Append entry orders (long target, short acquirer)
-        orders.append({
-            'date': entry_date,
-            'deal_id': deal_id,
-            'shares': shares_target,  # Buy target
-            'leg': 'target',
-            'action': 'entry'
-        })
-        orders.append({
-            'date': entry_date,
-            'deal_id': deal_id,
-            'shares': -shares_acquirer,  # Sell acquirer
-            'leg': 'acquirer',
-            'action': 'entry'
-        })
-        
-        # Append exit orders (reverse the positions)
-        orders.append({
-            'date': exit_date,
-            'deal_id': deal_id,
-            'shares': -shares_target,  # Sell target
-            'leg': 'target',
-            'action': 'exit'
-        })
-        orders.append({
-            'date': exit_date,
-            'deal_id': deal_id,
-            'shares': shares_acquirer,  # Buy acquirer
-            'leg': 'acquirer',
-            'action': 'exit'
-        })
-    
-    orders_df = pd.DataFrame(orders)
+    priced = price_df.groupby(['deal_id', 'leg'], observed=True).size().unstack('leg')
+    complete = priced.index[priced.notna().all(axis=1)] if len(priced.columns) >= 2 else []
+    missing = deals_df.loc[~deals_df['deal_id'].isin(complete), 'deal_id']
+    examples = [{'deal_id': deal_id} for deal_id in missing.head(run_metrics.config()['max_examples'])]
+    run_metrics.record_many("strategy_Shuhan.generate_orders", "missing_prices", len(missing), examples, level="debug")
+
+    legs = compute_deal_legs(deals_df, price_df)
+    sized = size_hedges(legs, capital_each_side, hedge_mode)
+
+    deal_ids = sized['deal_id'].to_numpy()
+    shares_target = sized['shares_target'].to_numpy()
+    exit_shares_acquirer = sized['shares_acquirer'].to_numpy().copy()
+    frames = []
+
+    if rebalance_on_amendment and hedge_mode == "ratio" and 'Amended Exchange Ratio' in sized.columns:
+        rebalances = _amendment_rebalances(sized, price_df)
+        if not rebalances.empty:
+            frames.append(pd.DataFrame({
+                'date': rebalances['date'],
+                'deal_id': rebalances['deal_id'],
+                'shares': -(rebalances['new_shares_acquirer'] - rebalances['old_shares_acquirer']),
+                'leg': 'acquirer',
+                'action': 'rebalance',
+            }))
+            # The exit must buy back the resized short
+            new_short = pd.Series(rebalances['new_shares_acquirer'].to_numpy(), index=rebalances['deal_id'])
+            exit_shares_acquirer = new_short.reindex(deal_ids).fillna(pd.Series(exit_shares_acquirer, index=deal_ids)).to_numpy(dtype=int)
+
+    # Entry (long target, short acquirer) and exit (reverse) orders for all deals at once
+    frames = [
+        pd.DataFrame({'date': sized['entry_date'], 'deal_id': deal_ids, 'shares': shares_target,
+                      'leg': 'target', 'action': 'entry'}),
+        pd.DataFrame({'date': sized['entry_date'], 'deal_id': deal_ids, 'shares': -sized['shares_acquirer'],
+                      'leg': 'acquirer', 'action': 'entry'}),
+    ] + frames + [
+        pd.DataFrame({'date': sized['exit_date'], 'deal_id': deal_ids, 'shares': -shares_target,
+                      'leg': 'target', 'action': 'exit'}),
+        pd.DataFrame({'date': sized['exit_date'], 'deal_id': deal_ids, 'shares': exit_shares_acquirer,
+                      'leg': 'acquirer', 'action': 'exit'}),
+    ]
+
+    orders_df = pd.concat(frames, ignore_index=True)
     orders_df['date'] = pd.to_datetime(orders_df['date'])
-    orders_df.sort_values(by='date', inplace=True)
+    orders_df.sort_values(by='date', inplace=True, kind='stable')
     return orders_df
 
+############################################
+# Daily Spread Series
+############################################
+def compute_spread_series(deals_df: pd.DataFrame, price_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Daily exchange-ratio spread (target - Exchange Ratio x acquirer) for every deal.
+
+    Both legs are pivoted into date x deal price matrices once and the spread is a
+    single broadcast over the per-deal ratio vector.
+
+    Returns
+    -------
+    pd.DataFrame
+        Index: date, columns: deal_id. NaN where either leg has no price.
+    """
+    ratios = deals_df.drop_duplicates('deal_id').set_index('deal_id')['Exchange Ratio'].astype(float)
+    prices = price_df[price_df['deal_id'].isin(ratios.index)]
+    matrix = prices.pivot_table(index='date', columns=['leg', 'deal_id'], values='price', aggfunc='first', observed=True)
+    target = matrix['target']
+    acquirer = matrix['acquirer'].reindex(columns=target.columns)
+    return target - acquirer * ratios.reindex(target.columns).to_numpy()[None, :]
+
 ############################################
 # API Function: generate_orders_from_deals
 ############################################
 def generate_orders_from_deals(
     deals_csv_path: str,
     prices_csv_path: str,
-    capital_each_side: float = 10000
+    capital_each_side: float = 10000,
+    hedge_mode: str = "dollar",
+    rebalance_on_amendment: bool = False
 ) -> pd.DataFrame:
     """
     Convenience wrapper that loads deals and prices from CSV files and generates orders.
@@ -200,6 +326,10 @@ def generate_orders_from_deals(
         Path to the prices CSV file.
     capital_each_side : float, optional
         Nominal capital allocation per side (default is 10000).
+    hedge_mode : str, optional
+        'dollar' (equal capital per leg, default) or 'ratio' (exchange-ratio hedge).
+    rebalance_on_amendment : bool, optional
+        Resize the acquirer short on ratio amendments (hedge_mode='ratio' only).
         
     Returns
     -------
@@ -208,7 +338,7 @@ def generate_orders_from_deals(
     """
     deals_df = load_deals(deals_csv_path)
     price_df = load_prices(prices_csv_path)
-    return generate_orders(deals_df, price_df, capital_each_side)
+    return generate_orders(deals_df, price_df, capital_each_side, hedge_mode, rebalance_on_amendment)
 
 # Example usage:
 if __name__ == "__main__":
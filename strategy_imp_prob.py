@@ -2,6 +2,8 @@ import pandas as pd
 from datetime import datetime
 from typing import List, Optional
 
+import run_metrics
+
 ############################################
 # Helper Functions for Date Shifting
 ############################################
@@ -23,6 +25,11 @@ def get_previous_trading_day(date: datetime, trading_dates: List[datetime]) -> O
 ############################################
 # Deal Loading with Implied Probability Estimation
 ############################################
+# Stages under which the per-deal data problems below are counted (see run_metrics.py)
+_OFFER = "strategy_imp_prob.extract_offer_price"
+_FALLBACK = "strategy_imp_prob.compute_fallback_price"
+_IMPLIED = "strategy_imp_prob.estimate_implied_probability"
+
 def extract_offer_price(cash_terms: str) -> Optional[float]:
     if not isinstance(cash_terms, str):
         return None
@@ -31,10 +38,10 @@ def extract_offer_price(cash_terms: str) -> Optional[float]:
             price_per_share = float(cash_terms.split("/")[0].replace(",", ""))
             return price_per_share
         else:
-            print(f"Skipping non-per-share offer: {cash_terms}")
+            run_metrics.record(_OFFER, "non_per_share_offer", "info", cash_terms=cash_terms)
             return None
     except Exception as e:
-        print(f"Failed to parse cash_terms '{cash_terms}': {e}")
+        run_metrics.record(_OFFER, "unparseable_cash_terms", "warning", cash_terms=cash_terms, error=str(e))
         return None
 
 def compute_fallback_price(deal_id, announce_date, price_history_df) -> Optional[float]:
@@ -45,49 +52,55 @@ def compute_fallback_price(deal_id, announce_date, price_history_df) -> Optional
         ].sort_values("date")
 
         if price_rows.empty:
-            print(f"No price found for deal_id {deal_id} on or after announce date {announce_date}")
+            run_metrics.record(_FALLBACK, "no_price_after_announce", "warning", deal_id=deal_id,
+                               announce_date=str(announce_date))
             return None
 
         first_row = price_rows.iloc[0]
         actual_date = first_row["date"]
 
         if actual_date != announce_date:
-            print(f"Using fallback price for deal_id {deal_id} from {actual_date.date()} instead of announce date {announce_date.date()}")
+            run_metrics.record(_FALLBACK, "price_after_announce_date", "debug", deal_id=deal_id,
+                               price_date=str(actual_date.date()), announce_date=str(announce_date.date()))
 
         return first_row["price"]
 
     except Exception as e:
-        print(f"Error getting fallback price for deal_id {deal_id}: {e}")
+        run_metrics.record(_FALLBACK, "error", "error", deal_id=deal_id, error=str(e))
         return None
 
 def estimate_implied_probability(deal) -> Optional[float]:
     try:
         offer_price = extract_offer_price(deal["Cash Terms"])
         if offer_price is None:
-            print(f"Invalid cash terms for deal_id {deal['deal_id']}: {deal['Cash Terms']}")
+            run_metrics.record(_IMPLIED, "invalid_cash_terms", "info", deal_id=deal['deal_id'],
+                               cash_terms=deal['Cash Terms'])
             return None
         arb_spread = float(deal["Arb Spread (Gross)"]) / 100
         if pd.isna(deal["Arb Spread (Gross)"]):
-            print(f"NaN Arb Spread for deal_id {deal['deal_id']}")
+            run_metrics.record(_IMPLIED, "nan_arb_spread", "info", deal_id=deal['deal_id'])
         fallback_price = deal["Fallback Price"]
         
         if offer_price is None or pd.isna(fallback_price):
             if offer_price is None:
-                print(f"Offer price is None for deal_id {deal['deal_id']}")
+                run_metrics.record(_IMPLIED, "no_offer_price", "info", deal_id=deal['deal_id'])
             if pd.isna(fallback_price):
-                print(f"Fallback price is NaN for deal_id {deal['deal_id']}")
+                run_metrics.record(_IMPLIED, "nan_fallback_price", "info", deal_id=deal['deal_id'])
             return None
 
         target_price = offer_price * (1 - arb_spread)
         p = (target_price - fallback_price) / (offer_price - fallback_price)
         return max(0.0, min(p, 1.0))
     except Exception as e:
-        print(f"Error estimating implied probability for deal_id {deal['deal_id']}: {e}")
+        run_metrics.record(_IMPLIED, "error", "error", deal_id=deal['deal_id'], error=str(e))
         return None
 
 def load_deals(deals_csv_path: str, price_history_df: pd.DataFrame, min_prob_threshold: float = 0.75) -> pd.DataFrame:
     deals_df = pd.read_csv(deals_csv_path)
-    deals_df = deals_df[deals_df["Payment Type"].str.strip() == "Cash"]
+    return prepare_deals(deals_df, price_history_df, min_prob_threshold)
+
+def prepare_deals(deals_df: pd.DataFrame, price_history_df: pd.DataFrame, min_prob_threshold: float = 0.75) -> pd.DataFrame:
+    deals_df = deals_df[deals_df["Payment Type"].str.strip() == "Cash"].copy()
 
     # Ensure date columns are datetime
     for col in ["Announce Date", "Completion/Termination Date"]:
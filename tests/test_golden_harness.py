@@ -0,0 +1,11 @@
+import pytest
+
+import golden_harness
+
+@pytest.mark.parametrize("kind", ["stock", "cash"])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_engines_match_reference(seed, kind):
+    results = golden_harness.run_harness([golden_harness.synthetic_case(seed, kind)])
+    failed = results[~results['passed'].astype(bool)]
+    assert len(results) > 1
+    assert failed.empty, failed[['case', 'engine', 'max_value_diff', 'holdings_mismatch_days', 'note']].to_string()
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+import signal_strategy
+
+def _panels(n_days: int = 5) -> dict:
+    dates = pd.date_range("2024-01-02", periods=n_days, freq="B")
+    frame = lambda values: pd.DataFrame({7: values}, index=dates)
+    return {
+        'live': frame(np.ones(n_days, dtype=bool)),
+        'target': frame(np.full(n_days, 10.0)),
+        'offer': frame(np.full(n_days, 11.0)),
+    }
+
+def test_hedged_resize_nets_to_zero():
+    panels = _panels()
+    multiplier = np.array([[1.0], [30 / 33], [30 / 33], [30 / 33], [30 / 33]])
+    exit_day = np.zeros((5, 1), dtype=bool)
+    exit_day[3] = True
+    orders_df = signal_strategy.generate_signal_orders(
+        panels,
+        entry_rule=lambda p: np.eye(5, 1, dtype=bool),
+        exit_rule=lambda p: exit_day,
+        size=33,
+        size_rule=lambda p: multiplier,
+        hedge_ratio=pd.Series({7: 0.5}),
+    )
+    net = orders_df.groupby('leg')['shares'].sum()
+    assert (orders_df['action'] == 'resize').any()
+    assert net['target'] == 0
+    assert net['acquirer'] == 0
+
+    # Every acquirer position is -round(ratio x target position)
+    positions = orders_df.pivot_table(index='date', columns='leg', values='shares', aggfunc='sum').fillna(0).cumsum()
+    assert (positions['acquirer'] == -np.round(0.5 * positions['target'])).all()
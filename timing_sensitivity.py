@@ -0,0 +1,227 @@
+import time
+import numpy as np
+import pandas as pd
+
+############################################
+# Offset Grid
+############################################
+# strategy.generate_orders enters on the first trading day after the announce
+# date and exits on the second trading day before the completion date. Here the
+# entry day is `entry_offset` trading days after that first day and the exit day
+# is `exit_offset` trading days before the last trading day before completion, so
+# (entry_offset, exit_offset) = (0, 1) is the strategy's own timing.
+#
+# Without cash constraints a deal held from calendar row a to row b adds
+# shares x (price[t] - price[a]) to the portfolio value on days a <= t < b and
+# shares x (price[b] - price[a]) from b on, so every (entry, exit) combination is
+# a masked sum over deals. The mark-to-market part is one batched matmul per
+# block of deals and the entry/exit cash flows are scattered and accumulated.
+
+def _price_matrix(price_df: pd.DataFrame, price_column: str = 'price'):
+    # Calendar = every price date (as in backtester.backtest); duplicates are averaged
+    price_df = price_df.assign(date=pd.to_datetime(price_df['date']))
+    prices = price_df.groupby(['date', 'deal_id'])[price_column].mean().unstack('deal_id')
+    dates = pd.DatetimeIndex(np.sort(price_df['date'].unique()))
+    prices = prices.reindex(dates)
+    has_price = price_df.groupby(['date', 'deal_id']).size().unstack('deal_id').reindex(dates).notna()
+    return dates, prices, has_price.to_numpy(dtype=bool)
+
+def _offset_days(deals_df: pd.DataFrame, dates: pd.DatetimeIndex, deal_columns: pd.Index,
+                 entry_offsets: np.ndarray, exit_offsets: np.ndarray):
+    """
+    Calendar rows of every deal's entry (n_entry x n_deals) and exit
+    (n_exit x n_deals) for each offset, and the column of each deal in the price
+    matrix. Deals without a completion date are never exited (row len(dates)).
+    """
+    announce = pd.to_datetime(deals_df['Announce Date']).to_numpy(dtype='datetime64[ns]')
+    completion = pd.to_datetime(deals_df['Completion/Termination Date']).to_numpy(dtype='datetime64[ns]')
+    calendar = dates.to_numpy(dtype='datetime64[ns]')
+    first_after = np.searchsorted(calendar, announce, side='right')
+    last_before = np.searchsorted(calendar, completion, side='left') - 1
+    entry = first_after[None, :] + entry_offsets[:, None]
+    exit_ = np.where(np.isnat(completion)[None, :], len(dates), last_before[None, :] - exit_offsets[:, None])
+    entry = np.where(np.isnat(announce)[None, :], len(dates), entry)
+    return entry, exit_, deal_columns.get_indexer(deals_df['deal_id'])
+
+def _tradable(entry, exit_, column, prices, has_price):
+    """
+    (n_entry x n_exit x n_deals) mask of the combinations in which a deal is traded:
+    its entry comes before its exit and both days have a (non-NaN) price.
+    """
+    n_days = prices.shape[0]
+    priced = has_price & ~np.isnan(prices)
+
+    def priced_on(rows):
+        inside = (rows >= 0) & (rows < n_days) & (column >= 0)[None, :]
+        return inside & priced[np.clip(rows, 0, n_days - 1), np.clip(column, 0, None)[None, :]]
+
+    never_exits = exit_ == n_days
+    entry_ok = priced_on(entry)
+    exit_ok = priced_on(exit_) | never_exits
+    return entry_ok[:, None, :] & exit_ok[None, :, :] & (entry[:, None, :] < exit_[None, :, :])
+
+def offset_grid(
+    deals_df: pd.DataFrame,
+    price_df: pd.DataFrame,
+    max_entry_offset: int = 10,
+    max_exit_offset: int = 10,
+    shares: int = 100,
+    initial_capital: float = 1_000_000,
+    price_column: str = 'price',
+    chunk_size: int = 64
+) -> dict:
+    """
+    Daily portfolio values of strategy.generate_orders for every entry offset
+    0..max_entry_offset and exit offset 0..max_exit_offset, for all deals at once.
+
+    Parameters
+    ----------
+    deals_df : pd.DataFrame
+        Deals as loaded by strategy.load_deals; only 'Deal Type' == 'M&A' is traded.
+    price_df : pd.DataFrame
+        Daily prices with 'date', 'deal_id' and `price_column` (price.csv layout).
+    max_entry_offset, max_exit_offset : int, optional
+        Largest offsets evaluated (see the module notes for their meaning).
+    shares : int, optional
+        Shares bought per deal, as strategy.generate_orders' shares_on_announce.
+    initial_capital : float, optional
+        Starting cash.
+    price_column : str, optional
+        Column of price_df to trade and value at.
+    chunk_size : int, optional
+        Deals per matmul block (bounds memory at n_offsets x n_days x chunk_size).
+
+    Returns
+    -------
+    dict
+        'dates'         - the trading calendar
+        'entry_offsets', 'exit_offsets' - the evaluated offsets
+        'values'        - (n_entry x n_exit x n_days) portfolio values
+        'n_deals'       - (n_entry x n_exit) number of deals traded
+        'tradable'      - (n_entry x n_exit x n_deals) mask of traded deals
+        'deal_ids'      - deal ids along the last axis of 'tradable'
+
+    Deals whose entry or exit day has no price, or whose entry would not come
+    before the exit, are left out of that combination (the backtester would raise
+    or trade them in the wrong order).
+    """
+    deals_df = deals_df[deals_df['Deal Type'] == 'M&A']
+    dates, price_frame, has_price = _price_matrix(price_df, price_column)
+    prices = price_frame.to_numpy(dtype=float)
+    entry_offsets = np.arange(max_entry_offset + 1)
+    exit_offsets = np.arange(max_exit_offset + 1)
+    entry, exit_, column = _offset_days(deals_df, dates, price_frame.columns, entry_offsets, exit_offsets)
+    tradable = _tradable(entry, exit_, column, prices, has_price)
+
+    n_days, n_entry, n_exit = len(dates), len(entry_offsets), len(exit_offsets)
+    rows = np.arange(n_days)[None, :, None]
+    valued = np.where(has_price, prices, 0.0)
+    nan_held = np.isnan(valued)
+    marked = np.zeros((n_entry, n_exit, n_days))
+    held_nan = np.zeros((n_entry, n_exit, n_days)) if nan_held.any() else None
+
+    # Mark-to-market: sum over deals of price x (held since entry - held since exit)
+    for lo in range(0, len(column), chunk_size):
+        block = slice(lo, lo + chunk_size)
+        cols = np.clip(column[block], 0, None)
+        mask = tradable[:, :, block].astype(float)
+        since_entry = (rows >= entry[:, None, block]).astype(float)
+        since_exit = (rows >= exit_[:, None, block]).astype(float)
+        for source, target in ((np.nan_to_num(valued[:, cols]), marked),
+                               (nan_held[:, cols].astype(float), held_nan)):
+            if target is None:
+                continue
+            target += np.matmul(source[None] * since_entry, mask.transpose(0, 2, 1)).transpose(0, 2, 1)
+            target -= np.matmul(source[None] * since_exit, mask.transpose(1, 2, 0)).transpose(2, 0, 1)
+
+    # Cash flows: pay the entry price, receive the exit price
+    e, m, d = np.nonzero(tradable)
+    flows = np.zeros((n_entry, n_exit, n_days))
+    np.add.at(flows, (e, m, entry[e, d]), -prices[entry[e, d], column[d]])
+    exits = exit_[m, d] < n_days
+    np.add.at(flows, (e[exits], m[exits], exit_[m, d][exits]), prices[exit_[m, d][exits], column[d][exits]])
+
+    values = initial_capital + shares * (marked + np.cumsum(flows, axis=2))
+    if held_nan is not None:
+        values[held_nan > 0] = np.nan
+    return {
+        'dates': dates, 'entry_offsets': entry_offsets, 'exit_offsets': exit_offsets,
+        'values': values, 'n_deals': tradable.sum(axis=2), 'tradable': tradable,
+        'deal_ids': deals_df['deal_id'].to_numpy(),
+    }
+
+def grid_orders(deals_df: pd.DataFrame, price_df: pd.DataFrame, entry_offset: int = 0, exit_offset: int = 1,
+                shares: int = 100, price_column: str = 'price') -> pd.DataFrame:
+    """
+    Orders of one grid cell, for a full backtester.backtest run of a chosen timing.
+    (0, 1) reproduces strategy.generate_orders for every deal the grid trades.
+    """
+    deals_df = deals_df[deals_df['Deal Type'] == 'M&A']
+    dates, price_frame, has_price = _price_matrix(price_df, price_column)
+    entry, exit_, column = _offset_days(deals_df, dates, price_frame.columns,
+                                        np.array([entry_offset]), np.array([exit_offset]))
+    traded = _tradable(entry, exit_, column, price_frame.to_numpy(dtype=float), has_price)[0, 0]
+    deal_ids = deals_df['deal_id'].to_numpy()[traded]
+    exits = exit_[0, traded] < len(dates)
+    orders_df = pd.concat([
+        pd.DataFrame({'date': dates[entry[0, traded]], 'deal_id': deal_ids, 'shares': shares}),
+        pd.DataFrame({'date': dates[exit_[0, traded][exits]], 'deal_id': deal_ids[exits], 'shares': -shares}),
+    ])
+    return orders_df.sort_values('date', kind='stable').reset_index(drop=True)
+
+############################################
+# Metrics
+############################################
+def grid_metrics(grid: dict) -> dict:
+    """
+    Sharpe ratio, CAGR, max drawdown, final value and deal count of every
+    combination, computed along the time axis of grid['values'] with the same
+    formulas as stats_utils.
+
+    Returns
+    -------
+    dict
+        {metric: pd.DataFrame} indexed by entry offset with exit offsets as columns.
+    """
+    values = grid['values']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = values[:, :, 1:] / values[:, :, :-1] - 1
+        sharpe = np.sqrt(252) * np.nanmean(returns, axis=2) / np.nanstd(returns, axis=2, ddof=1)
+        years = (grid['dates'][-1] - grid['dates'][0]).days / 365.25
+        cagr = (values[:, :, -1] / values[:, :, 0]) ** (1 / years) - 1 if years > 0 else np.full(values.shape[:2], np.nan)
+        running_max = np.fmax.accumulate(values, axis=2)
+        max_drawdown = np.nanmin((values - running_max) / running_max, axis=2)
+
+    def frame(data):
+        return pd.DataFrame(data, index=pd.Index(grid['entry_offsets'], name='entry_offset'),
+                            columns=pd.Index(grid['exit_offsets'], name='exit_offset'))
+
+    return {'sharpe': frame(sharpe), 'cagr': frame(cagr), 'max_drawdown': frame(max_drawdown),
+            'final_value': frame(values[:, :, -1]), 'n_deals': frame(grid['n_deals'])}
+
+def main(deals_csv: str = "deals.csv", price_csv: str = "price.csv"):
+    import backtester
+    import strategy
+    from plotting import render_heatmap
+
+    deals_df = strategy.load_deals(deals_csv)
+    price_df = pd.read_csv(price_csv, parse_dates=['date'])
+
+    start = time.perf_counter()
+    grid = offset_grid(deals_df, price_df, max_entry_offset=10, max_exit_offset=10)
+    metrics = grid_metrics(grid)
+    print(f"{grid['values'].shape[0] * grid['values'].shape[1]} timing combinations x {len(grid['dates'])} days "
+          f"in {time.perf_counter() - start:.2f}s")
+    for name in ('sharpe', 'cagr'):
+        print(f"\n{name}:\n{metrics[name].round(4)}")
+        render_heatmap(metrics[name], f"timing_{name}.png", title=f"{name} by entry/exit offset")
+
+    for entry_offset, exit_offset in ((0, 1), (5, 3)):
+        orders_df = grid_orders(deals_df, price_df, entry_offset, exit_offset)
+        reference = backtester.backtest(orders_df, price_df.copy())
+        values = grid['values'][entry_offset, exit_offset]
+        print(f"({entry_offset}, {exit_offset}) vs backtester: max difference "
+              f"{np.nanmax(np.abs(values - reference['value'].to_numpy())):.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import pandas as pd
-import wrds
 from datetime import timedelta
 
+from deal_ingest import stable_deal_ids
+
 def filter_only_us(excel_file_name):    
     # Read the Excel file into a DataFrame
     deals_df = pd.read_excel(excel_file_name, sheet_name=0)
@@ -13,6 +14,9 @@ def filter_only_us(excel_file_name):
     return us_deals_df
 
 def process_rows(us_deals_df):
+    # Imported here so the rest of the module works without WRDS installed
+    import wrds
+
     processed_rows = []
     # Connect to WRDS
     db = wrds.Connection()
@@ -114,9 +118,10 @@ def main():
     final_df = pd.DataFrame(processed_rows)
     
     # ---- ADD UNIQUE IDENTIFIERS HERE ----
-    # Assign a new integer ID for each deal
+    # Assign each deal an ID derived from its tickers and announce date, so
+    # re-running with more deals does not renumber the existing ones
     final_df.reset_index(drop=True, inplace=True)
-    final_df["deal_id"] = final_df.index + 1  # e.g., 1, 2, 3, ...
+    final_df["deal_id"] = stable_deal_ids(final_df)
     
     # Save the deals file with a unique ID column
     final_df.to_csv("deals.csv", index=False)